@@ -8,9 +8,11 @@ from s3200 import core
 from s3200.obj import S3200
 from s3200.core import Frame
 from s3200.net import Connection
+import logging
 
 
 def main():
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.WARN)
     s = S3200(readonly=False)
     #print("T:"+str(s.get_errors()))
     # values = s.get_available_values()
@@ -0,0 +1,175 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+""" Publishes the readings of the heater to a message broker.
+
+Only the values which changed since the last published message are sent, all changes of a poll cycle in one
+message. The broker runs in its own thread behind a bounded queue: if it is slow, the changes of the following
+cycles are merged into one pending message instead of stalling the polling.
+
+A broker is any object with a publish(topic, payload) method. LocalBroker is an in-process stand-in, adapters
+for a real broker only need to implement publish, eg. for paho-mqtt:
+
+    class MqttBroker(object):
+        def __init__(self, client):
+            self.client = client
+
+        def publish(self, topic, payload):
+            self.client.publish(topic, payload).wait_for_publish()
+"""
+
+import json
+import queue
+import threading
+import time
+from s3200.obj import Watcher
+import logging
+
+logger = logging.getLogger('s3200')
+
+
+class LocalBroker(object):
+    """ An in-process broker. Delivers the messages to the subscribers of the topic in the publishing thread. """
+
+    def __init__(self):
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.message_count = 0
+
+    def subscribe(self, topic, callback):
+        """ :param callback: called with topic and payload (bytes) """
+        with self.lock:
+            self.subscribers.setdefault(topic, []).append(callback)
+
+    def publish(self, topic, payload):
+        with self.lock:
+            self.message_count += 1
+            callbacks = list(self.subscribers.get(topic, []))
+
+        for callback in callbacks:
+            callback(topic, payload)
+
+
+class Bridge(object):
+    """ Polls values through a S3200 object and publishes the changes. See the module doc.
+
+    A message is json: {"timestamp": 1700000000.0, "values": {"boiler_1_temperature": 55.5, ...}}
+    """
+
+    def __init__(self, s3200, broker, names, topic='s3200', interval=10.0, queue_size=10, full_interval=None,
+                 clock=time.monotonic):
+        """
+        :param s3200: the S3200 object to poll
+        :param broker: object with a publish(topic, payload) method
+        :param names: value, input or output names, 'state' or 'mode'
+        :param interval: seconds between two poll cycles
+        :param queue_size: number of messages waiting for the broker before changes get merged
+        :param full_interval: seconds after which all values are published again, None for never
+        :param clock: function returning the current time in seconds
+        """
+        self.broker = broker
+        self.names = list(names)
+        self.topic = topic
+        self.interval = interval
+        self.full_interval = full_interval
+        self.clock = clock
+
+        self.watcher = Watcher(s3200, self.names)
+        self.published = {}  # name -> last value handed to the queue
+        self.pending = {}  # changes which did not fit into the queue
+        self.last_full = None
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stopped = threading.Event()
+        self.threads = []
+
+        self.cycle_count = 0
+        self.message_count = 0
+        self.merged_count = 0
+
+    def poll_once(self):
+        """ Reads all names and queues one message with the changed values.
+
+        :return: dict of the changed values of this cycle
+        """
+
+        row = self.watcher.read()
+        timestamp = row[0]
+        self.cycle_count += 1
+
+        now = self.clock()
+        full = self.full_interval is not None and (self.last_full is None or now - self.last_full >= self.full_interval)
+        if full:
+            self.last_full = now
+
+        changes = {}
+        for name, value in zip(self.names, row[1:]):
+            if value is None:
+                continue  # a broken answer, the last published value stays
+
+            if full or name not in self.published or self.published[name] != value:
+                changes[name] = value
+                self.published[name] = value
+
+        if changes or self.pending:
+            self.pending.update(changes)
+            try:
+                self.queue.put_nowait((timestamp, self.pending))
+                self.message_count += 1
+                self.pending = {}
+            except queue.Full:
+                # the broker is slow, the next cycle tries again with the merged changes
+                self.merged_count += 1
+
+        return changes
+
+    def publish_pending(self):
+        """ Publishes the queued messages in the calling thread. """
+
+        while True:
+            try:
+                message = self.queue.get_nowait()
+            except queue.Empty:
+                return
+            self._publish(*message)
+
+    def _publish(self, timestamp, values):
+        payload = json.dumps({'timestamp': timestamp, 'values': values}, separators=(',', ':')).encode('utf-8')
+        try:
+            self.broker.publish(self.topic, payload)
+        except Exception:
+            logger.exception('Publishing to the broker failed')
+
+    def _poll_loop(self):
+        next_due = self.clock()
+        while not self.stopped.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.warning('Bridge poll failed: {0!r}'.format(e))
+
+            next_due = max(next_due + self.interval, self.clock())
+            self.stopped.wait(max(0, next_due - self.clock()))
+
+    def _publish_loop(self):
+        while True:
+            message = self.queue.get()
+            if message is None:
+                return
+            self._publish(*message)
+
+    def start(self):
+        """ Starts the poll and the publish thread. """
+        self.stopped.clear()
+        self.threads = [threading.Thread(target=self._poll_loop, daemon=True),
+                        threading.Thread(target=self._publish_loop, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.threads[0].join()
+
+        # the publish thread sends what is queued before it ends
+        self.queue.put(None)
+        self.threads[1].join()
+        self.threads = []
@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+import sys
+from array import array
+from itertools import cycle
+from s3200 import const, core
+import logging
+
+logger = logging.getLogger('s3200')
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ValueDecoder(object):
+    """ Decodes the payloads of many get_value answers at once.
+
+    The payloads are unpacked in one go into an int16 array and divided by the precomputed factors of the values.
+    Numpy is used if it is installed, the array module otherwise.
+
+    Example:
+        decoder = ValueDecoder(['boiler_1_temperature', 'operating_hours'])
+        decoder.decode([b'\\x00\\x54', b'\\x00\\x37', b'\\x00\\x56', b'\\x00\\x38'])
+        -> [42.0, 55.0, 43.0, 56.0]  two rows of the two values
+    """
+
+    def __init__(self, names, value_definitions=const.VALUE_DEFINITIONS, use_numpy=None):
+        """
+        :param names: names of the values in the order of the payloads
+        :param value_definitions: definitions holding the factor of each value
+        :param use_numpy: default is to use numpy if it is installed
+        """
+        self.names = list(names)
+        self.index = {name: position for position, name in enumerate(self.names)}
+
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        elif use_numpy and numpy is None:
+            raise ImportError("numpy is not installed")
+        self.use_numpy = use_numpy
+
+        try:
+            factors = [value_definitions[name]['factor'] for name in self.names]
+        except KeyError as e:
+            raise core.ValueNotDefinedError("Value: {0} not defined in value_definitions".format(e)) from e
+
+        if self.use_numpy:
+            self.factors = numpy.array(factors, dtype=numpy.float64)
+        else:
+            self.factors = factors
+
+    @property
+    def width(self):
+        """ Number of values per row. """
+        return len(self.names)
+
+    @staticmethod
+    def join_payloads(payloads):
+        """ Get one bytes object of 2 bytes per payload. Single byte payloads get padded like in
+        core.convert_short_to_integer. """
+
+        data = b''.join(payloads)
+
+        if len(data) != 2 * len(payloads):
+            data = b''.join(bytes(payload).rjust(2, b'\x00') for payload in payloads)
+            if len(data) != 2 * len(payloads):
+                raise core.ShortUnpackError("Every payload must have 1 or 2 bytes.")
+
+        return data
+
+    def decode(self, payloads):
+        """ Decode get_value answer payloads.
+
+        :param payloads: the payloads, row after row. Every row has one payload per name.
+        :return: a flat float array (numpy.ndarray or array('d')). Position row * width + index[name] is the value
+                 of name in row.
+        """
+
+        if len(payloads) % self.width:
+            raise ValueError("Got {0} payloads which is not a multiple of {1} values".format(len(payloads),
+                                                                                               self.width))
+        return self.decode_bytes(self.join_payloads(payloads))
+
+    def decode_bytes(self, data: bytes):
+        """ Decode the concatenated 2 byte payloads. See decode. """
+
+        if self.use_numpy:
+            raw = numpy.frombuffer(data, dtype='>i2').reshape(-1, self.width)
+            return (raw / self.factors).ravel()
+
+        raw = array('h')
+        raw.frombytes(data)
+        if sys.byteorder == 'little':
+            raw.byteswap()  # shorts are sent big endian
+
+        return array('d', [value / factor for value, factor in zip(raw, cycle(self.factors))])
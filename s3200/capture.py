@@ -0,0 +1,429 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+""" Recording and offline decoding of the frames on the wire.
+
+A capture file is a sequence of records, one per frame:
+    timestamp(8, double, seconds) direction(1) length(2) frame bytes(length, escaped as on the wire)
+
+Connection writes captures if it gets a CaptureWriter. decode_capture splits a capture at frame boundaries,
+decodes the chunks in a process pool, pairs every request with its answers and writes one csv row per request.
+
+With raw=True decode_capture reads a raw dump of the bytes on the bus instead, eg. of a serial sniffer. The dump
+gets reframed with the framing of the protocol engine. A raw dump has no directions and no times: a frame which
+repeats the command of the request in front of it is its answer (two for set_setting), the timestamp is the byte
+offset of the request in the dump and the latency stays empty. Pipelined requests can not be told apart from their
+answers that way, record those with a CaptureWriter.
+
+Usage:
+    python3 -m s3200.capture capture.bin decoded.csv
+    python3 -m s3200.capture --raw dump.bin decoded.csv
+"""
+
+import argparse
+import csv
+import mmap
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from struct import Struct
+from s3200 import const, core
+from s3200.core import Frame
+from s3200.protocol import cut_frame
+import logging
+
+logger = logging.getLogger('s3200')
+
+SENT = 0
+RECEIVED = 1
+
+StructRecordHeader = Struct('!dBH')
+
+COLUMNS = ['timestamp', 'command', 'address', 'name', 'value', 'latency']
+
+# commands whose payload starts with the address of a value, setting, input or output
+ADDRESS_DEFINITIONS = {
+    'get_value': const.VALUE_DEFINITIONS,
+    'get_setting': const.SETTING_DEFINITIONS,
+    'set_setting': const.SETTING_DEFINITIONS,
+    'get_digital_input': const.DIGITAL_INPUT_DEFINITIONS,
+    'get_digital_output': const.DIGITAL_OUTPUT_DEFINITIONS,
+    'get_analog_output': const.ANALOG_OUTPUT_DEFINITIONS,
+    'manipulate_digital_input': const.DIGITAL_INPUT_DEFINITIONS,
+    'manipulate_digital_output': const.DIGITAL_OUTPUT_DEFINITIONS,
+    'manipulate_analog_output': const.ANALOG_OUTPUT_DEFINITIONS,
+}
+
+COMMAND_NAMES = {definition['address']: name for name, definition in const.COMMAND_DEFINITIONS.items()}
+
+# number of answer frames of the commands which do not get one, see iter_raw_records
+ANSWER_FRAMES = {const.COMMAND_DEFINITIONS['set_setting']['address']: 2}
+
+# command name -> address -> (name, definition)
+ADDRESS_INDEX = {
+    command_name: {(definition['address'] if isinstance(definition, dict) else definition): (name, definition)
+                   for name, definition in reversed(list(definitions.items()))}
+    for command_name, definitions in ADDRESS_DEFINITIONS.items()
+}
+
+
+class CaptureWriter(object):
+    """ Writes the frames of a Connection into a capture file. """
+
+    def __init__(self, file, clock=time.time):
+        """
+        :param file: a file opened in binary mode
+        :param clock: function returning the timestamp of a record
+        """
+        self.file = file
+        self.clock = clock
+
+    def write_record(self, direction, frame_bytes, timestamp=None):
+        if timestamp is None:
+            timestamp = self.clock()
+
+        self.file.write(StructRecordHeader.pack(timestamp, direction, len(frame_bytes)))
+        self.file.write(frame_bytes)
+
+    def write_sent(self, frame_bytes, timestamp=None):
+        self.write_record(SENT, frame_bytes, timestamp)
+
+    def write_received(self, frame_bytes, timestamp=None):
+        self.write_record(RECEIVED, frame_bytes, timestamp)
+
+
+def iter_records(data, start=0, end=None):
+    """ Yields (position, timestamp, direction, frame bytes) of the records between start and end. """
+
+    if end is None:
+        end = len(data)
+
+    position = start
+    while position + StructRecordHeader.size <= end:
+        timestamp, direction, length = StructRecordHeader.unpack_from(data, position)
+        frame_start = position + StructRecordHeader.size
+        yield position, timestamp, direction, data[frame_start:frame_start + length]
+        position = frame_start + length
+
+
+def is_record_start(data, position):
+    """ True if a valid record header with a complete frame starts at position. """
+
+    frame_start = position + StructRecordHeader.size
+    if frame_start + 2 > len(data) or data[frame_start:frame_start + 2] != const.START_BYTES:
+        return False
+
+    timestamp, direction, length = StructRecordHeader.unpack_from(data, position)
+    if direction not in (SENT, RECEIVED) or frame_start + length > len(data):
+        return False
+
+    return core.get_frame_length(data[frame_start:frame_start + length]) == length
+
+
+def find_record_start(data, position):
+    """ Get the start of the first record at or after position. Uses the start bytes of the frames to resync. """
+
+    while True:
+        frame_start = data.find(const.START_BYTES, position + StructRecordHeader.size)
+        if frame_start == -1:
+            return len(data)
+
+        record_start = frame_start - StructRecordHeader.size
+        if is_record_start(data, record_start):
+            return record_start
+
+        position = record_start + 1
+
+
+def find_chunk_start(data, position):
+    """ Get the start of the first request which follows an answer at or after position.
+
+    Requests sent back to back and their answers stay in one chunk that way.
+    """
+
+    position = find_record_start(data, position)
+    previous_direction = None
+
+    for record_start, timestamp, direction, frame_bytes in iter_records(data, position):
+        if direction == SENT and previous_direction == RECEIVED:
+            return record_start
+        previous_direction = direction
+
+    return len(data)
+
+
+def split_capture(data, count):
+    """ Split the capture into up to count chunks at request boundaries.
+
+    :return: list of (start, end) positions
+    """
+
+    boundaries = [0]
+    for i in range(1, count):
+        start = find_chunk_start(data, len(data) * i // count)
+        if start > boundaries[-1]:
+            boundaries.append(start)
+    boundaries.append(len(data))
+
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def decode_answer(command_name, definition, answer_payload):
+    """ Decode the answer payload of a request. Payloads of unknown answers are returned as hex. """
+
+    if command_name == 'get_value' and definition is not None:
+        return core.convert_short_to_integer(answer_payload) / definition['factor']
+    elif command_name == 'get_setting':
+        setting = core.convert_bytes_to_setting(answer_payload)
+        return setting['value'] / setting['factor']
+    elif command_name == 'get_digital_input':
+        return core.convert_bytes_to_digital_io(answer_payload, const.DIGITAL_INPUT_STRUCTURE)
+    elif command_name == 'get_digital_output':
+        return core.convert_bytes_to_digital_io(answer_payload, const.DIGITAL_OUTPUT_STRUCTURE)
+    elif command_name == 'get_analog_output':
+        return core.convert_bytes_to_analog_output(answer_payload)
+    elif command_name == 'get_heater_state_and_mode':
+        return ';'.join(core.convert_bytes_to_state_and_mode(answer_payload))
+    elif command_name == 'get_version_and_datetime':
+        return '{0} {1}'.format(core.convert_bytes_to_version(answer_payload),
+                                core.convert_bytes_to_version_datetime(answer_payload).isoformat())
+    elif command_name == 'test_connection':
+        return core.convert_bytes_to_string(answer_payload)
+
+    return core.convert_bytes_to_hex(answer_payload)
+
+
+def _get_address_definition(command_name, payload):
+    index = ADDRESS_INDEX.get(command_name)
+    if index is None or len(payload) < 2:
+        return '', '', None
+
+    address = bytes(payload[:2])
+    name, definition = index.get(address, ('', None))
+
+    return core.convert_bytes_to_hex(address), name, definition
+
+
+def decode_request(timestamp, request_bytes, answers):
+    """ Get the table row of one request and its answers.
+
+    :param answers: list of (timestamp, frame bytes) of the answers
+    """
+
+    try:
+        request = Frame.from_bytes(request_bytes)
+    except core.S3200Error as e:
+        return [timestamp, '', '', '', 'error: {0}'.format(e.msg), '']
+
+    command_name = COMMAND_NAMES.get(request.command, core.convert_bytes_to_hex(request.command))
+    address, name, definition = _get_address_definition(command_name, request.payload)
+
+    if not answers:
+        return [timestamp, command_name, address, name, 'no answer', '']
+
+    answer_timestamp, answer_bytes = answers[0]
+    try:
+        answer = Frame.from_bytes(answer_bytes)
+        value = decode_answer(command_name, definition, answer.payload)
+    except Exception as e:
+        value = 'error: {0}'.format(getattr(e, 'msg', e))
+
+    latency = answers[-1][0] - timestamp
+    return [timestamp, command_name, address, name, value, latency]
+
+
+def get_command(frame_bytes):
+    """ Get the command byte of an escaped frame without decoding the whole frame. """
+
+    try:
+        position = len(const.START_BYTES)
+        for i in range(2):  # the length bytes
+            position += 2 if frame_bytes[position] in const.ESCAPED_IDENTIFIER else 1
+        return core.unescape(bytes(frame_bytes[position:position + 2]))[:1]
+    except IndexError:
+        return b''
+
+
+def _find_request(open_requests, command):
+    """ Get the position of the open request an answer with the command belongs to. """
+
+    last_answered = None
+    for position, request in enumerate(open_requests):
+        if get_command(request[1]) == command:
+            if not request[2]:
+                return position
+            last_answered = position
+
+    if last_answered is not None:
+        return last_answered  # another answer to the same request
+
+    return 0
+
+
+def decode_records(records):
+    """ Pair the requests with their answers and decode them.
+
+    Answers belong to the oldest unanswered open request with the same command. Open requests in front of it
+    are finished. Answers with an unexpected command go to the oldest open request. A request stays open for more
+    answers (eg. the double echo of set_setting) until the next request is sent.
+
+    :param records: iterable of (timestamp, direction, frame bytes)
+    :return: list of rows
+    """
+
+    rows = []
+    open_requests = deque()  # [timestamp, request bytes, answers]
+
+    for timestamp, direction, frame_bytes in records:
+        if direction == SENT:
+            # a new request finishes the requests which got answered already
+            while open_requests and open_requests[0][2]:
+                rows.append(decode_request(*open_requests.popleft()))
+
+            open_requests.append([timestamp, frame_bytes, []])
+            continue
+
+        if not open_requests:
+            logger.info('answer without request at {0}'.format(timestamp))
+            continue
+
+        command = get_command(frame_bytes)
+        match = _find_request(open_requests, command)
+
+        for i in range(match):
+            rows.append(decode_request(*open_requests.popleft()))
+        open_requests[0][2].append((timestamp, frame_bytes))
+
+    while open_requests:
+        rows.append(decode_request(*open_requests.popleft()))
+
+    return rows
+
+
+def iter_raw_records(data):
+    """ Yields (byte offset, direction, frame bytes) of the frames of a raw dump. See the module doc for the
+    directions.
+    """
+
+    buffer = bytearray(data)
+    request_command = None
+    answers_left = 0
+
+    while True:
+        frame_bytes = cut_frame(buffer)
+        if frame_bytes is None:
+            return
+
+        offset = len(data) - len(buffer) - len(frame_bytes)
+        command = get_command(frame_bytes)
+
+        if answers_left and command == request_command:
+            answers_left -= 1
+            yield offset, RECEIVED, frame_bytes
+        else:
+            request_command = command
+            answers_left = ANSWER_FRAMES.get(command, 1)
+            yield offset, SENT, frame_bytes
+
+
+def split_records(records, count):
+    """ Split a list of records into up to count chunks at request boundaries like split_capture.
+
+    :return: list of record lists
+    """
+
+    def is_chunk_start(position):
+        return records[position][1] == SENT and records[position - 1][1] == RECEIVED
+
+    boundaries = [0]
+    for i in range(1, count):
+        position = max(boundaries[-1], len(records) * i // count, 1)
+        while position < len(records) and not is_chunk_start(position):
+            position += 1
+        if position > boundaries[-1]:
+            boundaries.append(position)
+    boundaries.append(len(records))
+
+    return [records[start:end] for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def decode_raw_records(records):
+    """ decode_records for the records of a raw dump: the timestamps are byte offsets, so there is no latency. """
+
+    rows = decode_records(records)
+    for row in rows:
+        row[-1] = ''
+    return rows
+
+
+def decode_chunk(path, start, end):
+    """ Decode the records between start and end of a capture file. Runs in the worker processes. """
+
+    with open(path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            records = [(timestamp, direction, bytes(frame_bytes))
+                       for position, timestamp, direction, frame_bytes in iter_records(data, start, end)]
+
+    return decode_records(records)
+
+
+def decode_capture(path, output, workers=None, chunks_per_worker=4, raw=False):
+    """ Decode a capture file into csv rows.
+
+    :param path: path of the capture file
+    :param output: text file the csv table is written to
+    :param workers: number of processes. Default is the number of cores.
+    :param raw: True if the file is a raw dump of the bus instead of a capture, see the module doc
+    :return: number of decoded requests
+    """
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if raw:
+        # the framing is cheap and has to run from the start, the decoding of the frames gets spread
+        with open(path, 'rb') as file:
+            records = list(iter_raw_records(file.read()))
+        record_chunks = split_records(records, workers * chunks_per_worker)
+    elif os.path.getsize(path) == 0:
+        chunks = []
+    else:
+        with open(path, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                chunks = split_capture(data, workers * chunks_per_worker)
+
+    writer = csv.writer(output)
+    writer.writerow(COLUMNS)
+    count = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        if raw:
+            results = executor.map(decode_raw_records, record_chunks)
+        else:
+            results = executor.map(decode_chunk, [path] * len(chunks), *zip(*chunks)) if chunks else []
+
+        for rows in results:
+            writer.writerows(rows)
+            count += len(rows)
+
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode a s3200 wire capture into a csv table.')
+    parser.add_argument('capture', help='capture file written by a CaptureWriter')
+    parser.add_argument('output', nargs='?', help='csv file, default is stdout')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes, default: all cores')
+    parser.add_argument('--raw', action='store_true', help='the capture is a raw dump of the bytes on the bus')
+    args = parser.parse_args()
+
+    if args.output is None:
+        decode_capture(args.capture, sys.stdout, args.workers, raw=args.raw)
+    else:
+        with open(args.output, 'w', newline='') as output:
+            decode_capture(args.capture, output, args.workers, raw=args.raw)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+import json
+import os
+from s3200 import core
+import logging
+
+logger = logging.getLogger('s3200')
+
+# the static parts of a setting, the value is not stored
+METADATA_NAMES = ['unit', 'comma', 'factor', 'min_value', 'max_value', 'standard']
+
+
+class SettingCatalog(object):
+    """ The static metadata (unit, comma, factor, min, max and standard) of the settings of a heater.
+
+    The metadata is read once per firmware version and stored in a json file. A S3200 object with a catalog
+    validates writes locally and reads only the values of the settings.
+
+    Example:
+        s = S3200('/dev/ttyAMA0', readonly=False)
+        s.load_setting_catalog('/var/lib/s3200/settings.json')
+        s.set_setting('heating_boiler_should_temperature', 120)  # raises InvalidValueError without bus traffic
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path of the json file holding the metadata of all known firmware versions
+        """
+        self.path = path
+        self.version = None
+        self.settings = {}  # setting name -> metadata dict
+
+    def load(self, s3200):
+        """ Loads the metadata for the firmware version of the heater. Missing settings are read from the heater.
+
+        :param s3200: the S3200 object whose setting_definitions are used
+        """
+
+        self.version = s3200.get_version()
+        versions = self._read_file()
+        self.settings = versions.get(self.version, {})
+
+        missing = {name: definition['address'] for name, definition in s3200.setting_definitions.items()
+                   if name not in self.settings}
+
+        if missing:
+            logger.info('reading the metadata of {0} settings for version {1}'.format(len(missing), self.version))
+            infos = s3200._read_pipelined('get_setting', missing,
+                                          lambda name, payload: core.convert_bytes_to_setting(payload))
+
+            for name, info in infos.items():
+                self.settings[name] = {metadata_name: info[metadata_name] for metadata_name in METADATA_NAMES}
+
+            self.save()
+
+    def _read_file(self):
+        if not os.path.exists(self.path):
+            return {}
+
+        with open(self.path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    def save(self):
+        """ Stores the metadata of the current version in the file. Other versions in the file are kept. """
+
+        versions = self._read_file()
+        versions[self.version] = self.settings
+
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(versions, file, indent=1, sort_keys=True, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def get(self, setting_name):
+        """ Get the metadata dict of a setting or None if it is not in the catalog. """
+        return self.settings.get(setting_name)
+
+    def validate(self, setting_name, value):
+        """ Raises an InvalidValueError if the value is outside of min_value and max_value of the setting. """
+
+        metadata = self.settings.get(setting_name)
+        if metadata is None:
+            return
+
+        if not metadata['min_value'] <= value <= metadata['max_value']:
+            raise core.InvalidValueError("Value {0} of setting '{1}' is not between {2} and {3}".format(
+                value, setting_name, metadata['min_value'], metadata['max_value']))
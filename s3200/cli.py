@@ -0,0 +1,163 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+""" The s3200 console script.
+
+Usage:
+    s3200 watch --port /dev/ttyAMA0 --rate 5 --format jsonl boiler_1_temperature door_contact state
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from s3200 import core, net
+from s3200.obj import S3200, Watcher
+import logging
+
+logger = logging.getLogger('s3200')
+
+FORMATS = ('csv', 'jsonl')
+
+
+class RowWriter(object):
+    """ Formats rows as csv (None is an empty field) or as json lines with a template prepared once. """
+
+    def __init__(self, output, names, output_format='csv'):
+        if output_format not in FORMATS:
+            raise ValueError("Unknown format: '{0}'".format(output_format))
+
+        self.output = output
+        self.output_format = output_format
+
+        if output_format == 'csv':
+            self.csv_writer = csv.writer(output, lineterminator='\n')
+            self.header = ['timestamp'] + list(names)
+        else:
+            keys = [json.dumps(name).replace('{', '{{').replace('}', '}}') for name in ['timestamp'] + list(names)]
+            self.template = '{{' + ','.join(key + ':{}' for key in keys) + '}}\n'
+            self.header = None
+
+    def write_header(self):
+        if self.header is not None:
+            self.csv_writer.writerow(self.header)
+
+    def write(self, row):
+        if self.output_format == 'csv':
+            self.csv_writer.writerow(row)
+            return
+
+        row = [value if isinstance(value, (int, float)) and not isinstance(value, bool) else json.dumps(value)
+               for value in row]
+        self.output.write(self.template.format(*row))
+
+
+def watch(s3200, names, rate, output, output_format='csv', count=None, flush_interval=1.0, report_interval=10.0,
+          report=None, clock=time.monotonic, sleep=time.sleep):
+    """ Polls the names with the given rate and writes one line per sample.
+
+    A sample which fails is logged and written with empty values, the watch goes on. The output is flushed every
+    flush_interval seconds. Achieved and requested rate are given to report every report_interval seconds and at
+    the end.
+
+    :param rate: samples per second
+    :param count: number of samples, None for no limit
+    :param report: function(message), default is writing to stderr
+    :return: number of samples
+    """
+
+    if report is None:
+        def report(message):
+            sys.stderr.write(message + '\n')
+
+    watcher = Watcher(s3200, names)
+    writer = RowWriter(output, names, output_format)
+    writer.write_header()
+
+    period = 1.0 / rate
+    last_flush = last_report = next_due = clock()
+    first_sample = last_sample = None
+    samples = 0
+    failed_samples = 0
+
+    def report_rate():
+        elapsed = last_sample - first_sample if samples > 1 else 0.0
+        achieved = (samples - 1) / elapsed if elapsed > 0 else 0.0
+        failed = ', {0} failed'.format(failed_samples) if failed_samples else ''
+        report('requested {0:.2f}/s achieved {1:.2f}/s ({2} samples{3})'.format(rate, achieved, samples, failed))
+
+    try:
+        while count is None or samples < count:
+            now = clock()
+            if now < next_due:
+                sleep(next_due - now)
+
+            try:
+                row = watcher.read()
+            except (core.S3200Error, OSError) as e:
+                logger.warning('Reading a sample failed: {0!r}'.format(e))
+                failed_samples += 1
+                row = watcher.get_empty_row()
+
+            writer.write(row)
+            samples += 1
+
+            last_sample = clock()
+            if first_sample is None:
+                first_sample = last_sample
+
+            # when the bus is too slow, do not try to catch up with a burst
+            next_due = max(next_due + period, clock() - period)
+
+            now = clock()
+            if now - last_flush >= flush_interval:
+                output.flush()
+                last_flush = now
+            if now - last_report >= report_interval:
+                report_rate()
+                last_report = now
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        output.flush()
+        report_rate()
+
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='s3200', description='Fröling S3200 heater tools.')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    watch_parser = subparsers.add_parser('watch', help='poll values, inputs, outputs or state and stream them')
+    watch_parser.add_argument('names', nargs='+', help='value, input or output names, state or mode')
+    watch_parser.add_argument('--port', default='/dev/ttyAMA0', help='serial port, tcp://host:port or dummy')
+    watch_parser.add_argument('--rate', type=float, default=1.0, help='samples per second')
+    watch_parser.add_argument('--format', choices=FORMATS, default='csv', dest='output_format')
+    watch_parser.add_argument('--count', type=int, default=None, help='number of samples, default: endless')
+    watch_parser.add_argument('--flush-interval', type=float, default=1.0, help='seconds between output flushes')
+    watch_parser.add_argument('--report-interval', type=float, default=10.0,
+                              help='seconds between rate reports on stderr')
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.WARN)
+
+    # one port for the whole session instead of reopening it for every frame
+    connection = net.Connection(args.port, persistent=True)
+    s = S3200(connection=connection)
+
+    output = open(sys.stdout.fileno(), 'w', buffering=65536, encoding='utf-8', closefd=False)
+    try:
+        watch(s, args.names, args.rate, output, args.output_format, args.count,
+              args.flush_interval, args.report_interval)
+    except core.ValueNotDefinedError as e:
+        parser.error(e.msg)
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
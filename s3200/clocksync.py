@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+import time
+from collections import deque, namedtuple
+from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger('s3200')
+
+EPOCH = datetime(1970, 1, 1)
+
+Reading = namedtuple('Reading', ['name', 'value', 'monotonic', 'heater_time'])
+Reading.__doc__ = """ A reading stamped with the local monotonic time and the estimated heater time (naive datetime). """
+
+
+class ClockSync(object):
+    """ Estimates the clock of the heater from occasional get_datetime calls.
+
+    Each sample pairs the heater time with the midpoint of the request and the answer on the local monotonic
+    clock. The heater reports whole seconds, half a second is added to center the rounding error. Offset and
+    drift are fitted with least squares over the last samples, so readings can be stamped with the heater time
+    without a round trip.
+
+    Example:
+        sync = ClockSync(s)
+        reading = sync.read('boiler_1_temperature')
+        print(reading.heater_time, reading.value)
+    """
+
+    def __init__(self, s3200, interval=3600.0, max_samples=16, correct_threshold=None,
+                 clock=time.monotonic, wall_clock=time.time):
+        """
+        :param s3200: the S3200 object of the heater
+        :param interval: seconds between two get_datetime samples
+        :param max_samples: number of samples used for the estimation
+        :param correct_threshold: if the heater clock differs more seconds from the local clock, set_datetime is
+                                  called. None for never. The S3200 object must not be readonly then.
+        :param clock: the local monotonic clock
+        :param wall_clock: the local time as unix timestamp, used for correcting the heater clock
+        """
+        self.s3200 = s3200
+        self.interval = interval
+        self.correct_threshold = correct_threshold
+        self.clock = clock
+        self.wall_clock = wall_clock
+
+        self.samples = deque(maxlen=max_samples)  # (local midpoint, heater seconds - local midpoint)
+        self.last_sample = None
+        self.offset = None  # heater seconds - monotonic seconds at reference
+        self.drift = 0.0  # seconds the heater gains per local second
+        self.reference = None
+
+    def sample(self):
+        """ Reads the heater clock and updates the estimation. If the clock gets corrected, the estimation starts
+        over with a sample of the corrected clock.
+        """
+
+        self._sample()
+
+        if self.correct_threshold is not None and self._correct():
+            self._sample()
+
+    def _sample(self):
+        request_time = self.clock()
+        heater_datetime = self.s3200.get_datetime()
+        answer_time = self.clock()
+
+        midpoint = (request_time + answer_time) / 2
+        heater_seconds = (heater_datetime - EPOCH).total_seconds() + 0.5
+
+        self.samples.append((midpoint, heater_seconds - midpoint))
+        self.last_sample = answer_time
+        self._estimate()
+
+    def _estimate(self):
+        count = len(self.samples)
+        mean_time = sum(sample_time for sample_time, offset in self.samples) / count
+        mean_offset = sum(offset for sample_time, offset in self.samples) / count
+
+        variance = sum((sample_time - mean_time) ** 2 for sample_time, offset in self.samples)
+        if variance > 0:
+            covariance = sum((sample_time - mean_time) * (offset - mean_offset)
+                             for sample_time, offset in self.samples)
+            self.drift = covariance / variance
+        else:
+            self.drift = 0.0
+
+        self.reference = mean_time
+        self.offset = mean_offset
+
+    def _correct(self):
+        """ Sets the heater clock if it is more than correct_threshold off. The samples of the old clock are dropped.
+
+        :return: True if the clock was set
+        """
+
+        wall_time = self.wall_clock()
+        heater_time = self.get_heater_time()
+        difference = (heater_time - datetime.fromtimestamp(wall_time)).total_seconds()
+
+        if abs(difference) <= self.correct_threshold:
+            return False
+
+        logger.info('heater clock is {0:.1f} s off, setting it'.format(difference))
+        self.s3200.set_datetime(datetime.fromtimestamp(wall_time))
+
+        self.samples.clear()
+        self.last_sample = None
+        self.offset = None
+        self.drift = 0.0
+        self.reference = None
+        return True
+
+    def maybe_sample(self):
+        """ Samples the heater clock if there is no estimation yet or the last sample is older than interval. """
+
+        if self.last_sample is None or self.clock() - self.last_sample >= self.interval:
+            self.sample()
+
+    def get_heater_time(self, monotonic=None):
+        """ The estimated heater time at the monotonic time (default now) as naive datetime. """
+
+        if monotonic is None:
+            monotonic = self.clock()
+        if self.offset is None:
+            self.maybe_sample()
+
+        heater_seconds = monotonic + self.offset + self.drift * (monotonic - self.reference)
+        return EPOCH + timedelta(seconds=heater_seconds)
+
+    def stamp(self):
+        """ Get the local monotonic time and the estimated heater time of now. """
+
+        self.maybe_sample()
+        monotonic = self.clock()
+        return monotonic, self.get_heater_time(monotonic)
+
+    def read(self, name):
+        """ Reads a value (see S3200.get) and stamps it with the midpoint of the read.
+
+        :return: a Reading
+        """
+
+        self.maybe_sample()
+
+        request_time = self.clock()
+        value = self.s3200.get(name)
+        midpoint = (request_time + self.clock()) / 2
+
+        return Reading(name, value, midpoint, self.get_heater_time(midpoint))
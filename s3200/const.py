@@ -144,10 +144,13 @@ VALUE_DEFINITIONS = OrderedDict({
     'secondary_air_inlet_position': {'address': b'\x00\x06', 'factor': 1, 'local_name': 'Sekundärluftposition'},
     'air_fan_rotation_speed':       {'address': b'\x00\x07', 'factor': 1, 'local_name': 'Saugzugdrehzahl'},
 
-    'heater_circuit_1_is_temperature':      {'address': b'\x00\x15', 'factor': 2, 'local_name': 'Heizkreis 1 Ist'},
-    'heater_circuit_1_should_temperature':  {'address': b'\x00\x16', 'factor': 2, 'local_name': 'Heizkreis 1 Soll'},
+    'heater_circuit_1_is_temperature':      {'address': b'\x00\x15', 'factor': 2, 'local_name': 'Heizkreis 1 Ist',
+                                             'component': 'heater_circuit_1'},
+    'heater_circuit_1_should_temperature':  {'address': b'\x00\x16', 'factor': 2, 'local_name': 'Heizkreis 1 Soll',
+                                             'component': 'heater_circuit_1'},
 
-    'boiler_1_temperature':              {'address': b'\x00\x5d', 'factor': 2, 'local_name': 'Boilertemperatur 1'},
+    'boiler_1_temperature':              {'address': b'\x00\x5d', 'factor': 2, 'local_name': 'Boilertemperatur 1',
+                                          'component': 'boiler_1'},
     'operating_hours':                   {'address': b'\x00\x62', 'factor': 1, 'local_name': 'Betriebsstunden'},
     'operating_hours_fire_preservation': {
         'address': b'\x00\x73',
@@ -160,7 +163,8 @@ VALUE_DEFINITIONS = OrderedDict({
     'buffer_1_bottom_temperature':  {'address': b'\x00\x78', 'factor': 2, 'local_name': 'Puffer 1 unten'},
 
     'buffer_1_pump':    {'address': b'\x00\x8c', 'factor': 1, 'local_name': 'Pufferpumpenansteuerung 1'},
-    'boiler_1_pump':    {'address': b'\x00\x90', 'factor': 1, 'local_name': 'Boilerpumpenansteuerung 1'},
+    'boiler_1_pump':    {'address': b'\x00\x90', 'factor': 1, 'local_name': 'Boilerpumpenansteuerung 1',
+                         'component': 'boiler_1'},
 })
 
 #The address of the settings
@@ -181,12 +185,19 @@ DIGITAL_OUTPUT_DEFINITIONS = {
     'heating_circuit_pump_2': b'\x00\x01',
     #...
 }
+# the components of CONFIGURATION_STRUCTURE the inputs and outputs belong to. Values have a 'component' key.
+IO_COMPONENTS = {
+    'heating_circuit_pump_1': 'heater_circuit_1',
+    'heating_circuit_pump_2': 'heater_circuit_2',
+}
 ANALOG_OUTPUT_DEFINITIONS = {
     'primary_air': b'\x00\x00',
     'secondary_air': b'\x00\x01',
     #...
 }
 
+WEEKDAY_NAMES = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
 TIME_SLOT_DEFINITIONS = {
     'boiler_1_monday': b'\x00',
     'boiler_1_tuesday': b'\x01',
@@ -200,15 +211,19 @@ TIME_SLOT_DEFINITIONS = {
 
 #### MAPPINGS ####
 
+ERROR_STATUS_NEW = 1
+ERROR_STATUS_ACKNOWLEDGED = 2
+ERROR_STATUS_GONE = 4
+
 ERROR_STATE = {
-    1: 'New',
-    2: 'Quittiert',
-    4: 'Gone',
+    ERROR_STATUS_NEW: 'New',
+    ERROR_STATUS_ACKNOWLEDGED: 'Quittiert',
+    ERROR_STATUS_GONE: 'Gone',
 }
 ERROR_STATE_LOCAL = {
-    1: 'Gekommen',
-    2: 'Quittiert',
-    4: 'Gegangen',
+    ERROR_STATUS_NEW: 'Gekommen',
+    ERROR_STATUS_ACKNOWLEDGED: 'Quittiert',
+    ERROR_STATUS_GONE: 'Gegangen',
 
 }
 TIME_SLOT_REVERSED = OrderedDict((v, k) for k, v in TIME_SLOT_DEFINITIONS.items())
@@ -239,6 +254,7 @@ CONFIGURATION_STRUCTURE = {
 }
 MENU_ITEM_STRUCTURE = {
     'address': {'start': 25, 'end': 27, 'type': 'bytes'},
+    'parent_address': {'start': 27, 'end': 29, 'type': 'bytes'},
     'text': {'start': 29, 'end': -1, 'type': 'string'},
 }
 
@@ -269,6 +285,9 @@ ANALOG_OUTPUT_STRUCTURE = {
     'value': {'start': 1, 'end': 2, 'type': 'short'},
 }
 
+TIME_SLOT_NAMES = ['time_slot_1_start', 'time_slot_1_end', 'time_slot_2_start', 'time_slot_2_end',
+                   'time_slot_3_start', 'time_slot_3_end', 'time_slot_4_start', 'time_slot_4_end']
+
 TIME_SLOT_STRUCTURE = {
     #'address': {'start': 2, 'end': 3, 'type': 'bytes'},
     'address': {'start': 2, 'end': 3, 'type': 'bytes'},
@@ -1,45 +1,34 @@
 #!/usr/bin/python3
 # -*- coding: UTF-8 -*-
-import random
 import string
 
 from s3200 import const
 from collections import OrderedDict
+from functools import reduce
+from operator import xor
 from datetime import datetime, time
 import logging
 
 #---LOGGING---
-# create logger with 'spam_application'
+# no handlers are set up here, that is up to the application using the package
 logger = logging.getLogger('s3200')
-logger.setLevel(logging.WARN)
-# create file handler which logs even debug messages
-#fh = logging.FileHandler('input_output.log')
-#fh.setLevel(logging.INFO)
-# create console handler with a higher log level
-ch = logging.StreamHandler()
-ch.setLevel(logging.DEBUG)
-# create formatter and add it to the handlers
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-#fh.setFormatter(formatter)
-ch.setFormatter(formatter)
-# add the handlers to the logger
-#logger.addHandler(fh)
-logger.addHandler(ch)
 
 
 #---HELPER METHODS---
-def calculate_checksum(data_bytes: bytes):
+def calculate_checksum(*data_bytes: bytes):
     """ Calculates the checksum of the given data.
 
-    :param data_bytes:
+    The checksum is the xor of (byte ^ (byte * 2) & 0xFF) over all bytes. As this is linear it equals
+    (x ^ (x * 2) & 0xFF) of the xor x of all bytes, which is calculated without a python loop.
+
+    :param data_bytes: one or more parts of the data. Passing the parts saves concatenating them.
     """
     crc = 0x00
 
-    for aByte in data_bytes:
-        temp = (aByte * 2) & 0xFF
-        crc = crc ^ aByte ^ temp
+    for part in data_bytes:
+        crc = reduce(xor, part, crc)
 
-    return bytes([crc])
+    return bytes([crc ^ ((crc * 2) & 0xFF)])
 
 
 def convert_bytes_to_datedaytime(date_bytes: bytes):
@@ -153,7 +142,7 @@ def convert_bytes_to_string(byte_data: bytes):
     :param byte_data: data to convert
     """
 
-    string_data = byte_data.decode(encoding='cp1252')
+    string_data = str(byte_data, encoding='cp1252')  # works for bytes and memoryviews
     return string_data
 
 
@@ -194,7 +183,7 @@ def convert_bytes_to_menu_item(menu_item_bytes: bytes):
     text_def = const.MENU_ITEM_STRUCTURE['text']
 
     # get the data from their position in the byte data
-    address = menu_item_bytes[address_def['start']:address_def['end']]
+    address = bytes(menu_item_bytes[address_def['start']:address_def['end']])
     text = convert_bytes_to_string(menu_item_bytes[text_def['start']:text_def['end']])
 
     #build the return dict
@@ -269,15 +258,27 @@ def convert_bytes_to_time10(data_bytes):
     elif data_int > 240:
         raise InvalidValueError('Time value must be between 0 and 240')
 
-    data_str = str(data_int)  # "150"
-
-    hours = int(data_str[:2])  # 15
-    minutes = int(data_str[2:]) * 10  # 0 -> time10 has only 10minutes resolution
+    hours, minutes = divmod(data_int, 10)  # 150 -> 15, 0  time10 has only 10minutes resolution
 
-    return_value = time(hours, minutes)
+    return_value = time(hours, minutes * 10)
     return return_value
 
 
+def convert_time10_to_bytes(time_value: time):
+    """ Get the 1 byte time10 representation of a time. None (no time set) is FFh.
+
+    Example: 15:00 -> 150d = 96h
+    """
+
+    if time_value is None:
+        return b'\xFF'
+
+    if time_value.minute % 10 or time_value.second or time_value.microsecond:
+        raise InvalidValueError('Time value {0} is not a multiple of 10 minutes'.format(time_value))
+
+    return bytes([time_value.hour * 10 + time_value.minute // 10])
+
+
 def convert_bytes_to_state_and_mode(state_mode_bytes: bytes):
     state_and_mode = convert_structure_to_dict(state_mode_bytes, const.STATE_AND_MODE_STRUCTURE)
     state_and_mode_string = state_and_mode['text']
@@ -299,18 +300,118 @@ def convert_bytes_to_mode(state_mode_bytes: bytes):
     return mode
 
 
+def convert_bytes_to_version(payload: bytes):
+    """ Get the software version string from the get_version_and_datetime answer.
+
+    The first 4 bytes are the software version. Example: 50 04 04 14 -> '50.04.04.14'
+    """
+    return '.'.join(['{:02x}'.format(i) for i in payload[:4]])
+
+
+def convert_bytes_to_version_datetime(payload: bytes):
+    """ Get the datetime from the get_version_and_datetime answer. The 7 bytes after the version are the date. """
+    return convert_bytes_to_datedaytime(payload[4:11])
+
+
+def convert_bytes_to_digital_io(payload: bytes, structure: dict):
+    """ Get the state of a digital input or output. A manual override (mode '0' or '1') wins over the value. """
+
+    digital_io = convert_structure_to_dict(payload, structure)
+
+    return_bool = None
+    if digital_io['mode'] == 'A':  # \x41 = A = Auto
+        return_bool = bool(digital_io['value'] == 1)
+    elif digital_io['mode'] == '0':  # \x30 = 0 = False
+        return_bool = False
+    elif digital_io['mode'] == '1':  # \x31 = 1 = True
+        return_bool = True
+
+    return return_bool
+
+
+def convert_bytes_to_analog_output(payload: bytes):
+    """ Get the value of an analog output. A manual override wins over the value. """
+
+    analog_output = convert_structure_to_dict(payload, const.ANALOG_OUTPUT_STRUCTURE)
+
+    if analog_output['mode'] == 255:  # Auto mode
+        return analog_output['value']
+    else:
+        return analog_output['mode']  # Manual override
+
+
+def convert_digital_io_mode_to_bytes(value):
+    """ Get the mode byte of a manual override, the counterpart of convert_bytes_to_digital_io.
+
+    :param value: True -> '1', False -> '0', None (automatic) -> 'A'
+    """
+
+    if value is None:
+        return b'A'
+    elif value is True:
+        return b'1'
+    elif value is False:
+        return b'0'
+
+    raise InvalidValueError('Digital value {0} is not True, False or None'.format(value))
+
+
+def convert_analog_output_mode_to_bytes(value):
+    """ Get the mode byte of a manual override, the counterpart of convert_bytes_to_analog_output.
+
+    :param value: 0 to 100, None (automatic) -> FFh
+    """
+
+    if value is None:
+        return b'\xFF'
+
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= 100:
+        raise InvalidValueError('Analog value {0} is not between 0 and 100'.format(value))
+
+    return bytes([value])
+
+
 def convert_bytes_to_setting(payload: bytes):
     return convert_structure_to_dict(payload, const.SETTING_STRUCTURE)
 
 
+def convert_bytes_to_setting_value(payload: bytes):
+    """ Get only the raw value of a get_setting answer. """
+    value_structure = const.SETTING_STRUCTURE['value']
+    return convert_short_to_integer(payload[value_structure['start']:value_structure['end']])
+
+
 def convert_bytes_to_available_value(payload: bytes):
     return convert_structure_to_dict(payload, const.AVAILABLE_VALUE_STRUCTURE)
 
+def get_time_slot_name(item: str, weekday: int):
+    """ Get the name of a time slot. Example: 'boiler_1', 0 -> 'boiler_1_monday'
+
+    :param weekday: 0=Monday 6=Sunday
+    """
+    return '{0}_{1}'.format(item, const.WEEKDAY_NAMES[weekday])
+
+
 def convert_time_slot_to_bytes(item, weekday, time_slot_1_start, time_slot_1_end, time_slot_2_start, time_slot_2_end,
                              time_slot_3_start, time_slot_3_end, time_slot_4_start, time_slot_4_end):
+    """ Get the payload of set_time_slot.
+
+    The payload has the layout of the get_time_slot answer from the address on:
+    address(1) then start and end of the 4 time slots as time10 (8)
+    """
+
+    name = get_time_slot_name(item, weekday)
+    try:
+        address = const.TIME_SLOT_DEFINITIONS[name]
+    except KeyError:
+        raise ValueNotDefinedError("Time slot: '{0}' not defined in TIME_SLOT_DEFINITIONS".format(name)) from None
+
+    times = (time_slot_1_start, time_slot_1_end, time_slot_2_start, time_slot_2_end,
+             time_slot_3_start, time_slot_3_end, time_slot_4_start, time_slot_4_end)
+
+    data_bytes = address + b''.join(convert_time10_to_bytes(time_value) for time_value in times)
+    return data_bytes
 
-    raise NotImplementedError
-    #return data_bytes
 
 def is_flag_set(flag_data_bytes: bytes, position_from_left):
     bin_string = ""
@@ -341,6 +442,42 @@ def unescape(data):
     return replace_all(data, const.UNESCAPE_LIST)
 
 
+def get_frame_length(data: bytes):
+    """ Get the length of the first frame in the escaped data.
+
+    :param data: escaped bytes starting with the start bytes of a frame
+    :return: the number of escaped bytes of the frame or None if the frame is not complete yet
+    """
+
+    position = len(const.START_BYTES)
+    needed = 2  # the length bytes, afterwards the command, payload and checksum
+    count = 0
+    length_bytes = b''
+
+    while True:
+        if count == needed:
+            if length_bytes is None:
+                return position
+
+            length = convert_short_to_integer(unescape(length_bytes))
+            needed += length + 1  # +1 for the checksum
+            length_bytes = None
+            continue
+
+        if position >= len(data):
+            return None
+
+        step = 2 if data[position] in const.ESCAPED_IDENTIFIER else 1
+        if position + step > len(data):
+            return None
+
+        if length_bytes is not None:
+            length_bytes += data[position:position + step]
+
+        position += step
+        count += 1
+
+
 def replace_all(data: bytes, dic: OrderedDict):
     """ Replaces all occurrences of a byte.
 
@@ -359,6 +496,8 @@ def get_random_string(size=10, chars=string.ascii_letters + string.digits):
     :param size: length of the random string
     :param chars: chars the random string should contain default is ascii_letters + digits
     """
+    import random  # only needed for testing the connection
+
     return ''.join(random.choice(chars) for _ in range(size))
 
 
@@ -374,8 +513,14 @@ class Frame(object):
     00 62 -> Payload (in this case the address of the operating hours)
     F2    -> Checksum
 
+    Frames made by from_bytes have a memoryview into the received bytes as payload. Use copy to get a frame
+    which owns its payload.
     """
 
+    __slots__ = ('command', 'payload')
+
+    _ESCAPED_IDENTIFIERS = [bytes([identifier]) for identifier in const.ESCAPED_IDENTIFIER]
+
     #---CONSTRUCTORS---
     def __init__(self, command: bytes=None, payload: bytes=None):
         self.command = command
@@ -391,41 +536,51 @@ class Frame(object):
     def from_bytes(frame_bytes: bytes):
         """ Get a frame object from its byte representation.
 
+        The payload of the frame is a memoryview into frame_bytes. Only frames with escaped content get copied once
+        for unescaping.
+
         :param frame_bytes: a frame in byte form
         """
 
         #example frame (in hex) 02 fd 00 03 30 00 30 04
         start_bytes = frame_bytes[:2]  # 02 fd
 
-        #unescape
-        escaped_content = frame_bytes[2:]  # 00 03 30 00 30 04
-        unescaped_content = unescape(escaped_content)  # 00 03 30 00 30 04 this example has no escaped content
-
-        #get values from unescaped
-        length_bytes = unescaped_content[:2]  # 00 03
-        command_byte = unescaped_content[2:3]  # 30
-        payload_bytes = unescaped_content[3:-1]  # 00 30
-        checksum_byte = unescaped_content[-1:]  # 04
-
         #check start bytes
         if not start_bytes == const.START_BYTES:
             raise CommunicationError("Start bytes must be: {0} but are: {1}".format(
                 convert_bytes_to_hex(const.START_BYTES),
                 convert_bytes_to_hex(start_bytes)))
 
+        #unescape only if needed
+        if not isinstance(frame_bytes, (bytes, bytearray)):
+            frame_bytes = bytes(frame_bytes)
+
+        if any(frame_bytes.find(identifier, 2) != -1 for identifier in Frame._ESCAPED_IDENTIFIERS):
+            content = memoryview(unescape(bytes(frame_bytes[2:])))  # the only copy
+        else:
+            content = memoryview(frame_bytes)[2:]  # 00 03 30 00 30 04 this example has no escaped content
+
+        #get values from unescaped
+        command_byte = bytes(content[2:3])  # 30
+        payload_bytes = content[3:-1]  # 00 30
+        checksum_byte = content[-1]  # 04
+
         #check checksum
-        calculated_checksum = calculate_checksum(start_bytes + length_bytes + command_byte + payload_bytes)
+        calculated_checksum = calculate_checksum(const.START_BYTES, content[:-1])
 
-        #if len(payload_bytes) > 0:
-        if not checksum_byte[0] == calculated_checksum[0]:
+        if not checksum_byte == calculated_checksum[0]:
             raise CommunicationError(
                 "Checksum byte doesnt match. Received:{0} Calculated:{1}. Complete frame:{2}".format(
-                    convert_bytes_to_hex(checksum_byte), convert_bytes_to_hex(calculated_checksum),
+                    convert_bytes_to_hex([checksum_byte]), convert_bytes_to_hex(calculated_checksum),
                     convert_bytes_to_hex(frame_bytes)))
 
         #build return frame
         return Frame(command_byte, payload_bytes)
 
+    def copy(self):
+        """ Get a frame which owns its command and payload bytes. """
+        return Frame(bytes(self.command), bytes(self.payload))
+
     #---METHODS---
     def to_bytes(self):
         """ Convert a frame object to its send ready byte representation. """
@@ -440,7 +595,7 @@ class Frame(object):
         length_bytes = convert_integer_to_short(length)
 
         #calculate checksum
-        checksum = calculate_checksum(const.START_BYTES + length_bytes + self.command + self.payload)
+        checksum = calculate_checksum(const.START_BYTES, length_bytes, self.command, self.payload)
 
         #escape all except the start bytes
         content_unescaped = length_bytes + self.command + self.payload + checksum
@@ -518,6 +673,36 @@ class WrongNumberOfAnswerFramesError(S3200Error):
         self.got = got
         self.base_error = base_error
 
+class DeadlineExceededError(S3200Error):
+    """ Exception raised when the deadline of a call passed before its answers arrived.
+
+       Attributes:
+        stage    -- how far the request got: NOT_SENT, NO_ANSWER or PARTIAL (some answer frames arrived)
+        expected -- number of expected answer frames, 0 if unknown (lists)
+        got      -- number of answer frames (list items) which arrived
+    """
+
+    NOT_SENT = 'not_sent'
+    NO_ANSWER = 'no_answer'
+    PARTIAL = 'partial'
+
+    def __init__(self, msg, stage, expected=0, got=0):
+        super().__init__(msg)
+        self.stage = stage
+        self.expected = expected
+        self.got = got
+
+
+class CircuitOpenError(CommunicationError):
+    """ Exception raised when a request is refused without sending it because the heater is known to be down.
+    """
+
+
+class RequestDroppedError(S3200Error):
+    """ Exception raised when a request was dropped by the bus scheduler to shed load.
+    """
+
+
 class ReferenceValueNotInConst(S3200Error):
     """ Exception raised when value is references that is not defined in const
     """
\ No newline at end of file
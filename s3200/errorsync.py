@@ -0,0 +1,142 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+import json
+import os
+from datetime import datetime
+from s3200 import const, core
+import logging
+
+logger = logging.getLogger('s3200')
+
+
+class ErrorSync(object):
+    """ Reads only the new or changed errors from the error buffer of the heater.
+
+    A watermark (the datetime and numbers of the newest known errors) and the status of all errors which are
+    not gone yet are stored per heater in a json file. The heater lists the newest errors first, so the walk
+    through the error buffer stops as soon as it reached known errors and saw all errors which might still change.
+
+    Example:
+        sync = ErrorSync(S3200('/dev/ttyAMA0'), '/var/lib/s3200/errors.json')
+        for error in sync.sync():
+            print(error['text'], error['status_name'])
+    """
+
+    def __init__(self, s3200, path, heater_id=None, newest_first=True):
+        """
+        :param s3200: the S3200 object to read the errors from
+        :param path: path of the json file holding the watermarks
+        :param heater_id: key of the heater in the file, default is the name of the serial port. Required for
+                          connections without one, like the one of a gateway.GatewayClient.
+        :param newest_first: the heater lists the newest errors first. If False the whole buffer is read every time.
+        """
+        self.s3200 = s3200
+        self.path = path
+        if heater_id is None:
+            heater_id = getattr(s3200.connection, 'serial_port_name', None)
+            if heater_id is None:
+                raise ValueError("The connection has no serial port name, a heater_id is needed")
+
+        self.heater_id = heater_id
+        self.newest_first = newest_first
+
+        self.watermark = None  # datetime of the newest known error
+        self.latest = set()  # numbers of the known errors with the watermark datetime
+        self.open = {}  # key -> status of the known errors which are not gone yet
+        self.load()
+
+    @staticmethod
+    def get_key(error):
+        return '{0}|{1}'.format(error['number'], error['datetime'].isoformat())
+
+    def load(self):
+        """ Loads the watermark of the heater from the file. """
+
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'r', encoding='utf-8') as file:
+            state = json.load(file).get(self.heater_id)
+
+        if state is None:
+            return
+
+        self.watermark = datetime.strptime(state['watermark'], '%Y-%m-%dT%H:%M:%S') if state['watermark'] else None
+        self.latest = set(state['latest'])
+        self.open = dict(state['open'])
+
+    def save(self):
+        """ Stores the watermark of the heater in the file. Other heaters in the file are kept. """
+
+        states = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as file:
+                states = json.load(file)
+
+        states[self.heater_id] = {
+            'watermark': self.watermark.isoformat() if self.watermark else None,
+            'latest': sorted(self.latest),
+            'open': self.open,
+        }
+
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(states, file, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+    def is_known(self, error):
+        if self.watermark is None:
+            return False
+        return error['datetime'] < self.watermark or (error['datetime'] == self.watermark and
+                                                      error['number'] in self.latest)
+
+    def sync(self):
+        """ Get the errors which are new or changed their status since the last sync.
+
+        :return: list of error dicts like S3200.get_errors
+        """
+
+        changed = []
+        remaining_open = set(self.open)
+        newest = []
+
+        def process(frame):
+            error = core.convert_bytes_to_error(frame.payload)
+            key = self.get_key(error)
+            known = self.is_known(error)
+
+            if not known:
+                changed.append(error)
+                newest.append(error)
+                if error['status'] != const.ERROR_STATUS_GONE:
+                    self.open[key] = error['status']
+
+            elif key in remaining_open:
+                remaining_open.discard(key)
+                if self.open[key] != error['status']:
+                    changed.append(error)
+                    self.open[key] = error['status']
+                if error['status'] == const.ERROR_STATUS_GONE:
+                    del self.open[key]
+
+            # stop when reaching known errors and no error which might change is left
+            return self.newest_first and known and not remaining_open
+
+        command_start_address = self.s3200.command_definitions['get_error']['address']
+        command_next_address = self.s3200.command_definitions['get_next_error']['address']
+        self.s3200.connection.get_list(command_start_address, command_next_address, stop=process)
+
+        # open errors which are not in the buffer anymore can not change
+        for key in remaining_open:
+            del self.open[key]
+
+        if newest:
+            newest_datetime = max(error['datetime'] for error in newest)
+            if self.watermark is None or newest_datetime > self.watermark:
+                self.watermark = newest_datetime
+                self.latest = set()
+            self.latest.update(error['number'] for error in newest if error['datetime'] == self.watermark)
+
+        self.save()
+        return changed
@@ -0,0 +1,433 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+""" A gateway daemon which owns the serial connection and shares it with many local clients.
+
+The clients talk to the gateway over a unix socket with a small binary protocol:
+
+Request:
+    op(1) param(1) budget(4) length(2) body(length)
+    OP_FRAME:  param = number of answer frames, body = command + payload
+    OP_LIST:   param = 0, body = start command + next command + max_loops(2)
+    OP_FRAMES: param = number of answer frames of each frame, body = flags(1) window(1) then for every frame:
+               length(2) command + payload. The gateway sends the frames back to back like net.Connection.send_frames.
+    budget is the time left until the deadline of the client in milliseconds, 0 for no deadline. The gateway drops
+    the request if it expires before it is sent.
+
+Response:
+    status(1) count(2) then count times: length(2) body(length)
+    STATUS_OK:    each body is the command + payload of an answer frame, empty for a broken one (FLAG_ALLOW_BROKEN)
+    STATUS_ERROR: one body: expected(2) got(2) stage(1) error class name + b'\\0' + message
+                  stage is the index of the DeadlineExceededError stage in ERROR_STAGES, 0 for other errors
+
+Identical requests which arrive while the same request is already being processed are answered
+with the result of that one bus transaction.
+"""
+
+import argparse
+import errno
+import os
+import socket
+import socketserver
+import threading
+import time
+from struct import Struct
+from s3200 import core, net
+from s3200.core import Frame
+from s3200.obj import S3200
+import logging
+
+logger = logging.getLogger('s3200')
+
+DEFAULT_SOCKET_PATH = '/tmp/s3200.sock'
+
+OP_FRAME = 1
+OP_LIST = 2
+OP_FRAMES = 3
+
+# flags of OP_FRAMES, the allow_missing and allow_broken arguments of send_frames
+FLAG_ALLOW_MISSING = 1
+FLAG_ALLOW_BROKEN = 2
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+ERROR_STAGES = (None, core.DeadlineExceededError.NOT_SENT, core.DeadlineExceededError.NO_ANSWER,
+                core.DeadlineExceededError.PARTIAL)
+
+StructRequestHeader = Struct('!BBIH')
+StructResponseHeader = Struct('!BH')
+StructLength = Struct('!H')
+StructListBody = Struct('!ccH')
+StructErrorHeader = Struct('!HHB')
+StructFramesHeader = Struct('!BB')
+
+
+def _receive_exactly(sock, length):
+    """ Reads exactly length bytes from the socket.
+
+    :raise ConnectionError: if the socket got closed before
+    """
+    data = bytearray()
+
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            raise ConnectionError("Socket closed after {0} of {1} bytes.".format(len(data), length))
+        data += chunk
+
+    return bytes(data)
+
+
+def encode_request(op, param, body, deadline=None):
+    """ :param deadline: time.monotonic() value the gateway gets as budget, None for none """
+
+    budget = 0
+    if deadline is not None:
+        # at least 1 ms, 0 would be no deadline
+        budget = max(1, min(0xFFFFFFFF, int((deadline - time.monotonic()) * 1000)))
+
+    return StructRequestHeader.pack(op, param, budget, len(body)) + body
+
+
+def encode_frames(frames):
+    """ Get the response of answer frames. None (a broken answer frame) becomes an empty body. """
+
+    data = bytearray(StructResponseHeader.pack(STATUS_OK, len(frames)))
+
+    for frame in frames:
+        body = b'' if frame is None else bytes(frame.command) + bytes(frame.payload)
+        data += StructLength.pack(len(body))
+        data += body
+
+    return bytes(data)
+
+
+def encode_frames_body(frames, window, allow_missing, allow_broken):
+    flags = (FLAG_ALLOW_MISSING if allow_missing else 0) | (FLAG_ALLOW_BROKEN if allow_broken else 0)
+    data = bytearray(StructFramesHeader.pack(flags, window))
+
+    for frame in frames:
+        body = bytes(frame.command) + bytes(frame.payload)
+        data += StructLength.pack(len(body))
+        data += body
+
+    return bytes(data)
+
+
+def decode_frames_body(body):
+    """ Get the frames, window, allow_missing and allow_broken of the body of an OP_FRAMES request. """
+
+    flags, window = StructFramesHeader.unpack_from(body)
+    position = StructFramesHeader.size
+    frames = []
+
+    while position < len(body):
+        length, = StructLength.unpack_from(body, position)
+        position += StructLength.size
+        frames.append(Frame(body[position:position + 1], body[position + 1:position + length]))
+        position += length
+
+    return frames, window, bool(flags & FLAG_ALLOW_MISSING), bool(flags & FLAG_ALLOW_BROKEN)
+
+
+def encode_error(error):
+    expected = got = stage = 0
+    if isinstance(error, (core.WrongNumberOfAnswerFramesError, core.DeadlineExceededError)):
+        expected, got = error.expected, error.got
+    if isinstance(error, core.DeadlineExceededError):
+        stage = ERROR_STAGES.index(error.stage)
+
+    body = StructErrorHeader.pack(expected, got, stage)
+    body += type(error).__name__.encode() + b'\x00' + str(getattr(error, 'msg', error)).encode()
+
+    return StructResponseHeader.pack(STATUS_ERROR, 1) + StructLength.pack(len(body)) + body
+
+
+def decode_error(body):
+    """ Get the exception for an error body. Errors which are not defined in core become CommunicationErrors """
+
+    expected, got, stage = StructErrorHeader.unpack(body[:StructErrorHeader.size])
+    name, msg = body[StructErrorHeader.size:].split(b'\x00', 1)
+    name, msg = name.decode(), msg.decode()
+
+    if name == 'WrongNumberOfAnswerFramesError':
+        return core.WrongNumberOfAnswerFramesError(msg, expected, got, core.NothingToReadError(msg))
+    if name == 'DeadlineExceededError':
+        return core.DeadlineExceededError(msg, ERROR_STAGES[stage], expected, got)
+
+    error_class = getattr(core, name, None)
+    if not (isinstance(error_class, type) and issubclass(error_class, core.S3200Error)):
+        error_class = core.CommunicationError
+
+    return error_class(msg)
+
+
+def _remove_stale_socket(socket_path):
+    """ Removes the socket of a gateway which is gone. A socket which still accepts connections is left alone.
+
+    :raise OSError: (EADDRINUSE) if another gateway serves the socket
+    """
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except ConnectionRefusedError:
+        os.unlink(socket_path)
+        return
+    finally:
+        sock.close()
+
+    raise OSError(errno.EADDRINUSE, "Another gateway is serving {0}".format(socket_path))
+
+
+class Gateway(socketserver.ThreadingUnixStreamServer):
+    """ Owns the connection to the heater and serves the requests of the clients. """
+
+    daemon_threads = True
+
+    def __init__(self, connection, socket_path=DEFAULT_SOCKET_PATH):
+        """
+        :param connection: the net.Connection to the heater
+        :param socket_path: path of the unix socket the clients connect to
+        :raise OSError: (EADDRINUSE) if another gateway serves the socket path
+        """
+        if os.path.exists(socket_path):
+            _remove_stale_socket(socket_path)
+
+        super().__init__(socket_path, GatewayHandler)
+        self.connection = connection
+        self.socket_path = socket_path
+        self.thread = None
+
+        self.in_flight = {}
+        self.in_flight_lock = threading.Lock()
+        self.request_count = 0
+        self.transaction_count = 0
+
+    def start(self):
+        """ Serves the clients in a background thread. """
+        self.thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def execute(self, op, param, body, deadline=None):
+        """ Executes one request. Identical requests which are in flight share one bus transaction.
+
+        :param deadline: time.monotonic() value after which the client does not wait anymore, None for none.
+                         The bus transaction of a request which joined another one runs with the deadline of that.
+        :raise DeadlineExceededError: if the deadline passed before the answers arrived
+        """
+
+        key = (op, param, body)
+
+        with self.in_flight_lock:
+            self.request_count += 1
+            call = self.in_flight.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self.in_flight[key] = _InFlightCall()
+
+        if is_leader:
+            try:
+                with net.deadline_scope(deadline):
+                    call.result = self._execute(op, param, body)
+            except Exception as e:  # all errors are passed on to the clients
+                call.error = e
+            finally:
+                with self.in_flight_lock:
+                    del self.in_flight[key]
+                call.done.set()
+        elif not call.done.wait(None if deadline is None else max(0.0, deadline - time.monotonic())):
+            raise core.DeadlineExceededError("The deadline passed waiting for the same request of another client",
+                                             core.DeadlineExceededError.NO_ANSWER)
+
+        if call.error is not None:
+            raise call.error
+
+        return call.result
+
+    def _execute(self, op, param, body):
+        self.transaction_count += 1
+
+        if op == OP_FRAME:
+            frame = Frame(body[:1], body[1:])
+            answer = self.connection.send_frame(frame, read_answer_frames=param)
+            return answer if isinstance(answer, list) else [answer]
+
+        elif op == OP_LIST:
+            command_start_address, command_next_address, max_loops = StructListBody.unpack(body)
+            return self.connection.get_list(command_start_address, command_next_address, max_loops=max_loops)
+
+        elif op == OP_FRAMES:
+            frames, window, allow_missing, allow_broken = decode_frames_body(body)
+            return self.connection.send_frames(frames, window=window, read_answer_frames=param,
+                                               allow_missing=allow_missing, allow_broken=allow_broken)
+
+        raise core.CommunicationError("Unknown gateway operation: {0}".format(op))
+
+
+class _InFlightCall(object):
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class GatewayHandler(socketserver.BaseRequestHandler):
+    """ Serves the requests of one client connection. """
+
+    def handle(self):
+        try:
+            while True:
+                op, param, budget, length = StructRequestHeader.unpack(
+                    _receive_exactly(self.request, StructRequestHeader.size))
+                body = _receive_exactly(self.request, length)
+                deadline = time.monotonic() + budget / 1000 if budget else None
+
+                try:
+                    response = encode_frames(self.server.execute(op, param, body, deadline))
+                except Exception as e:
+                    logger.info('gateway request failed: {0!r}'.format(e))
+                    response = encode_error(e)
+
+                self.request.sendall(response)
+        except ConnectionError:
+            pass  # client is gone
+
+
+class GatewayConnection(object):
+    """ A connection to the heater over a gateway. Offers the same methods as net.Connection. """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, timeout=30):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.sock = None
+        self.lock = threading.RLock()
+        self.last_activity = None  # time.monotonic() of the last answered request of this client
+
+    def _connect(self):
+        if self.sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self.sock = sock
+        return self.sock
+
+    def close(self):
+        with self.lock:
+            if self.sock is not None:
+                self.sock.close()
+                self.sock = None
+
+    def _request(self, op, param, body):
+        deadline = net.get_deadline()
+
+        with net.locked(self.lock):
+            try:
+                sock = self._connect()
+                sock.sendall(encode_request(op, param, body, deadline))
+
+                # the answer of the gateway comes in one piece, so a passed deadline means no answer at all
+                if deadline is not None:
+                    sock.settimeout(max(0.0, min(self.timeout, deadline - time.monotonic())))
+
+                status, count = StructResponseHeader.unpack(_receive_exactly(sock, StructResponseHeader.size))
+                bodies = []
+                for i in range(count):
+                    length, = StructLength.unpack(_receive_exactly(sock, StructLength.size))
+                    bodies.append(_receive_exactly(sock, length))
+
+                if deadline is not None:
+                    sock.settimeout(self.timeout)
+
+            except OSError as e:
+                # the answer may still arrive, the socket can not be used anymore
+                self.close()
+
+                if isinstance(e, (socket.timeout, BlockingIOError)) and net.is_expired(deadline):
+                    raise core.DeadlineExceededError("The deadline passed waiting for the gateway",
+                                                     core.DeadlineExceededError.NO_ANSWER,
+                                                     param if op == OP_FRAME else 0) from e
+
+                raise core.CommunicationError("Gateway communication failed: {0}".format(e)) from e
+
+        if status != STATUS_OK:
+            raise decode_error(bodies[0])
+
+        self.last_activity = time.monotonic()
+        return [Frame(body[:1], body[1:]) if body else None for body in bodies]
+
+    def send(self, command: bytes=None, payload: bytes=None):
+        """ Shortcut for send_frame. Builds the Frame object and sends it. """
+        return self.send_frame(Frame(command, payload))
+
+    def send_frame(self, frame, read_answer_frames=1):
+        """ Sends one frame over the gateway and receives the answer frame(s). """
+
+        answer_frames = self._request(OP_FRAME, read_answer_frames, bytes(frame.command) + bytes(frame.payload))
+
+        if len(answer_frames) > 1:
+            return answer_frames
+        else:
+            return answer_frames[0]
+
+    def send_frames(self, frames, window=8, read_answer_frames=1, allow_missing=False, allow_broken=False):
+        """ Sends several frames in one request to the gateway, which sends them back to back. The answers and
+        errors are the ones of net.Connection.send_frames.
+        """
+
+        if not frames:
+            return []
+
+        return self._request(OP_FRAMES, read_answer_frames,
+                             encode_frames_body(frames, window, allow_missing, allow_broken))
+
+    def get_list(self, command_start_address: bytes, command_next_address: bytes, max_loops=500, stop=None):
+        """ Get all items of a list. The gateway walks the list in one go.
+
+        :param stop: only called for the items, the gateway always walks the complete list
+        """
+
+        body = StructListBody.pack(command_start_address, command_next_address, max_loops)
+        output = self._request(OP_LIST, 0, body)
+
+        if stop is not None:
+            for position, answer_frame in enumerate(output):
+                if stop(answer_frame):
+                    return output[:position + 1]
+
+        return output
+
+
+class GatewayClient(S3200):
+    """ A S3200 which talks to the heater over a gateway. """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, **kwargs):
+        super().__init__(connection=GatewayConnection(socket_path), **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Share the connection to a s3200 heater with local clients.')
+    parser.add_argument('--port', default='/dev/ttyAMA0', help='serial port, tcp://host:port or dummy')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET_PATH, help='path of the unix socket')
+    args = parser.parse_args()
+
+    gateway = Gateway(net.Connection(args.port, persistent=True), args.socket)
+    try:
+        gateway.serve_forever()
+    finally:
+        gateway.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+import threading
+import time
+import logging
+
+logger = logging.getLogger('s3200')
+
+# the heater leaves force mode if it receives no command within this time (seconds)
+FORCE_MODE_DEADLINE = 30.0
+
+
+class Keepalive(object):
+    """ Keeps the force mode of the heater active.
+
+    Every answer of the connection (polling, each item of a list walk, writes) counts as proof of life. A
+    dedicated keepalive (get_force) is only sent if the bus was idle until margin seconds before the deadline.
+
+    Example:
+        s.set_force_mode(True)
+        keepalive = Keepalive(s)
+        keepalive.start()
+        s.set_digital_output('heating_circuit_pump_1', True)
+        ...
+        keepalive.stop()
+        s.set_force_mode(False)
+    """
+
+    def __init__(self, s3200, deadline=FORCE_MODE_DEADLINE, margin=5.0, on_force_lost=None, clock=time.monotonic):
+        """
+        :param s3200: the S3200 object in force mode
+        :param deadline: seconds without a command after which the heater leaves force mode
+        :param margin: the keepalive is sent this many seconds before the deadline
+        :param on_force_lost: called without arguments if a keepalive shows that force mode is not active anymore
+        :param clock: function returning the current time, must use the timebase of time.monotonic
+        """
+        self.s3200 = s3200
+        self.deadline = deadline
+        self.margin = margin
+        self.on_force_lost = on_force_lost
+        self.clock = clock
+
+        self.keepalive_count = 0
+        self.last_keepalive = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def get_last_activity(self):
+        """ The time of the last command the heater answered, None if unknown. """
+
+        activities = [activity for activity in (getattr(self.s3200.connection, 'last_activity', None),
+                                                self.last_keepalive) if activity is not None]
+        return max(activities) if activities else None
+
+    def get_next_due(self):
+        """ The time the next keepalive has to be sent if there is no other traffic until then. """
+
+        last_activity = self.get_last_activity()
+        if last_activity is None:
+            return self.clock()
+
+        return last_activity + self.deadline - self.margin
+
+    def check(self):
+        """ Sends a keepalive if the bus was idle for too long.
+
+        :return: True if a keepalive was sent
+        """
+
+        if self.clock() < self.get_next_due():
+            return False
+
+        self.keepalive_count += 1
+        self.last_keepalive = self.clock()
+        is_force_active = self.s3200.is_force_active()
+
+        if not is_force_active:
+            logger.warning('Force mode is not active anymore')
+            if self.on_force_lost is not None:
+                self.on_force_lost()
+
+        return True
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning('Keepalive failed: {0!r}'.format(e))
+                self.stopped.wait(1.0)
+                continue
+
+            self.stopped.wait(max(0, self.get_next_due() - self.clock()))
+
+    def start(self):
+        """ Starts the keepalive thread. """
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,169 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+import json
+import os
+from s3200 import core
+from s3200.core import Frame
+from s3200.protocol import ListWalkState
+import logging
+
+logger = logging.getLogger('s3200')
+
+# errors after which the walk is retried
+TRANSIENT_ERRORS = (core.CommunicationError, core.NothingToReadError, core.WrongNumberOfAnswerFramesError,
+                    core.FrameSyntaxError, OSError)
+
+
+def is_not_sent(error):
+    """ True if the request failed with error before it reached the heater, so the list cursor did not move. """
+
+    if isinstance(error, core.DeadlineExceededError):
+        return error.stage == core.DeadlineExceededError.NOT_SENT
+    return isinstance(error, (core.CircuitOpenError, core.RequestDroppedError))
+
+
+class ListWalk(object):
+    """ A list walk (like Connection.get_list) which stores its progress in a json file when it gets interrupted.
+
+    The checkpoint holds the items read so far and the cursor of the heater: the number of answered requests since
+    the first item, or None if it is unknown. The heater moves its cursor for every request it gets, whether the
+    answer arrives or not. After a request without (intact) answer, or a crash during a request, the cursor is
+    unknown and the walk restarts from the first item. Only walks which stopped between two requests, eg. because
+    the circuit of a watchdog was open, a deadline passed before sending or max_loops was reached, continue with a
+    next-item frame. If the first answer after resuming is an item which was read already, the cursor was reset
+    (eg. by another walk of the same list) and the walk restarts too.
+
+    Example:
+        walk = ListWalk(connection, b'\\x37', b'\\x38', '/var/lib/s3200/menu.json', max_loops=5000)
+        frames = walk.run()
+    """
+
+    def __init__(self, connection, command_start_address: bytes, command_next_address: bytes, path,
+                 walk_id=None, max_loops=500, retries=3):
+        """
+        :param connection: the connection to walk the list with
+        :param path: path of the json checkpoint file
+        :param walk_id: key of the walk in the file, default is made of the command addresses
+        :param retries: number of retries after transient errors before the error is raised
+        """
+        self.connection = connection
+        self.command_start_address = command_start_address
+        self.command_next_address = command_next_address
+        self.path = path
+        self.walk_id = walk_id if walk_id is not None else '{0}-{1}'.format(command_start_address.hex(),
+                                                                          command_next_address.hex())
+        self.max_loops = max_loops
+        self.retries = retries
+
+        self.items = []
+        self.cursor = None  # answered requests since the first item, None if unknown
+        self.resume_count = 0
+        self.restart_count = 0
+
+    def _read_file(self):
+        if not os.path.exists(self.path):
+            return {}
+
+        with open(self.path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    def load(self):
+        """ Loads the items and the cursor of an interrupted walk. """
+
+        state = self._read_file().get(self.walk_id)
+        self.items = [] if state is None else [Frame.from_bytes(bytes.fromhex(item)) for item in state['items']]
+        self.cursor = None if state is None else state.get('cursor')
+
+    def save(self, complete=False):
+        """ Stores the items read so far and the cursor. A complete walk removes its checkpoint. """
+
+        walks = self._read_file()
+
+        if complete:
+            if walks.pop(self.walk_id, None) is None:
+                return
+        else:
+            walks[self.walk_id] = {'items': [frame.to_bytes().hex() for frame in self.items], 'cursor': self.cursor}
+
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(walks, file, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+    def run(self):
+        """ Walks the list to the end, resuming from the checkpoint if the cursor of the heater is known.
+
+        :return: list of the item frames
+        """
+
+        self.load()
+        attempt = 0
+
+        while True:
+            try:
+                self._walk()
+                break
+            except TRANSIENT_ERRORS as e:
+                self.save()
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+
+                logger.info('list walk {0} interrupted after {1} items, {2}: {3!r}'.format(
+                    self.walk_id, len(self.items), 'restarting' if self.cursor is None else 'resuming', e))
+            except BaseException:
+                self.save()
+                raise
+
+        self.save(complete=True)
+        return self.items
+
+    def _send(self, frame, cursor):
+        """ Sends a request of the walk. The cursor is unknown until its answer arrived.
+
+        :param cursor: the cursor of the heater after the request
+        """
+
+        known_cursor = self.cursor
+        self.cursor = None
+
+        try:
+            answer_frame = self.connection.send_frame(frame)
+        except Exception as e:
+            if is_not_sent(e):
+                self.cursor = known_cursor
+            raise
+
+        self.cursor = cursor
+        return answer_frame
+
+    def _walk(self):
+        walk = ListWalkState(self.command_start_address, self.command_next_address, self.max_loops)
+
+        if self.cursor is not None and self.items:
+            self.resume_count += 1
+            answer_frame = self._send(walk.get_next_frame(), self.cursor + 1)
+
+            known = {bytes(frame.payload) for frame in self.items}
+            if bytes(answer_frame.payload) in known:
+                logger.info('list walk {0} can not be repositioned, restarting'.format(self.walk_id))
+                answer_frame = self._restart(walk)
+        else:
+            answer_frame = self._restart(walk)
+
+        walk.items = self.items
+
+        while True:
+            next_frame = walk.answer(answer_frame)
+            if next_frame is None:
+                return
+
+            answer_frame = self._send(next_frame, self.cursor + 1)
+
+    def _restart(self, walk):
+        if self.items:
+            self.restart_count += 1
+
+        self.items = []
+        return self._send(walk.get_start_frame(), 0)
@@ -0,0 +1,113 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+import sys
+from bisect import bisect_left
+from s3200 import const, core
+import logging
+
+logger = logging.getLogger('s3200')
+
+
+class MenuNode(object):
+    """ An item of the menu. children is None for leaves. """
+
+    __slots__ = ('address', 'parent_address', 'text', 'parent', 'children')
+
+    def __init__(self, address, parent_address, text):
+        self.address = address
+        self.parent_address = parent_address
+        self.text = text
+        self.parent = None
+        self.children = None
+
+    def get_path(self):
+        """ The texts from the root down to this item. """
+
+        path = []
+        node = self
+        while node is not None:
+            path.append(node.text)
+            node = node.parent
+        return tuple(reversed(path))
+
+    def __repr__(self):
+        return 'MenuNode({0}, {1!r})'.format(core.convert_bytes_to_hex(self.address), self.text)
+
+
+class MenuTree(object):
+    """ The menu of the heater as tree with an address index and a word prefix index.
+
+    The parent of an item is the item whose address is the parent_address of the item. Items with an unknown
+    parent are roots. Texts are interned, the menu repeats many of them.
+
+    Example:
+        tree = s.get_menu_tree()
+        node = tree.get(b'\\x00\\x53')
+        for node in tree.find('kessel'):
+            print(' > '.join(node.get_path()))
+    """
+
+    def __init__(self, nodes):
+        """ :param nodes: MenuNodes in menu order """
+
+        self.nodes = list(nodes)
+        self.index = {node.address: node for node in self.nodes}
+        self.roots = []
+
+        for node in self.nodes:
+            parent = self.index.get(node.parent_address)
+            if parent is None or parent is node:
+                self.roots.append(node)
+                continue
+
+            node.parent = parent
+            if parent.children is None:
+                parent.children = []
+            parent.children.append(node)
+
+        # sorted (word, position in nodes) of every lower case word of the texts
+        words = sorted((word, position) for position, node in enumerate(self.nodes)
+                       for word in set(node.text.lower().split()))
+        self.words = [word for word, position in words]
+        self.word_positions = [position for word, position in words]
+
+    @classmethod
+    def from_payloads(cls, payloads):
+        """ Builds the tree from the payloads of the get_menu_item answers. """
+
+        address_def = const.MENU_ITEM_STRUCTURE['address']
+        parent_def = const.MENU_ITEM_STRUCTURE['parent_address']
+        text_def = const.MENU_ITEM_STRUCTURE['text']
+
+        nodes = []
+        for payload in payloads:
+            text = core.convert_bytes_to_string(payload[text_def['start']:text_def['end']])
+            nodes.append(MenuNode(bytes(payload[address_def['start']:address_def['end']]),
+                                  bytes(payload[parent_def['start']:parent_def['end']]),
+                                  sys.intern(text)))
+
+        return cls(nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def get(self, address: bytes):
+        """ Get the node with the address, None if there is none. """
+        return self.index.get(address)
+
+    def find(self, prefix: str):
+        """ Get the nodes with a word in their text starting with prefix (case insensitive), in menu order. """
+
+        prefix = prefix.lower()
+        positions = set()
+
+        position = bisect_left(self.words, prefix)
+        while position < len(self.words) and self.words[position].startswith(prefix):
+            positions.add(self.word_positions[position])
+            position += 1
+
+        return [self.nodes[position] for position in sorted(positions)]
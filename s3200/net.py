@@ -3,24 +3,94 @@
 
 
 
-from s3200 import const, core
+from s3200 import core, transport
 from s3200.core import CommunicationError, Frame
-from s3200.test.dummy import DummySerial
+from s3200.protocol import LIST_END_PAYLOAD, LIST_SKIP_PAYLOAD, Answered, Broken, Protocol
+from s3200.stats import RequestStats
+from contextlib import contextmanager
+import threading
+import time
 import logging
 
 logger = logging.getLogger('s3200')
 
-try:
-    from serial import Serial, EIGHTBITS, PARITY_NONE, STOPBITS_ONE
-except:
-    logger.error("WARN: Could not load serial module. Only dummy mode!")
+_deadline = threading.local()
+
+
+def get_deadline():
+    """ Get the deadline (a time.monotonic() value) of the connection calls of this thread, None for none. """
+    return getattr(_deadline, 'value', None)
+
+
+def is_expired(deadline):
+    return deadline is not None and time.monotonic() >= deadline
+
+
+@contextmanager
+def deadline_scope(deadline):
+    """ Sets the deadline of the connection calls of this thread inside the with block.
+
+    The reads of the connections wait at most until the deadline, requests still waiting for the connection are
+    not sent after it. An earlier deadline of an outer block stays in force.
+
+    :param deadline: a time.monotonic() value, None for no deadline
+    """
+
+    outer = get_deadline()
+    if deadline is not None and (outer is None or deadline < outer):
+        _deadline.value = deadline
+
+    try:
+        yield get_deadline()
+    finally:
+        _deadline.value = outer
+
+
+@contextmanager
+def locked(lock):
+    """ Holds the lock. Raises a DeadlineExceededError (NOT_SENT) if the deadline of the thread passes before the
+    lock is free.
+    """
+
+    deadline = get_deadline()
+    if not lock.acquire(timeout=-1 if deadline is None else max(0.0, deadline - time.monotonic())):
+        raise core.DeadlineExceededError("The deadline passed while waiting for the connection",
+                                         core.DeadlineExceededError.NOT_SENT)
+
+    try:
+        if is_expired(deadline):
+            raise core.DeadlineExceededError("The deadline passed before sending", core.DeadlineExceededError.NOT_SENT)
+        yield
+    finally:
+        lock.release()
+
 
 class Connection(object):
-    """ A class representing a serial connection to a s3200 device. """
+    """ A class representing a serial connection to a s3200 device.
 
-    def __init__(self, serial_port_name="/dev/ttyAMA0"):
+    The protocol itself is done by a protocol.Protocol, the connection only reads and writes the bytes.
+    """
+
+    def __init__(self, serial_port_name="/dev/ttyAMA0", persistent=None, capture=None):
+        """
+        :param serial_port_name: the name of the serial port, 'dummy' or an url like tcp://host:port.
+                                 See the transport module.
+        :param persistent: keep the port open between frames. Default depends on the transport (True for tcp).
+        :param capture: a capture.CaptureWriter recording all sent and received frames
+        """
         self.serial_port_name = serial_port_name
 
+        if persistent is None:
+            persistent = transport.is_persistent(serial_port_name)
+
+        self.persistent = persistent
+        self.serial_port = None
+        self.lock = threading.RLock()
+        self.capture = capture
+        self.protocol = Protocol(capture)
+        self.stats = RequestStats()
+        self.last_activity = None  # time.monotonic() of the last answer frame, also the ones within a list walk
+
     def send(self, command: bytes=None, payload: bytes=None):
         """ Shortcut for send_frame. Builds the Frame object and sends it. """
 
@@ -31,104 +101,248 @@ class Connection(object):
 
     def open_serial(self):
         """Opens a serial port and returns it."""
-        if self.serial_port_name == 'dummy':
-            serial_port = DummySerial()
-        else:
-            serial_port = Serial(self.serial_port_name, 57600, EIGHTBITS, PARITY_NONE, STOPBITS_ONE, timeout=3)
-        return serial_port
+        return transport.open_transport(self.serial_port_name)
+
+    def _acquire_serial(self):
+        """ Get the open port. Opens a new one if the connection is not persistent. """
+        if not self.persistent:
+            return self.open_serial()
+
+        if self.serial_port is None:
+            self.serial_port = self.open_serial()
+
+        return self.serial_port
+
+    def _release_serial(self, serial_port, failed=False):
+        """ Closes not persistent ports. Persistent ones only get closed if the communication failed. """
+        if failed:
+            self.protocol.reset()
+
+        if not self.persistent or failed:
+            serial_port.close()
+
+            if serial_port is self.serial_port:
+                self.serial_port = None
+
+    def close(self):
+        """ Closes the persistent port if there is one. """
+        with self.lock:
+            if self.serial_port is not None:
+                self._release_serial(self.serial_port, failed=True)
 
     def send_frame(self, frame, read_answer_frames=1):
         """ Sends one frame and receives the answer frame
 
         :param frame: the frame to send
         :return frame: the answer frame
+        :raise CommunicationError: if the answer frame is broken
         :raise: different exceptions that could occur during communication
         """
 
-        serial_port = self.open_serial()
-        answer_frames = []
+        with locked(self.lock):
+            return self._send_frame(frame, read_answer_frames)
+
+    def _send_frame(self, frame, read_answer_frames):
+        serial_port = self._acquire_serial()
+        events = []
+        failed = True
 
         try:
-            #send the frame
-            logger.debug('sending: ' + str(frame.to_bytes()))
-            serial_port.write(frame.to_bytes())
-
-            #read the answer bytes
-            for i in range(read_answer_frames):
-                answer_bytes = Connection._read_one_frame(serial_port)
-                logger.debug('read answer:' + str(answer_bytes))
-                #wrong set_setting returns 2x -> logger.info("'"+str(core.convert_bytes_to_hex(frame.to_bytes()))+"'"+': ' + str(answer_bytes)+',')
-                #make a frame from the bytes
-                answer_frame = Frame.from_bytes(answer_bytes)
-                answer_frames.append(answer_frame)
+            serial_port.write(self.protocol.send_frame(frame, read_answer_frames))
+            self._receive(serial_port, events)
+            failed = False
 
         except core.NothingToReadError as e:
-            serial_port.flushInput()
-            raise core.WrongNumberOfAnswerFramesError("Got wrong no of answer frames",
-                                                      read_answer_frames, len(answer_frames), e)
+            unanswered = self._abandon(serial_port)
+            raise self._get_timeout_error(read_answer_frames, len(unanswered[0].frames), e)
 
         finally:
-            serial_port.close()
+            self._release_serial(serial_port, failed)
+
+        if isinstance(events[0], Broken):
+            raise events[0].error
 
+        answer_frames = events[0].frames
         if len(answer_frames) > 1:
             return answer_frames
         else:
             return answer_frames[0]
 
-    @staticmethod
-    def _read_one_frame(serial_port):
+    def send_frames(self, frames, window=8, read_answer_frames=1, allow_missing=False, allow_broken=False):
+        """ Sends several frames back to back and receives their answers in the same order.
+
+        Up to window frames are written at once before their answers are read. A broken answer frame does not stop
+        the reading, the answers of all frames get read (and counted in the stats) first.
+
+        :param frames: the frames to send
+        :param window: maximum number of frames sent before reading the answers
+        :param read_answer_frames: number of answer frames of each frame
+        :param allow_missing: if True missing answers end the reading of a window instead of raising a
+                              WrongNumberOfAnswerFramesError. The caller has to pair the answers with the frames then.
+        :param allow_broken: if True the answers of a frame with a broken answer frame are None instead of raising a
+                             CommunicationError
+        :return: list of the answer frames
+        """
 
-        frame_start_bytes = serial_port.read(2)
+        with locked(self.lock):
+            serial_port = self._acquire_serial()
+            events = []
+            failed = True
 
-        if serial_port.inWaiting() == 0:
-            raise core.NothingToReadError("No Bytes to Read")
+            try:
+                for start in range(0, len(frames), window):
+                    serial_port.write(self.protocol.send_frames(frames[start:start + window], read_answer_frames))
 
-        #get length
-        length_bytes = Connection._read_escaped(serial_port, 2)
-        unescaped_length_bytes = core.unescape(length_bytes)
-        if len(unescaped_length_bytes) != 2:
-            raise core.CommunicationError("Didn't get 2 length bytes. Maybe timeout, or other reading error.")
+                    try:
+                        self._receive(serial_port, events)
 
-        length = core.convert_short_to_integer(unescaped_length_bytes)
+                    except core.NothingToReadError:
+                        if not allow_missing or is_expired(get_deadline()):
+                            raise
+                        events.extend(self._abandon(serial_port))
 
-        read_bytes = Connection._read_escaped(serial_port, length + 1)  # +1 for read the checksum too
-        complete_frame = frame_start_bytes + length_bytes + read_bytes
+                failed = False
 
-        return complete_frame
+            except core.NothingToReadError as e:
+                events.extend(self._abandon(serial_port))
+                raise self._get_timeout_error(len(frames) * read_answer_frames,
+                                              sum(len(event.frames) for event in events), e)
+
+            finally:
+                self._release_serial(serial_port, failed)
+
+        answer_frames = []
+        for event in events:
+            if not isinstance(event, Broken):
+                answer_frames.extend(event.frames)
+            elif allow_broken:
+                answer_frames.extend([None] * event.request.answer_frames)
+            else:
+                raise event.error
+
+        return answer_frames
+
+    def _receive(self, serial_port, events):
+        """ Feeds the read bytes to the protocol until no request is pending and writes what it has to send.
+
+        The reads wait at most until the deadline of the thread.
+
+        :param events: list the events of the protocol get appended to
+        :raise NothingToReadError: if no byte arrived within the timeout of the port or the deadline passed
+        """
+
+        protocol = self.protocol
+        deadline = get_deadline()
+        limit_reads = deadline is not None and hasattr(serial_port, 'timeout')
+        port_timeout = serial_port.timeout if limit_reads else None
+
+        try:
+            while protocol.pending:
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise core.NothingToReadError("The deadline passed")
+                    if limit_reads:
+                        serial_port.timeout = remaining if port_timeout is None else min(port_timeout, remaining)
+
+                self._stamp_sent()
+
+                data = serial_port.read(serial_port.inWaiting() or 1)
+                if not data:
+                    raise core.NothingToReadError("No Bytes to Read")
+
+                send_bytes, new_events = protocol.receive_data(data)
+
+                if send_bytes:
+                    serial_port.write(send_bytes)
+
+                now = time.monotonic()
+                if send_bytes or new_events:
+                    # the heater answered a frame, eg. the next item of a walk
+                    self.last_activity = now
+
+                for event in new_events:
+                    if isinstance(event, Answered):
+                        self.stats.record(event.request.frame, True, now - event.request.sent)
+                    elif isinstance(event, Broken):
+                        self.stats.record(event.request.frame, False)
+
+                events.extend(new_events)
+
+        finally:
+            if limit_reads:
+                serial_port.timeout = port_timeout
+
+    def _stamp_sent(self):
+        """ Stamps the requests written since the last call with the current time. """
+
+        now = None
+        for request in reversed(self.protocol.pending):
+            if request.sent is not None:
+                break
+            if now is None:
+                now = time.monotonic()
+            request.sent = now
+
+    def _abandon(self, serial_port):
+        """ Gives up the pending requests after a timeout and counts them as failed.
+
+        :return: the Unanswered events
+        """
+
+        serial_port.flushInput()
+        unanswered = self.protocol.abandon()
+
+        for event in unanswered:
+            if event.request.walk is None:
+                self.stats.record(event.request.frame, False)
+
+        return unanswered
 
     @staticmethod
-    def _read_escaped(serial_port, length):
-        my_byte = bytearray()
+    def _get_timeout_error(expected, got, error):
+        """ Get the error for answers which did not arrive: a DeadlineExceededError if the deadline of the thread
+        passed, a WrongNumberOfAnswerFramesError otherwise.
 
-        for i in range(length):
-            byte = serial_port.read(1)[0]
-            my_byte.append(byte)
+        :param expected: number of expected answer frames, 0 if unknown
+        :param got: number of answer frames which arrived
+        """
 
-            if byte in const.ESCAPED_IDENTIFIER:
-                second_byte = serial_port.read(1)[0]
-                my_byte.append(second_byte)
+        if is_expired(get_deadline()):
+            stage = core.DeadlineExceededError.PARTIAL if got else core.DeadlineExceededError.NO_ANSWER
+            return core.DeadlineExceededError("The deadline passed after {0} answer frames".format(got),
+                                              stage, expected, got)
 
-        return bytes(my_byte)
+        return core.WrongNumberOfAnswerFramesError("Got wrong no of answer frames", expected, got, error)
 
-    def get_list(self, command_start_address: bytes, command_next_address: bytes, max_loops=500):
-        """ Get all items of a list """
+    def get_list(self, command_start_address: bytes, command_next_address: bytes, max_loops=500, stop=None):
+        """ Get all items of a list
 
-        output = []
-        answer_frame = self.send(command_start_address)
+        :param stop: optional function(answer_frame) called for every item after it was added to the output.
+                     If it returns True the walk ends there.
+        """
 
-        while answer_frame.payload != b'\x00' :  # TODO add constant
-            logger.debug('get_list payload: ' + str(answer_frame.payload))
+        with locked(self.lock):
+            return self._get_list(command_start_address, command_next_address, max_loops, stop)
 
-            if answer_frame.payload == b'\x01' :
-                logger.debug('ignore payload: ' + str(answer_frame.payload))
-            else:
-                output.append(answer_frame)
+    def _get_list(self, command_start_address, command_next_address, max_loops, stop=None):
+        serial_port = self._acquire_serial()
+        events = []
+        failed = True
 
-            answer_frame = self.send(command_next_address, b'\x01')
-            logger.debug('get_list len: ' + str(len(output)))
+        try:
+            serial_port.write(self.protocol.start_list(command_start_address, command_next_address, max_loops, stop))
+            self._receive(serial_port, events)
+            failed = False
+
+        except core.NothingToReadError as e:
+            unanswered = self._abandon(serial_port)
+            if is_expired(get_deadline()):
+                raise self._get_timeout_error(0, len(unanswered[0].request.walk.items) if unanswered else 0, e)
+            raise core.WrongNumberOfAnswerFramesError("Got wrong no of answer frames", 1, 0, e)
 
-            #prevent endless loops
-            if len(output) > max_loops:
-                raise ValueError("Reached max_loops: " + str(max_loops))
+        finally:
+            self._release_serial(serial_port, failed)
 
-        return output
\ No newline at end of file
+        logger.debug('get_list len: ' + str(len(events[0].items)))
+        return events[0].items
@@ -1,17 +1,60 @@
 #!/usr/bin/python3
 # -*- coding: UTF-8 -*-
 
+from collections import namedtuple, OrderedDict
 from datetime import datetime, time
+from types import MappingProxyType
 from s3200 import const, core, net
 from s3200.net import Frame
+import functools
+import time as timer
 import logging
 
 
 logger = logging.getLogger('s3200')
 
+# results of S3200.apply_settings
+SETTING_UNCHANGED = 'unchanged'
+SETTING_SET = 'set'
+SETTING_REJECTED = 'rejected'
+SETTING_FAILED = 'failed'
+
+Snapshot = namedtuple('Snapshot', ['state', 'mode', 'version', 'datetime', 'values',
+                                   'digital_inputs', 'digital_outputs', 'analog_outputs', 'timestamps', 'failed'])
+Snapshot.__doc__ = """ An immutable picture of the heater. timestamps maps each field name to the time it was read.
+failed is a tuple of the names whose answer frame was broken, they are None or missing in the values, inputs and
+outputs.
+"""
+
+
+def with_deadline(method):
+    """ Adds the optional keyword arguments timeout (seconds) and deadline (a time.monotonic() value) to a method.
+
+    The connection calls of the method give up when the earlier of both passed and raise a
+    core.DeadlineExceededError telling whether the request was not sent, not answered or partially answered.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, timeout=None, deadline=None, **kwargs):
+        if timeout is not None:
+            timeout_deadline = timer.monotonic() + timeout
+            deadline = timeout_deadline if deadline is None else min(deadline, timeout_deadline)
+
+        if deadline is None:
+            return method(self, *args, **kwargs)
+
+        with net.deadline_scope(deadline):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
 
 class S3200(object):
-    """ A class representing a s3200 object. """
+    """ A class representing a s3200 object.
+
+    All methods talking to the heater take the optional keyword arguments timeout and deadline,
+    eg. s.get('boiler_1_temperature', timeout=0.15). See with_deadline.
+    """
 
     def __init__(self, serial_port_name="/dev/ttyAMA0",
                  readonly=True,
@@ -21,9 +64,13 @@ class S3200(object):
                  digital_input_definitions=const.DIGITAL_INPUT_DEFINITIONS,
                  digital_output_definitions=const.DIGITAL_OUTPUT_DEFINITIONS,
                  analog_output_definitions=const.ANALOG_OUTPUT_DEFINITIONS,
+                 connection=None,
                  ):
 
-        self.connection = net.Connection(serial_port_name=serial_port_name)
+        if connection is None:
+            connection = net.Connection(serial_port_name=serial_port_name)
+
+        self.connection = connection
         self.readonly = readonly
         self.value_definitions = value_definitions
         self.setting_definitions = setting_definitions
@@ -31,6 +78,10 @@ class S3200(object):
         self.digital_input_definitions = digital_input_definitions
         self.digital_output_definitions = digital_output_definitions
         self.analog_output_definitions = analog_output_definitions
+        self.poller = None
+        self.time_slot_cache = None
+        self.setting_cache = {}
+        self.setting_catalog = None
 
         #if not (readonly or serial_port_name == 'dummy'):
             #raise NotImplementedError('Currently only readonly mode is supported.')
@@ -39,6 +90,7 @@ class S3200(object):
         if self.readonly:
             raise core.ReadonlyError("Can not set values in readonly mode.")
 
+    @with_deadline
     def get_value(self, *args: str, with_local_name: bool=False):
         """ Get value by name.
 
@@ -75,6 +127,173 @@ class S3200(object):
             return return_list
 
 
+    @with_deadline
+    def get_value_array(self, *args: str):
+        """ Get several values as float array in the order of args.
+
+        The frames are sent back to back and the answers decoded in one go, see bulk.ValueDecoder.
+
+        :param args: names of the values as specified in value_definitions
+        :return: numpy.ndarray if numpy is installed, array('d') otherwise
+        """
+        from s3200.bulk import ValueDecoder
+
+        decoder = ValueDecoder(args, self.value_definitions)
+        command_address = self.command_definitions['get_value']['address']
+
+        answer_frames = self.connection.send_frames([Frame(command_address, self.value_definitions[name]['address'])
+                                                     for name in args])
+
+        return decoder.decode([frame.payload for frame in answer_frames])
+
+    @with_deadline
+    def get(self, name: str):
+        """ Get a value, digital input, digital output, analog output, 'state' or 'mode' by its name. """
+
+        if name in self.value_definitions:
+            return self.get_value(name)
+        elif name in self.digital_input_definitions:
+            return self.get_digital_input(name)
+        elif name in self.digital_output_definitions:
+            return self.get_digital_output(name)
+        elif name in self.analog_output_definitions:
+            return self.get_analog_output(name)
+        elif name == 'state':
+            return self.get_state()
+        elif name == 'mode':
+            return self.get_mode()
+
+        raise core.ValueNotDefinedError("'{0}' is not defined as value, input, output, state or mode".format(name))
+
+    def subscribe(self, name: str, callback, deadband=0, min_interval=None):
+        """ Call callback when the value with the given name changes significantly.
+
+        The values are polled in a background thread. See subscribe.Poller.subscribe for the parameters.
+        """
+        if self.poller is None:
+            from s3200.subscribe import Poller
+
+            self.poller = Poller(self)
+            self.poller.start()
+
+        return self.poller.subscribe(name, callback, deadband=deadband, min_interval=min_interval)
+
+    @with_deadline
+    def snapshot(self, value_names=None, digital_input_names=None, digital_output_names=None,
+                 analog_output_names=None):
+        """ Read state, mode, version, datetime, values, inputs and outputs at once.
+
+        Every distinct frame is sent once and the frames of each group are sent back to back.
+        By default all defined values, inputs and outputs are read. A broken answer frame only fails its own names,
+        see Snapshot.failed.
+
+        :return: a Snapshot
+        """
+
+        if value_names is None:
+            value_names = list(self.value_definitions)
+        if digital_input_names is None:
+            digital_input_names = list(self.digital_input_definitions)
+        if digital_output_names is None:
+            digital_output_names = list(self.digital_output_definitions)
+        if analog_output_names is None:
+            analog_output_names = list(self.analog_output_definitions)
+
+        timestamps = {}
+        failed = []
+
+        # state and mode share one frame, so do version and datetime
+        state_frame, version_frame = self.connection.send_frames([
+            Frame(self.command_definitions['get_heater_state_and_mode']['address']),
+            Frame(self.command_definitions['get_version_and_datetime']['address']),
+        ], allow_broken=True)
+        read_time = timer.time()
+        for field in ('state', 'mode', 'version', 'datetime'):
+            timestamps[field] = read_time
+
+        state = mode = version = version_datetime = None
+        if state_frame is None:
+            failed.extend(('state', 'mode'))
+        else:
+            state, mode = core.convert_bytes_to_state_and_mode(state_frame.payload)
+
+        if version_frame is None:
+            failed.extend(('version', 'datetime'))
+        else:
+            version = core.convert_bytes_to_version(version_frame.payload)
+            version_datetime = core.convert_bytes_to_version_datetime(version_frame.payload)
+
+        def convert_value(name, payload):
+            return core.convert_short_to_integer(payload) / self.value_definitions[name]['factor']
+
+        values = self._read_pipelined(
+            'get_value', {name: self.value_definitions[name]['address'] for name in value_names}, convert_value,
+            failed)
+        timestamps['values'] = timer.time()
+
+        digital_inputs = self._read_pipelined(
+            'get_digital_input', {name: self.digital_input_definitions[name] for name in digital_input_names},
+            lambda name, payload: core.convert_bytes_to_digital_io(payload, const.DIGITAL_INPUT_STRUCTURE), failed)
+        timestamps['digital_inputs'] = timer.time()
+
+        digital_outputs = self._read_pipelined(
+            'get_digital_output', {name: self.digital_output_definitions[name] for name in digital_output_names},
+            lambda name, payload: core.convert_bytes_to_digital_io(payload, const.DIGITAL_OUTPUT_STRUCTURE), failed)
+        timestamps['digital_outputs'] = timer.time()
+
+        analog_outputs = self._read_pipelined(
+            'get_analog_output', {name: self.analog_output_definitions[name] for name in analog_output_names},
+            lambda name, payload: core.convert_bytes_to_analog_output(payload), failed)
+        timestamps['analog_outputs'] = timer.time()
+
+        return Snapshot(state=state,
+                        mode=mode,
+                        version=version,
+                        datetime=version_datetime,
+                        values=values,
+                        digital_inputs=digital_inputs,
+                        digital_outputs=digital_outputs,
+                        analog_outputs=analog_outputs,
+                        timestamps=MappingProxyType(timestamps),
+                        failed=tuple(failed))
+
+    def _read_pipelined(self, command_name, addresses, convert, failed=None):
+        """ Sends the command for every distinct address back to back.
+
+        :param addresses: dict name -> address
+        :param convert: function(name, payload) returning the value
+        :param failed: list the names whose answer frame was broken get appended to. None to raise a
+                       CommunicationError instead.
+        :return: read only dict name -> value without the failed names
+        """
+
+        command_address = self.command_definitions[command_name]['address']
+        distinct_addresses = list(OrderedDict.fromkeys(addresses.values()))
+
+        answer_frames = self.connection.send_frames([Frame(command_address, address)
+                                                     for address in distinct_addresses],
+                                                    allow_broken=failed is not None)
+        payloads = dict(zip(distinct_addresses, answer_frames))
+
+        values = {}
+        for name, address in addresses.items():
+            if payloads[address] is None:
+                failed.append(name)
+            else:
+                values[name] = convert(name, payloads[address].payload)
+
+        return MappingProxyType(values)
+
+    def get_request_stats(self):
+        """ Get the success, failure and latency statistics of the requests per command and per address.
+
+        :return: see stats.RequestStats.snapshot, None if the connection keeps no statistics
+        """
+
+        stats = getattr(self.connection, 'stats', None)
+        return None if stats is None else stats.snapshot()
+
+    @with_deadline
     def test_connection(self):
         """ Tests the connection.
 
@@ -99,6 +318,7 @@ class S3200(object):
 
         return False
 
+    @with_deadline
     def get_version(self):
         """ Gets the software version from the heater.
 
@@ -108,13 +328,9 @@ class S3200(object):
         command_address = self.command_definitions['get_version_and_datetime']['address']
         answer_frame = self.connection.send(command_address)
 
-        #first 4bytes are the software version the rest is for the date
-        version_bytes = answer_frame.payload[:4]
-
-        #convert into . separated string
-        version_string = '.'.join(['{:02x}'.format(i) for i in version_bytes])
-        return version_string
+        return core.convert_bytes_to_version(answer_frame.payload)
 
+    @with_deadline
     def get_datetime(self):
         """ Gets the date and time from the heater.
 
@@ -124,13 +340,9 @@ class S3200(object):
         command_address = self.command_definitions['get_version_and_datetime']['address']
         answer_frame = self.connection.send(command_address)
 
-        #first 4bytes are the software version the rest is for the date
-        date_bytes = answer_frame.payload[4:11]
-
-        #convert into . separated string
-        return_date = core.convert_bytes_to_datedaytime(date_bytes)
-        return return_date
+        return core.convert_bytes_to_version_datetime(answer_frame.payload)
 
+    @with_deadline
     def set_datetime(self, datetime_to_set: datetime):
         """ Set the date and time of the heater. """
         self._test_readonly_()
@@ -142,6 +354,7 @@ class S3200(object):
 
         # TODO Test answer frame
 
+    @with_deadline
     def get_errors(self):
         """ Get all errors currently in the error buffer. """
 
@@ -157,8 +370,9 @@ class S3200(object):
 
         return output
 
+    @with_deadline
     def get_time_slots(self):
-        """ Get the currently set time slots. """
+        """ Get the currently set time slots. The time slot cache gets updated. """
 
         command_start_address = self.command_definitions['get_time_slot']['address']
         command_next_address = self.command_definitions['get_next_time_slot']['address']
@@ -171,8 +385,25 @@ class S3200(object):
 
             output.append(time_slot)
 
+        self.time_slot_cache = {time_slot['name']: tuple(time_slot[name] for name in const.TIME_SLOT_NAMES)
+                                for time_slot in output}
+
         return output
 
+    @with_deadline
+    def get_time_slot_schedule(self, refresh=False):
+        """ Get the time slots as dict name -> tuple of the 8 start and end times.
+
+        The time slots are read from the heater only the first time or if refresh is True.
+        Example: {'boiler_1_monday': (time(6, 0), time(8, 0), time(17, 0), time(22, 0), None, None, None, None)}
+        """
+
+        if self.time_slot_cache is None or refresh:
+            self.get_time_slots()
+
+        return dict(self.time_slot_cache)
+
+    @with_deadline
     def set_time_slot(self,
                       item: str,
                       weekday: int,
@@ -185,30 +416,65 @@ class S3200(object):
                       time_slot_4_start: time,
                       time_slot_4_end: time,
                       ):
-        """ Set a timeslot. NOT IMPLEMENTED YET. """
+        """ Set the time slots of an item for a weekday.
+
+        :param item: the item of the time slot. Example: 'boiler_1'
+        :param weekday: 0=Monday 6=Sunday
+        :param time_slot_1_start: times with 10 minutes resolution or None for not set
+        """
 
         self._test_readonly_()
-        raise NotImplementedError()
-
-        data_bytes = core.convert_time_slot_to_bytes(item,
-                                                     weekday,
-                                                     time_slot_1_start,
-                                                     time_slot_1_end,
-                                                     time_slot_2_start,
-                                                     time_slot_2_end,
-                                                     time_slot_3_start,
-                                                     time_slot_3_end,
-                                                     time_slot_4_start,
-                                                     time_slot_4_end,)
+
+        times = (time_slot_1_start, time_slot_1_end, time_slot_2_start, time_slot_2_end,
+                 time_slot_3_start, time_slot_3_end, time_slot_4_start, time_slot_4_end)
+        self._write_time_slots({core.get_time_slot_name(item, weekday): times})
+
+    @with_deadline
+    def apply_time_slots(self, schedule: dict):
+        """ Set a weekly schedule. Only the time slots which differ from the cached schedule are sent.
+
+        :param schedule: dict time slot name -> 8 start and end times, like get_time_slot_schedule returns
+        :return: list of the names of the time slots which were sent
+        """
+
+        self._test_readonly_()
+
+        current = self.get_time_slot_schedule()
+        changed = {name: tuple(times) for name, times in schedule.items() if current.get(name) != tuple(times)}
+
+        self._write_time_slots(changed)
+        return list(changed)
+
+    def _write_time_slots(self, time_slots: dict):
+        """ Sends the time slots back to back and checks the echo of each. """
 
         command_address = self.command_definitions['set_time_slot']['address']
-        frame = Frame(command_address, data_bytes)
-        answer_frame = self.connection.send_frame(frame)
+        frames = []
+
+        for name, times in time_slots.items():
+            if name not in const.TIME_SLOT_DEFINITIONS:
+                raise core.ValueNotDefinedError("Time slot: '{0}' not defined in TIME_SLOT_DEFINITIONS".format(name))
+            if len(times) != len(const.TIME_SLOT_NAMES):
+                raise core.InvalidValueError("Time slot: '{0}' needs {1} times".format(name,
+                                                                                     len(const.TIME_SLOT_NAMES)))
+
+            item, weekday = name.rsplit('_', 1)
+            data_bytes = core.convert_time_slot_to_bytes(item, const.WEEKDAY_NAMES.index(weekday), *times)
+            frames.append(Frame(command_address, data_bytes))
+
+        answer_frames = self.connection.send_frames(frames)
+
+        failed = []
+        for name, frame, answer_frame in zip(time_slots, frames, answer_frames):
+            if answer_frame.command != frame.command or answer_frame.payload != frame.payload:
+                failed.append(name)
+            elif self.time_slot_cache is not None:
+                self.time_slot_cache[name] = tuple(time_slots[name])
 
-        # TODO Check answer frame
-        #if not answer_frame == frame:
-        #    raise core.ValueSetError('Error occurred while setting value.')
+        if failed:
+            raise core.ValueSetError("Time slots could not be set: {0}".format(', '.join(failed)))
 
+    @with_deadline
     def get_configuration(self):
         """ Get the active and connected boilers, heating circuits and solar. """
 
@@ -219,6 +485,7 @@ class S3200(object):
 
         return return_dict
 
+    @with_deadline
     def get_state(self):
         """ Get the state of the heater.
 
@@ -232,6 +499,7 @@ class S3200(object):
         return state
 
     # TODO better docstrings
+    @with_deadline
     def get_mode(self):
         """ Get the mode of the heater.
 
@@ -243,14 +511,31 @@ class S3200(object):
 
         return mode
 
-    def get_menu(self):
-        """Get the complete menu structure. """
+    def _get_list(self, command_start_address, command_next_address, max_loops=500, checkpoint=None):
+        """ Walks a list, resumable with a checkpoint file if checkpoint is a path. See ListWalk. """
+
+        if checkpoint is None:
+            return self.connection.get_list(command_start_address, command_next_address, max_loops=max_loops)
+
+        from s3200.listwalk import ListWalk
+
+        walk = ListWalk(self.connection, command_start_address, command_next_address, checkpoint,
+                        max_loops=max_loops)
+        return walk.run()
+
+    @with_deadline
+    def get_menu(self, checkpoint=None):
+        """Get the complete menu structure.
+
+        :param checkpoint: optional path of a checkpoint file. An interrupted walk resumes from it.
+        """
 
         command_start_address = self.command_definitions['get_menu_item']['address']
         command_next_address = self.command_definitions['get_next_menu_item']['address']
 
         output = []
-        error_frames = self.connection.get_list(command_start_address, command_next_address, max_loops=5000)
+        error_frames = self._get_list(command_start_address, command_next_address, max_loops=5000,
+                                      checkpoint=checkpoint)
 
         for frame in error_frames:
             error = core.convert_bytes_to_menu_item(frame.payload)
@@ -258,14 +543,35 @@ class S3200(object):
 
         return output
 
-    def get_available_values(self):
-        """Get all available values from the heater. """
+    @with_deadline
+    def get_menu_tree(self, checkpoint=None):
+        """ Get the menu as menu.MenuTree with hierarchy, address index and text search.
+
+        :param checkpoint: optional path of a checkpoint file. An interrupted walk resumes from it.
+        """
+
+        from s3200.menu import MenuTree
+
+        command_start_address = self.command_definitions['get_menu_item']['address']
+        command_next_address = self.command_definitions['get_next_menu_item']['address']
+
+        frames = self._get_list(command_start_address, command_next_address, max_loops=5000, checkpoint=checkpoint)
+
+        return MenuTree.from_payloads(frame.payload for frame in frames)
+
+    @with_deadline
+    def get_available_values(self, checkpoint=None):
+        """Get all available values from the heater.
+
+        :param checkpoint: optional path of a checkpoint file. An interrupted walk resumes from it.
+        """
 
         command_start_address = self.command_definitions['get_available_value']['address']
         command_next_address = self.command_definitions['get_next_available_value']['address']
 
         output = []
-        available_value_frames = self.connection.get_list(command_start_address, command_next_address)
+        available_value_frames = self._get_list(command_start_address, command_next_address,
+                                                checkpoint=checkpoint)
 
         for frame in available_value_frames:
             available_value = core.convert_structure_to_dict(frame.payload, const.AVAILABLE_VALUE_STRUCTURE)
@@ -273,71 +579,145 @@ class S3200(object):
 
         return output
 
+    @with_deadline
     def get_setting(self, setting_name):
         """Get the specified setting from the heater. """
 
-        command_address = self.command_definitions['get_setting']['address']
-        value_address = self.setting_definitions[setting_name]['address']
-
-        answer_frame = self.connection.send(command_address, value_address)
-        setting = core.convert_bytes_to_setting(answer_frame.payload)
-
-        return_value = setting['value'] / setting['factor']
-
-        if setting['comma'] == 0:
-            return_value = int(return_value)
-
-        return return_value
+        return self.get_setting_info(setting_name)['value']
 
+    @with_deadline
     def get_setting_info(self, setting_name):
-        """Get the specified setting value, min_value, max_value, standard_value and others. """
+        """Get the specified setting value, min_value, max_value, standard_value and others.
+
+        With a setting catalog only the value is decoded from the answer, the rest comes from the catalog.
+        """
 
         command_address = self.command_definitions['get_setting']['address']
         value_address = self.setting_definitions[setting_name]['address']
 
         answer_frame = self.connection.send(command_address, value_address)
-        setting = core.convert_bytes_to_setting(answer_frame.payload)
+
+        metadata = self.setting_catalog.get(setting_name) if self.setting_catalog is not None else None
+        if metadata is None:
+            setting = core.convert_bytes_to_setting(answer_frame.payload)
+        else:
+            setting = dict(metadata)
+            setting['address'] = bytes(value_address)
+            setting['value'] = core.convert_bytes_to_setting_value(answer_frame.payload)
 
         setting['value'] = setting['value'] / setting['factor']
 
         if setting['comma'] == 0:
             setting['value'] = int(setting['value'])
 
+        self.setting_cache[setting_name] = setting['value']
         return setting
 
+    @with_deadline
+    def load_setting_catalog(self, path):
+        """ Loads the setting metadata for the firmware version of the heater from a json file.
+
+        Settings missing in the file are read once and stored. Writes are validated against min_value and
+        max_value afterwards.
+
+        :param path: path of the json file, see SettingCatalog
+        """
+
+        from s3200.catalog import SettingCatalog
+
+        catalog = SettingCatalog(path)
+        catalog.load(self)
+        self.setting_catalog = catalog
+
+    @with_deadline
     def set_setting(self, setting_name: str, value: int):
         """Set the specified setting to the given value."""
+
+        result = self.apply_settings({setting_name: value})[setting_name]
+
+        if result == SETTING_REJECTED:
+            raise core.ValueSetError("Setting could not be set. Maybe the value you want to set is out of range? "
+                                     "Use get_setting_info to check.")
+        elif result == SETTING_FAILED:
+            raise core.ValueSetError("Setting could not be set. Heater returned different values")
+
+    @with_deadline
+    def apply_settings(self, settings, use_cache=False):
+        """ Set several settings with back to back writes.
+
+        Repeated writes of the same setting are collapsed to the last value. With use_cache settings whose value is
+        known to be set already (read or written before by this object) are skipped. The cache does not see changes
+        at the panel of the heater or by other clients, so only use it if this object is the only writer.
+        The heater echoes a write twice, the echoes are compared bytewise with the sent frame.
+
+        Example: s.apply_settings({'heating_boiler_should_temperature': 80, 'boiler_1_should_temperature': 60})
+
+        :param settings: dict or iterable of (setting name, value) pairs
+        :param use_cache: if True settings which are known to be set already are not written
+        :raises InvalidValueError: a value is out of the range in the setting catalog, nothing was sent
+        :return: OrderedDict setting name -> SETTING_UNCHANGED, SETTING_SET, SETTING_REJECTED (the heater answered
+                 with one frame, maybe out of range) or SETTING_FAILED (no or different echo)
+        """
+
         self._test_readonly_()
 
-        old_value = self.get_setting(setting_name)
-        if old_value == value:
-            return
+        if isinstance(settings, dict):
+            settings = settings.items()
 
+        # collapse repeated writes, the last value wins
+        values = OrderedDict()
+        for setting_name, value in settings:
+            if setting_name not in self.setting_definitions:
+                raise core.ValueNotDefinedError("Setting: '{0}' not defined in setting_definitions".format(setting_name))
+            values[setting_name] = value
+
+        # nothing is sent if one of the values is out of range
+        if self.setting_catalog is not None:
+            for setting_name, value in values.items():
+                self.setting_catalog.validate(setting_name, value)
+
+        results = OrderedDict()
+        frames = OrderedDict()
         command_address = self.command_definitions['set_setting']['address']
-        value_address = self.setting_definitions[setting_name]['address']
-        factor = self.setting_definitions[setting_name]['factor']
 
-        value = value * factor
-        payload = value_address + core.convert_integer_to_short(value)
-        frame = Frame(command_address, payload)
-        #print(core.convert_bytes_to_hex(frame.to_bytes()))
+        for setting_name, value in values.items():
+            if use_cache and self.setting_cache.get(setting_name) == value:
+                results[setting_name] = SETTING_UNCHANGED
+                continue
 
-        # TODO make better
-        try:
-            answer_frames = self.connection.send_frame(frame, read_answer_frames=2)
-        except core.WrongNumberOfAnswerFramesError as e:
-            if e.got == 1:
-                raise core.ValueSetError("Setting could not be set. Maybe the value you want to set is out of range? "
-                                     "Use get_setting_info to check.")
+            value_address = self.setting_definitions[setting_name]['address']
+            factor = self.setting_definitions[setting_name]['factor']
+
+            payload = value_address + core.convert_integer_to_short(int(round(value * factor)))
+            frames[setting_name] = Frame(command_address, payload)
+
+        if not frames:
+            return results
+
+        answer_frames = self.connection.send_frames(list(frames.values()), read_answer_frames=2, allow_missing=True)
+
+        # the answers of a write carry the address of the setting, rejected writes have only one answer
+        position = 0
+        for setting_name, frame in frames.items():
+            frame_bytes = bytes(frame.command) + bytes(frame.payload)
+            echoes = []
+
+            while (position < len(answer_frames) and len(echoes) < 2 and
+                   answer_frames[position].command == frame.command and
+                   answer_frames[position].payload[:2] == frame.payload[:2]):
+                echoes.append(bytes(answer_frames[position].command) + bytes(answer_frames[position].payload))
+                position += 1
+
+            if len(echoes) == 2 and echoes[0] == frame_bytes and echoes[1] == frame_bytes:
+                results[setting_name] = SETTING_SET
+                self.setting_cache[setting_name] = values[setting_name]
             else:
-                raise e.base_error
-        assert(isinstance(answer_frames[0], Frame))
-        assert(isinstance(answer_frames[1], Frame))
-        #TODO WORK HERE
+                results[setting_name] = SETTING_REJECTED if len(echoes) == 1 else SETTING_FAILED
+                self.setting_cache.pop(setting_name, None)
 
-        if str(frame) != str(answer_frames[0]) or str(frame) != str(answer_frames[1]):
-            raise core.ValueSetError("Setting could not be set. Heater returned different values")
+        return results
 
+    @with_deadline
     def get_digital_input(self, input_name):
         """Get the state of a digital input."""
 
@@ -345,18 +725,10 @@ class S3200(object):
         value_address = self.digital_input_definitions[input_name]
 
         answer_frame = self.connection.send(command_address, value_address)
-        digital_input = core.convert_structure_to_dict(answer_frame.payload, const.DIGITAL_INPUT_STRUCTURE)
-
-        return_bool = None
-        if digital_input['mode'] == 'A':  # \x41 = A = Auto
-            return_bool = bool(digital_input['value'] == 1)
-        elif digital_input['mode'] == '0':  # \x30 = 0 = False
-            return_bool = False
-        elif digital_input['mode'] == '1':  # \x31 = 1 = True
-            return_bool = True
 
-        return return_bool
+        return core.convert_bytes_to_digital_io(answer_frame.payload, const.DIGITAL_INPUT_STRUCTURE)
 
+    @with_deadline
     def get_digital_output(self, output_name):
         """Get the state of a digital output."""
 
@@ -364,101 +736,167 @@ class S3200(object):
         value_address = self.digital_output_definitions[output_name]
 
         answer_frame = self.connection.send(command_address, value_address)
-        digital_output = core.convert_structure_to_dict(answer_frame.payload, const.DIGITAL_OUTPUT_STRUCTURE)
 
-        return_bool = None
-        if digital_output['mode'] == 'A':  # \x41 = A = Auto
-            return_bool = bool(digital_output['value'] == 1)
-        elif digital_output['mode'] == '0':  # \x30 = 0 = False
-            return_bool = False
-        elif digital_output['mode'] == '1':  # \x31 = 1 = True
-            return_bool = True
-
-        return return_bool
+        return core.convert_bytes_to_digital_io(answer_frame.payload, const.DIGITAL_OUTPUT_STRUCTURE)
 
+    @with_deadline
     def get_analog_output(self, output_name):
         """Get the state of a analog output."""
         command_address = self.command_definitions['get_analog_output']['address']
         value_address = self.analog_output_definitions[output_name]
 
         answer_frame = self.connection.send(command_address, value_address)
-        analog_output = core.convert_structure_to_dict(answer_frame.payload, const.ANALOG_OUTPUT_STRUCTURE)
 
-        if analog_output['mode'] == 255:  # Auto mode
-            return analog_output['value']
-        else:
-            return analog_output['mode']  # Manual override
-
-    # def set_force_mode(self, is_force_mode: bool):
-    #     """ Sets the Force mode.
-    #
-    #     Force mode is a testing mode. When force mode is active you can override the input and output values
-    #     of the heater manually.  If the heater receives no command within 30 seconds the force mode gets
-    #     deactivated automatically.
-    #     """
-    #
-    #     self._test_readonly_()
-    #     raise NotImplementedError()
-    #
-    #     # TODO implement enter force mode
-    #
-    # def is_force_active(self):
-    #     command_address = self.command_definitions['get_force_mode']['address']
-    #
-    #     answer_frame = self.connection.send(command_address)
-    #
-    #     result_dict = core.convert_structure_to_dict(answer_frame.payload, const.FORCE_MODE_STRUCTURE)
-    #
-    #     return result_dict['is_force_active']
-    #
-    #
-    # def set_digital_input(self, input_name, value: bool):
-    #     self._test_readonly_()
-    #
-    #     assert(isinstance(bool, value))
-    #     raise NotImplementedError()
-    #
-    #     command_address = self.command_definitions['set_digital_input']['address']
-    #     value_address = self.digital_input_definitions[input_name]
-    #
-    #     if value:
-    #         value = b'\x01'
-    #     else:
-    #         value = b'\x00'
-    #
-    #     answer_frame = self.connection.send(command_address, value_address + value)
-    #
-    #     # TODO test answer frame
-    #
-    # def set_digital_output(self, output_name, value):
-    #     self._test_readonly_()
-    #
-    #     assert(isinstance(bool, value))
-    #     raise NotImplementedError()
-    #
-    #     command_address = self.command_definitions['set_digital_output']['address']
-    #     value_address = self.digital_output_definitions[output_name]
-    #
-    #     if value:
-    #         value = b'\x01'
-    #     else:
-    #         value = b'\x00'
-    #
-    #     answer_frame = self.connection.send(command_address, value_address + value)
-    #
-    #     #TODO test answer frame
-    #
-    # def set_analog_output(self, output_name, value):
-    #     self._test_readonly_()
-    #
-    #     assert(isinstance(int, value))
-    #     raise NotImplementedError()
-    #
-    #     command_address = self.command_definitions['set_digital_input']['address']
-    #     value_address = self.digital_output_definitions[output_name]
-    #
-    #     value = core.convert_integer_to_short(value)
-    #
-    #     answer_frame = self.connection.send(command_address, value_address + value)
-    #
-    #     #TODO test answer frame
\ No newline at end of file
+        return core.convert_bytes_to_analog_output(answer_frame.payload)
+
+    @with_deadline
+    def set_force_mode(self, is_force_mode: bool):
+        """ Sets the Force mode.
+
+        Force mode is a testing mode. When force mode is active you can override the input and output values
+        of the heater manually.  If the heater receives no command within 30 seconds the force mode gets
+        deactivated automatically. Use a Keepalive to keep it active.
+        """
+
+        self._test_readonly_()
+
+        command_address = self.command_definitions['set_force']['address']
+        self._send_checked(command_address, b'\x01' if is_force_mode else b'\x00')
+
+    @with_deadline
+    def is_force_active(self):
+        command_address = self.command_definitions['get_force']['address']
+
+        answer_frame = self.connection.send(command_address)
+
+        result_dict = core.convert_structure_to_dict(answer_frame.payload, const.FORCE_MODE_STRUCTURE)
+
+        return result_dict['is_force_active']
+
+    @with_deadline
+    def set_digital_input(self, input_name, value):
+        """ Overrides a digital input. Needs force mode.
+
+        :param value: True or False to override, None to return to automatic mode
+        """
+
+        self._test_readonly_()
+
+        command_address = self.command_definitions['manipulate_digital_input']['address']
+        value_address = self.digital_input_definitions[input_name]
+
+        self._send_checked(command_address, value_address + core.convert_digital_io_mode_to_bytes(value))
+
+    @with_deadline
+    def set_digital_output(self, output_name, value):
+        """ Overrides a digital output. Needs force mode.
+
+        :param value: True or False to override, None to return to automatic mode
+        """
+
+        self._test_readonly_()
+
+        command_address = self.command_definitions['manipulate_digital_output']['address']
+        value_address = self.digital_output_definitions[output_name]
+
+        self._send_checked(command_address, value_address + core.convert_digital_io_mode_to_bytes(value))
+
+    @with_deadline
+    def set_analog_output(self, output_name, value):
+        """ Overrides an analog output. Needs force mode.
+
+        :param value: 0 to 100 to override, None to return to automatic mode
+        """
+
+        self._test_readonly_()
+
+        command_address = self.command_definitions['manipulate_analog_output']['address']
+        value_address = self.analog_output_definitions[output_name]
+
+        self._send_checked(command_address, value_address + core.convert_analog_output_mode_to_bytes(value))
+
+    def _send_checked(self, command_address, payload):
+        """ Sends a write command and checks that the heater echoes it. """
+
+        frame = Frame(command_address, payload)
+        answer_frame = self.connection.send_frame(frame)
+
+        if answer_frame.command != frame.command or answer_frame.payload != frame.payload:
+            raise core.ValueSetError("Value could not be set. Heater returned different values")
+
+
+class Watcher(object):
+    """ Reads a fixed set of names with one pipelined batch of frames per sample, eg. for the watch command of the
+    console script.
+
+    The frames, converters and the output row are prepared once, a sample only fills the row.
+    """
+
+    def __init__(self, s3200, names):
+        """
+        :param s3200: the S3200 object to read from
+        :param names: value, digital input, digital output or analog output names, 'state' or 'mode'
+        """
+        self.s3200 = s3200
+        self.names = list(names)
+        self.row = [None] * (len(self.names) + 1)  # timestamp and the values
+
+        frames = []
+        frame_positions = {}
+        self.converters = []  # (position in row, position of the answer, convert function)
+
+        for position, name in enumerate(self.names, 1):
+            command_name, address, convert = self._get_read(name)
+            key = (command_name, address)
+
+            if key not in frame_positions:
+                frame_positions[key] = len(frames)
+                frames.append(Frame(s3200.command_definitions[command_name]['address'], address))
+
+            self.converters.append((position, frame_positions[key], convert))
+
+        self.frames = frames
+
+    def _get_read(self, name):
+        """ Get command name, address and convert function(payload) of a name. """
+
+        s3200 = self.s3200
+
+        if name in s3200.value_definitions:
+            factor = s3200.value_definitions[name]['factor']
+            return 'get_value', s3200.value_definitions[name]['address'], \
+                lambda payload: core.convert_short_to_integer(payload) / factor
+        elif name in s3200.digital_input_definitions:
+            return 'get_digital_input', s3200.digital_input_definitions[name], \
+                lambda payload: core.convert_bytes_to_digital_io(payload, const.DIGITAL_INPUT_STRUCTURE)
+        elif name in s3200.digital_output_definitions:
+            return 'get_digital_output', s3200.digital_output_definitions[name], \
+                lambda payload: core.convert_bytes_to_digital_io(payload, const.DIGITAL_OUTPUT_STRUCTURE)
+        elif name in s3200.analog_output_definitions:
+            return 'get_analog_output', s3200.analog_output_definitions[name], core.convert_bytes_to_analog_output
+        elif name == 'state':
+            return 'get_heater_state_and_mode', b'', lambda payload: core.convert_bytes_to_state_and_mode(payload)[0]
+        elif name == 'mode':
+            return 'get_heater_state_and_mode', b'', lambda payload: core.convert_bytes_to_state_and_mode(payload)[1]
+
+        raise core.ValueNotDefinedError("'{0}' is not defined as value, input, output, state or mode".format(name))
+
+    def read(self):
+        """ Reads one sample into row. row[0] is the timestamp. Names whose answer frame was broken are None.
+
+        :return: the row, it is reused by the next read
+        """
+
+        answer_frames = self.s3200.connection.send_frames(self.frames, allow_broken=True)
+        row = self.row
+        row[0] = timer.time()
+
+        for position, answer_position, convert in self.converters:
+            answer_frame = answer_frames[answer_position]
+            row[position] = None if answer_frame is None else convert(answer_frame.payload)
+
+        return row
+
+    def get_empty_row(self):
+        """ Get a row with the current timestamp and None for all names, for a sample which failed. """
+        return [timer.time()] + [None] * len(self.names)
@@ -0,0 +1,193 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+import time
+from s3200 import const, core
+from s3200.core import Frame
+import logging
+
+logger = logging.getLogger('s3200')
+
+
+def get_request_key(s3200, name):
+    """ Get the command and the address (both bytes) a value, input or output is read with. None for other names. """
+
+    command_definitions = s3200.command_definitions
+
+    if name in s3200.value_definitions:
+        return command_definitions['get_value']['address'], s3200.value_definitions[name]['address']
+    elif name in s3200.digital_input_definitions:
+        return command_definitions['get_digital_input']['address'], s3200.digital_input_definitions[name]
+    elif name in s3200.digital_output_definitions:
+        return command_definitions['get_digital_output']['address'], s3200.digital_output_definitions[name]
+    elif name in s3200.analog_output_definitions:
+        return command_definitions['get_analog_output']['address'], s3200.analog_output_definitions[name]
+
+    return None
+
+
+def get_component(s3200, name):
+    """ Get the component (eg. 'boiler_1') a value, input or output belongs to. None if it belongs to no component.
+
+    Values carry a 'component' key in their definition, inputs and outputs are looked up in IO_COMPONENTS.
+    """
+
+    definition = s3200.value_definitions.get(name)
+    if isinstance(definition, dict) and 'component' in definition:
+        return definition['component']
+
+    return const.IO_COMPONENTS.get(name)
+
+
+class _Quarantine(object):
+    """ The backoff of a quarantined address and the time of its next probe. """
+
+    __slots__ = ('backoff', 'until')
+
+    def __init__(self, backoff, until):
+        self.backoff = backoff
+        self.until = until
+
+
+class PollPlan(object):
+    """ Drops the values, inputs and outputs of components which are not installed from the poll set.
+
+    The configuration is read on the first use and then only every recheck_interval seconds.
+
+    Addresses which fail again and again (see the request statistics of the connection) are quarantined: they are
+    left out, and after backoff_initial seconds run_probes sends a single request for the address on its own, apart
+    from the batches of the snapshots. If the probe fails too, the backoff doubles up to backoff_max, if it succeeds
+    the address is polled normally again.
+
+    Example:
+        plan = PollPlan(s)
+        snapshot = plan.snapshot()  # reads only what is installed and answers
+        poller = Poller(s, plan=plan)
+    """
+
+    def __init__(self, s3200, recheck_interval=24 * 3600, clock=time.monotonic,
+                 failure_threshold=0.5, min_requests=4, backoff_initial=60.0, backoff_max=3600.0):
+        """
+        :param s3200: the S3200 object whose configuration and definitions are used
+        :param recheck_interval: seconds after which the configuration is read again
+        :param clock: function returning the current time in seconds
+        :param failure_threshold: recent failure rate (0-1) of an address which puts it into quarantine
+        :param min_requests: number of recent requests needed before an address is judged
+        :param backoff_initial: seconds a quarantined address is left out before the first probe
+        :param backoff_max: upper limit of the seconds between two probes
+        """
+        self.s3200 = s3200
+        self.recheck_interval = recheck_interval
+        self.clock = clock
+        self.failure_threshold = failure_threshold
+        self.min_requests = min_requests
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+
+        self.configuration = None
+        self.checked = None
+        self.quarantines = {}  # (command, address) -> _Quarantine
+
+    def get_configuration(self):
+        """ The cached configuration, read again if it is older than recheck_interval. """
+
+        now = self.clock()
+        if self.configuration is None or now - self.checked >= self.recheck_interval:
+            self.configuration = self.s3200.get_configuration()
+            self.checked = now
+
+            absent = sorted(component for component, installed in self.configuration.items() if not installed)
+            logger.debug('components not installed: {0}'.format(', '.join(absent)))
+
+        return self.configuration
+
+    def is_present(self, name):
+        """ False if the name belongs to a component which is not installed. """
+
+        component = get_component(self.s3200, name)
+        if component is None:
+            return True
+
+        # components the configuration does not know are kept
+        return self.get_configuration().get(component, True)
+
+    def is_quarantined(self, name):
+        """ True if the address of the name failed too often. It stays quarantined until a probe succeeds. """
+
+        key = get_request_key(self.s3200, name)
+        if key is None:
+            return False
+        if key in self.quarantines:
+            return True
+
+        stats = getattr(self.s3200.connection, 'stats', None)
+        address_stats = None if stats is None else stats.get_address_stats(*key)
+        if address_stats is None:
+            return False
+
+        if (address_stats['recent_requests'] >= self.min_requests and
+                address_stats['failure_rate'] >= self.failure_threshold):
+            logger.warning("'{0}' fails too often, probing it again in {1:.0f} s".format(name, self.backoff_initial))
+            self.quarantines[key] = _Quarantine(self.backoff_initial, self.clock() + self.backoff_initial)
+            return True
+
+        return False
+
+    def run_probes(self):
+        """ Sends a single request for every quarantined address whose probe is due, each on its own.
+
+        :return: the number of sent probes
+        """
+
+        now = self.clock()
+        due = [key for key, quarantine in self.quarantines.items() if quarantine.until <= now]
+
+        for key in due:
+            self._probe(key)
+
+        return len(due)
+
+    def _probe(self, key):
+        command, address = key
+        quarantine = self.quarantines[key]
+
+        try:
+            self.s3200.connection.send_frame(Frame(command, address))
+        except (core.S3200Error, OSError) as e:
+            quarantine.backoff = min(quarantine.backoff * 2, self.backoff_max)
+            quarantine.until = self.clock() + quarantine.backoff
+            logger.debug('Probe of {0} failed, next one in {1:.0f} s: {2!r}'.format(
+                address.hex(), quarantine.backoff, e))
+            return
+
+        logger.info('{0} answers again'.format(address.hex()))
+        del self.quarantines[key]
+
+        stats = getattr(self.s3200.connection, 'stats', None)
+        if stats is not None:
+            stats.forget_recent(command, address)
+
+    def should_poll(self, name):
+        """ False if the name belongs to a component which is not installed or its address is quarantined. """
+        return self.is_present(name) and not self.is_quarantined(name)
+
+    def get_quarantined(self):
+        """ Get the quarantined addresses: dict (command, address) -> time of the next probe. """
+        return {key: quarantine.until for key, quarantine in self.quarantines.items()}
+
+    def get_names(self, names):
+        """ Get the names which should be polled (see should_poll), in the same order. """
+        return [name for name in names if self.should_poll(name)]
+
+    def snapshot(self):
+        """ A S3200.snapshot of all defined values, inputs and outputs of the installed components which are not
+        quarantined. Due probes are sent first.
+        """
+
+        self.run_probes()
+
+        s3200 = self.s3200
+        return s3200.snapshot(value_names=self.get_names(s3200.value_definitions),
+                              digital_input_names=self.get_names(s3200.digital_input_definitions),
+                              digital_output_names=self.get_names(s3200.digital_output_definitions),
+                              analog_output_names=self.get_names(s3200.analog_output_definitions))
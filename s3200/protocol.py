@@ -0,0 +1,305 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+""" The protocol of the heater without any I/O.
+
+Protocol turns requests into the bytes to send and received bytes into events. It keeps the receive buffer,
+pairs the answer frames with the pending requests in the order they were sent (several answer frames per request,
+like the double echo of set_setting) and walks lists on its own. A broken answer frame only fails the request it
+belongs to, the answers of the requests after it still get paired. A driver only writes what it gets and feeds
+what it reads, whatever the I/O model is:
+
+    protocol = Protocol()
+    port.write(protocol.send_frame(Frame(b'\\x30', b'\\x00\\x62')))
+
+    while protocol.pending:
+        send_bytes, events = protocol.receive_data(port.read(1))
+        port.write(send_bytes)
+
+net.Connection is such a driver for blocking serial ports.
+"""
+
+from collections import deque, namedtuple
+from s3200 import const, core
+from s3200.core import Frame
+import logging
+
+logger = logging.getLogger('s3200')
+
+# payloads of list answers: the end of the list and items to skip
+LIST_END_PAYLOAD = b'\x00'
+LIST_SKIP_PAYLOAD = b'\x01'
+
+# payload of the requests for the next list item
+LIST_NEXT_PAYLOAD = b'\x01'
+
+Answered = namedtuple('Answered', ['request', 'frames'])
+Answered.__doc__ = """ All answer frames of a request arrived. """
+
+ListCompleted = namedtuple('ListCompleted', ['walk', 'items'])
+ListCompleted.__doc__ = """ A list walk reached the end of the list or its stop function returned True. """
+
+Unanswered = namedtuple('Unanswered', ['request', 'frames'])
+Unanswered.__doc__ = """ A request was abandoned before all answers arrived, frames are the ones which did. """
+
+Broken = namedtuple('Broken', ['request', 'frames', 'error'])
+Broken.__doc__ = """ All answer frames of a request arrived, but some were broken. frames are the intact ones,
+error is the CommunicationError of the first broken one.
+"""
+
+
+def cut_frame(buffer):
+    """ Cuts the first complete frame from a bytearray. Bytes in front of its start bytes are dropped.
+
+    :return: the escaped frame bytes, None if the buffer holds no complete frame yet
+    """
+
+    start = buffer.find(const.START_BYTES)
+
+    if start == -1:
+        # a trailing first start byte may belong to the next frame
+        keep = 1 if buffer.endswith(const.START_BYTES[:1]) else 0
+        if len(buffer) > keep:
+            logger.debug('skipping bytes: ' + str(bytes(buffer[:len(buffer) - keep])))
+            del buffer[:len(buffer) - keep]
+        return None
+
+    if start > 0:
+        logger.debug('skipping bytes: ' + str(bytes(buffer[:start])))
+        del buffer[:start]
+
+    length = core.get_frame_length(buffer)
+    if length is None:
+        return None
+
+    frame_bytes = bytes(buffer[:length])
+    del buffer[:length]
+    return frame_bytes
+
+
+class Request(object):
+    """ A sent frame waiting for its answer frames. walk is the ListWalkState for requests of list walks.
+    sent is free for the driver, eg. for the time the request was written.
+    """
+
+    __slots__ = ('frame', 'answer_frames', 'answers', 'errors', 'walk', 'sent')
+
+    def __init__(self, frame, answer_frames=1, walk=None):
+        self.frame = frame
+        self.answer_frames = answer_frames
+        self.answers = []
+        self.errors = []  # CommunicationErrors of the broken answer frames
+        self.walk = walk
+        self.sent = None
+
+    def is_complete(self):
+        return len(self.answers) + len(self.errors) >= self.answer_frames
+
+
+class ListWalkState(object):
+    """ The state of a list walk: the commands, the limits and the items so far.
+
+    Protocol walks its lists with it. Drivers which exchange whole frames, like the bus scheduler, walk frame by
+    frame with it:
+
+        walk = ListWalkState(b'\\x37', b'\\x38')
+        frame = walk.get_start_frame()
+        while frame is not None:
+            frame = walk.answer(connection.send_frame(frame))
+    """
+
+    __slots__ = ('start', 'next', 'max_loops', 'stop', 'items')
+
+    def __init__(self, start, next, max_loops=500, stop=None, items=None):
+        """ :param items: the items of an interrupted walk which continues with get_next_frame """
+        self.start = start
+        self.next = next
+        self.max_loops = max_loops
+        self.stop = stop
+        self.items = [] if items is None else items
+
+    def get_start_frame(self):
+        return Frame(self.start)
+
+    def get_next_frame(self):
+        return Frame(self.next, LIST_NEXT_PAYLOAD)
+
+    def answer(self, frame):
+        """ Takes the answer to the last request of the walk.
+
+        :return: the frame to send next, None if the walk is complete
+        :raise ValueError: if the walk got more than max_loops items
+        """
+
+        if frame.payload == LIST_END_PAYLOAD:
+            return None
+
+        if frame.payload == LIST_SKIP_PAYLOAD:
+            logger.debug('ignore payload: ' + str(bytes(frame.payload)))
+        else:
+            self.items.append(frame)
+
+            if self.stop is not None and self.stop(frame):
+                logger.debug('get_list stopped after: ' + str(len(self.items)))
+                return None
+
+        #prevent endless loops
+        if len(self.items) > self.max_loops:
+            raise ValueError("Reached max_loops: " + str(self.max_loops))
+
+        return self.get_next_frame()
+
+
+class Protocol(object):
+    """ The sans-I/O protocol engine. See the module doc. """
+
+    def __init__(self, capture=None):
+        """ :param capture: a capture.CaptureWriter recording all sent and received frames """
+        self.capture = capture
+        self.buffer = bytearray()
+        self.pending = deque()  # Requests in the order they were sent
+        self.broken = None  # the list walk Request whose answer frame was broken, see receive_data
+
+    def send_frame(self, frame, read_answer_frames=1):
+        """ Get the bytes of a request. Its answer frames get paired with it after the ones of earlier requests.
+
+        :param read_answer_frames: number of answer frames of the request
+        :return: the bytes to send
+        """
+        return self._send(Request(frame, read_answer_frames))
+
+    def send_frames(self, frames, read_answer_frames=1):
+        """ Get the bytes of several requests sent back to back. """
+        return b''.join([self.send_frame(frame, read_answer_frames) for frame in frames])
+
+    def start_list(self, command_start_address: bytes, command_next_address: bytes, max_loops=500, stop=None):
+        """ Get the bytes of the first request of a list walk. The next requests are returned by receive_data
+        until a ListCompleted event ends the walk.
+
+        :param stop: optional function(answer_frame) called for every item after it was added.
+                     If it returns True the walk ends there.
+        """
+        walk = ListWalkState(command_start_address, command_next_address, max_loops, stop)
+        return self._send(Request(walk.get_start_frame(), walk=walk))
+
+    def _send(self, request):
+        frame_bytes = request.frame.to_bytes()
+        logger.debug('sending: ' + str(frame_bytes))
+
+        if self.capture is not None:
+            self.capture.write_sent(frame_bytes)
+
+        self.pending.append(request)
+        return frame_bytes
+
+    def receive_data(self, data):
+        """ Feeds received bytes. Incomplete frames stay in the buffer until the rest arrives.
+
+        :return: the bytes to send (b'' for nothing) and a list of events
+        :raise CommunicationError: if the answer frame of a list walk is broken. The position of the heater in the
+                                   list is unknown then. The protocol is reset, broken is the request the frame
+                                   belonged to. Other broken frames end in a Broken event.
+        :raise ValueError: if a list walk got more than max_loops items. The protocol is reset.
+        """
+
+        self.buffer += data
+        send_parts = []
+        events = []
+
+        try:
+            while True:
+                frame_bytes = self._next_frame_bytes()
+                if frame_bytes is None:
+                    break
+
+                try:
+                    frame = Frame.from_bytes(frame_bytes)
+                except core.CommunicationError as e:
+                    self._drop(e, events)
+                else:
+                    self._answer(frame, send_parts, events)
+
+        except core.CommunicationError:
+            self.broken = self.pending[0] if self.pending else None
+            self.reset()
+            raise
+
+        except ValueError:
+            self.reset()
+            raise
+
+        return b''.join(send_parts), events
+
+    def _next_frame_bytes(self):
+        """ Cuts the first complete frame from the buffer, None if there is none yet. """
+
+        frame_bytes = cut_frame(self.buffer)
+        if frame_bytes is None:
+            return None
+
+        logger.debug('read answer:' + str(frame_bytes))
+
+        if self.capture is not None:
+            self.capture.write_received(frame_bytes)
+
+        return frame_bytes
+
+    def _answer(self, frame, send_parts, events):
+        if not self.pending:
+            logger.warning('Got an answer without a request: ' + str(frame))
+            return
+
+        request = self.pending[0]
+        request.answers.append(frame)
+
+        if not request.is_complete():
+            return
+
+        self.pending.popleft()
+
+        if request.walk is not None:
+            self._walk(request.walk, frame, send_parts, events)
+        elif request.errors:
+            events.append(Broken(request, request.answers, request.errors[0]))
+        else:
+            events.append(Answered(request, request.answers))
+
+    def _drop(self, error, events):
+        """ Drops a broken frame. It still counts as an answer of its request. """
+
+        logger.warning('Dropping a broken answer frame: {0}'.format(error))
+
+        if not self.pending:
+            return
+
+        request = self.pending[0]
+        if request.walk is not None:
+            raise error
+
+        request.errors.append(error)
+
+        if request.is_complete():
+            self.pending.popleft()
+            events.append(Broken(request, request.answers, request.errors[0]))
+
+    def _walk(self, walk, frame, send_parts, events):
+        next_frame = walk.answer(frame)
+
+        if next_frame is None:
+            events.append(ListCompleted(walk, walk.items))
+        else:
+            send_parts.append(self._send(Request(next_frame, walk=walk)))
+
+    def abandon(self):
+        """ Gives up all pending requests, eg. when their answers did not arrive in time.
+
+        :return: an Unanswered event for every pending request
+        """
+
+        events = [Unanswered(request, request.answers) for request in self.pending]
+        self.reset()
+        return events
+
+    def reset(self):
+        """ Forgets the pending requests and the received bytes. """
+        self.pending.clear()
+        self.buffer = bytearray()
@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+from collections import namedtuple, OrderedDict
+import logging
+
+logger = logging.getLogger('s3200')
+
+# window length in seconds per tier
+DEFAULT_TIERS = OrderedDict([
+    ('minute', 60),
+    ('hour', 3600),
+    ('day', 86400),
+])
+
+Rollup = namedtuple('Rollup', ['name', 'tier', 'start', 'end', 'count', 'minimum', 'maximum', 'mean'])
+Rollup.__doc__ = """ The aggregate of a closed window. start and end are unix timestamps, count the number of samples. """
+
+
+class _Window(object):
+    """ The running aggregate of one window. """
+
+    __slots__ = ('start', 'count', 'minimum', 'maximum', 'total')
+
+    def __init__(self, start, value):
+        self.start = start
+        self.count = 1
+        self.minimum = value
+        self.maximum = value
+        self.total = value
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if value < self.minimum:
+            self.minimum = value
+        elif value > self.maximum:
+            self.maximum = value
+
+
+class Rollups(object):
+    """ Aggregates readings into min, max and mean per minute, hour and day while they are polled.
+
+    The state per value and tier is the running aggregate of the open windows only. A window is closed and
+    given to the sink once the newest sample of the value is allowed_lateness seconds past the end of the
+    window, so samples arriving late (eg. from a retried read) still count. Samples for closed windows are
+    dropped and counted in late_count. Windows without samples (missing readings, downtime) are not emitted,
+    count tells how many samples a window is made of.
+
+    Example:
+        rollups = Rollups(lambda rollup: database.insert(rollup._asdict()))
+        while True:
+            snapshot = s.snapshot()
+            rollups.add_values(snapshot.values, snapshot.timestamps['values'])
+    """
+
+    def __init__(self, sink, tiers=DEFAULT_TIERS, allowed_lateness=60.0, utc_offset=0):
+        """
+        :param sink: called with a Rollup for every closed window
+        :param tiers: OrderedDict tier name -> window length in seconds
+        :param allowed_lateness: seconds a window stays open after its end
+        :param utc_offset: seconds east of UTC, aligns the windows (eg. the days) to the local time
+        """
+        self.sink = sink
+        self.tiers = tiers
+        self.allowed_lateness = allowed_lateness
+        self.utc_offset = utc_offset
+
+        self.windows = {}  # (name, tier) -> OrderedDict window start -> _Window
+        self.newest = {}  # name -> timestamp of the newest sample
+        self.late_count = 0
+
+    def get_window_start(self, timestamp, length):
+        return (timestamp + self.utc_offset) // length * length - self.utc_offset
+
+    def add(self, name, value, timestamp):
+        """ Adds a reading. None (a missing reading) is ignored. """
+
+        if value is None:
+            return
+
+        newest = self.newest.get(name)
+        if newest is None or timestamp > newest:
+            self.newest[name] = newest = timestamp
+
+        for tier, length in self.tiers.items():
+            windows = self.windows.get((name, tier))
+            if windows is None:
+                windows = self.windows[(name, tier)] = OrderedDict()
+
+            start = self.get_window_start(timestamp, length)
+            window = windows.get(start)
+
+            if window is not None:
+                window.add(value)
+            elif start + length + self.allowed_lateness <= newest:
+                self.late_count += 1
+                logger.debug("late sample of '{0}' for the closed {1} window at {2}".format(name, tier, start))
+            else:
+                windows[start] = _Window(start, value)
+                if len(windows) > 1 and start < next(reversed(windows)):
+                    windows_sorted = sorted(windows.items())
+                    windows.clear()
+                    windows.update(windows_sorted)
+
+            self._close(name, tier, length, windows, newest)
+
+    def add_values(self, values, timestamp):
+        """ Adds the readings of a dict name -> value, like the values of a Snapshot. """
+
+        for name, value in values.items():
+            self.add(name, value, timestamp)
+
+    def _close(self, name, tier, length, windows, newest):
+        while windows:
+            start, window = next(iter(windows.items()))
+            if start + length + self.allowed_lateness > newest:
+                return
+
+            del windows[start]
+            self._emit(name, tier, length, window)
+
+    def _emit(self, name, tier, length, window):
+        self.sink(Rollup(name, tier, window.start, window.start + length, window.count,
+                         window.minimum, window.maximum, window.total / window.count))
+
+    def flush(self):
+        """ Closes all open windows, eg. at shutdown. """
+
+        for (name, tier), windows in self.windows.items():
+            length = self.tiers[tier]
+            for window in windows.values():
+                self._emit(name, tier, length, window)
+            windows.clear()
@@ -0,0 +1,384 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+""" A bus scheduler which shares one connection between requests of different priority.
+
+Requests are queued per priority class. The scheduler serves the classes in priority order, limited by a token
+bucket per class (one token per frame, a batch of frames costs one per frame and may leave the bucket in debt).
+The limit only applies under contention: a class without tokens yields the bus to a lower class which has tokens,
+but the bus never idles while requests are queued. If no waiting class has tokens left the highest one is served
+without being charged. List walks run one frame per step, so urgent reads get the bus between two next-item frames
+of a long walk. If the queueing delay of a class exceeds its target, the lower classes are shed: their queued
+requests are deferred or dropped. The classes above it keep their priority.
+
+Usage:
+    scheduler = BusScheduler(net.Connection('/dev/ttyAMA0'))
+    scheduler.start()
+    control = S3200(connection=scheduler.connection('control'))
+    menu = S3200(connection=scheduler.connection('bulk'))
+"""
+
+import threading
+import time
+from collections import deque, OrderedDict
+from s3200 import core, net
+from s3200.core import Frame
+from s3200.protocol import ListWalkState
+import logging
+
+logger = logging.getLogger('s3200')
+
+SHED_DEFER = 'defer'
+SHED_DROP = 'drop'
+
+# classes in priority order, highest first
+# rate: tokens (frames) per second, None for no limit. burst: size of the token bucket.
+# target_delay: queueing delay in seconds which triggers shedding of the lower classes, None for no target
+# shed: what happens to queued requests of the class while a higher class is over its target
+DEFAULT_CLASSES = OrderedDict([
+    ('control', {'rate': None, 'burst': 1, 'target_delay': 0.5, 'shed': None}),
+    ('poll', {'rate': 20.0, 'burst': 10, 'target_delay': 5.0, 'shed': SHED_DEFER}),
+    ('bulk', {'rate': 10.0, 'burst': 10, 'target_delay': None, 'shed': SHED_DROP}),
+])
+
+
+class _Job(object):
+    """ A queued request. step sends one frame (or one pipelined batch) and returns True when the job is done. """
+
+    def __init__(self):
+        self.enqueued = None
+        self.deadline = None  # time.monotonic() after which the caller does not wait anymore
+        self.started = False
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def step(self, connection):
+        raise NotImplementedError()
+
+    def get_cost(self):
+        """ Tokens the next step costs: the number of frames it sends. """
+        return 1
+
+    def finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.done.set()
+
+    def get_stage(self):
+        """ How far the job got, see DeadlineExceededError. """
+        return core.DeadlineExceededError.NO_ANSWER if self.started else core.DeadlineExceededError.NOT_SENT
+
+    def wait(self):
+        """ Waits for the result, at most until the deadline.
+
+        :raise DeadlineExceededError: if the deadline passed. The scheduler drops the job if it is still queued.
+        """
+
+        timeout = None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+        if not self.done.wait(timeout):
+            raise core.DeadlineExceededError("The deadline passed waiting for the scheduler", self.get_stage())
+
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class _FrameJob(_Job):
+
+    def __init__(self, frame, read_answer_frames=1):
+        super().__init__()
+        self.frame = frame
+        self.read_answer_frames = read_answer_frames
+
+    def step(self, connection):
+        self.finish(connection.send_frame(self.frame, self.read_answer_frames))
+        return True
+
+
+class _FramesJob(_Job):
+
+    def __init__(self, frames, kwargs):
+        super().__init__()
+        self.frames = frames
+        self.kwargs = kwargs
+
+    def step(self, connection):
+        self.finish(connection.send_frames(self.frames, **self.kwargs))
+        return True
+
+    def get_cost(self):
+        return len(self.frames)
+
+
+class _ListJob(_Job):
+    """ A list walk, one frame per step. Same semantics as Connection.get_list. """
+
+    def __init__(self, command_start_address, command_next_address, max_loops, stop):
+        super().__init__()
+        self.walk = ListWalkState(command_start_address, command_next_address, max_loops, stop)
+        self.next_frame = self.walk.get_start_frame()
+
+    def get_stage(self):
+        if self.walk.items:
+            return core.DeadlineExceededError.PARTIAL
+        return super().get_stage()
+
+    def step(self, connection):
+        self.next_frame = self.walk.answer(connection.send_frame(self.next_frame))
+
+        if self.next_frame is None:
+            self.finish(self.walk.items)
+            return True
+
+        return False
+
+
+class _PriorityClass(object):
+    """ The queue, token bucket and metrics of a priority class. """
+
+    def __init__(self, name, priority, rate, burst, target_delay, shed):
+        self.name = name
+        self.priority = priority
+        self.rate = rate
+        self.burst = burst
+        self.target_delay = target_delay
+        self.shed = shed
+
+        self.queue = deque()
+        self.tokens = burst
+        self.last_refill = None
+
+        self.served = 0
+        self.dropped = 0
+        self.expired = 0
+        self.delay_sum = 0.0
+        self.delay_max = 0.0
+        self.delay_last = 0.0
+
+    def refill(self, now):
+        if self.rate is None:
+            self.tokens = self.burst
+        elif self.last_refill is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def head_delay(self, now):
+        """ Queueing delay of the oldest not started request. """
+        for job in self.queue:
+            if not job.started:
+                return now - job.enqueued
+        return 0.0
+
+    def record_delay(self, delay):
+        self.served += 1
+        self.delay_sum += delay
+        self.delay_last = delay
+        self.delay_max = max(self.delay_max, delay)
+
+
+class BusScheduler(object):
+    """ Serves the requests of several priority classes over one connection. See the module doc. """
+
+    def __init__(self, connection, classes=DEFAULT_CLASSES, clock=time.monotonic):
+        """
+        :param connection: the net.Connection all requests go through
+        :param classes: OrderedDict class name -> dict(rate, burst, target_delay, shed), highest priority first
+        :param clock: function returning the current time in seconds
+        """
+        self.real_connection = connection
+        self.clock = clock
+
+        self.classes = OrderedDict((name, _PriorityClass(name, priority, **config))
+                                   for priority, (name, config) in enumerate(classes.items()))
+
+        self.condition = threading.Condition()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def connection(self, class_name):
+        """ Get a connection like object whose requests are scheduled in the class. Use it for a S3200 object. """
+
+        if class_name not in self.classes:
+            raise ValueError("Unknown priority class: '{0}'".format(class_name))
+
+        return ScheduledConnection(self, class_name)
+
+    def submit(self, class_name, job):
+        """ Queues a job. Use job.wait() for the result. """
+
+        with self.condition:
+            priority_class = self.classes[class_name]
+            job.enqueued = self.clock()
+            job.deadline = net.get_deadline()
+
+            overloaded = self._get_overloaded_priority(job.enqueued)
+            if priority_class.shed == SHED_DROP and overloaded is not None and overloaded < priority_class.priority:
+                self._drop(priority_class, job)
+                return job
+
+            priority_class.queue.append(job)
+            self.condition.notify()
+
+        return job
+
+    def _drop(self, priority_class, job):
+        priority_class.dropped += 1
+        job.finish(error=core.RequestDroppedError("Request of class '{0}' dropped, the bus is overloaded".format(
+            priority_class.name)))
+
+    def _get_overloaded_priority(self, now):
+        """ The priority of the highest class whose queueing delay exceeds its target, None if there is none. """
+
+        for priority_class in self.classes.values():
+            if (priority_class.queue and priority_class.target_delay is not None and
+                    priority_class.head_delay(now) > priority_class.target_delay):
+                return priority_class.priority
+        return None
+
+    def _select(self, now):
+        """ Get the class to serve next, None if all queues are empty. Sheds the lower classes on overload.
+
+        The highest waiting class with a token is served. Without tokens anywhere the highest waiting class is
+        served anyway, the token buckets only share the bus under contention. While a class is over its target the
+        classes below it wait or are dropped, the ones above it are served as usual.
+        """
+
+        for priority_class in self.classes.values():
+            priority_class.refill(now)
+
+        overloaded = self._get_overloaded_priority(now)
+        if overloaded is not None:
+            for priority_class in self.classes.values():
+                if priority_class.priority > overloaded and priority_class.shed == SHED_DROP:
+                    for job in [job for job in priority_class.queue if not job.started]:
+                        priority_class.queue.remove(job)
+                        self._drop(priority_class, job)
+
+        waiting = [priority_class for priority_class in self.classes.values() if priority_class.queue and
+                   (overloaded is None or priority_class.priority <= overloaded)]
+        if not waiting:
+            return None
+
+        for priority_class in waiting:
+            if priority_class.tokens >= 1:
+                return priority_class
+
+        # no class has tokens left, the bus would idle otherwise
+        return waiting[0]
+
+    def step(self):
+        """ Sends the next frame. A list walk is put back in front of its queue after each frame.
+
+        :return: False if there was nothing to do
+        """
+
+        with self.condition:
+            now = self.clock()
+            priority_class = self._select(now)
+            if priority_class is None:
+                return False
+
+            job = priority_class.queue.popleft()
+
+            if net.is_expired(job.deadline):
+                # the caller does not wait anymore, do not spend the bus on it
+                priority_class.expired += 1
+                job.finish(error=core.DeadlineExceededError("The deadline passed in the queue", job.get_stage()))
+                return True
+
+            # a batch may leave the bucket in debt, a class served without tokens is not charged
+            if priority_class.tokens >= 1:
+                priority_class.tokens -= job.get_cost()
+            if not job.started:
+                priority_class.record_delay(now - job.enqueued)
+                job.started = True
+
+        try:
+            with net.deadline_scope(job.deadline):
+                done = job.step(self.real_connection)
+        except Exception as e:
+            job.finish(error=e)
+            done = True
+
+        if not done:
+            with self.condition:
+                priority_class.queue.appendleft(job)
+
+        return True
+
+    def get_metrics(self):
+        """ Get the queueing metrics per class.
+
+        :return: dict class name -> dict(queued, served, dropped, expired, delay_mean, delay_max, delay_last),
+                 the delays in seconds
+        """
+
+        with self.condition:
+            return {name: {'queued': len(priority_class.queue),
+                           'served': priority_class.served,
+                           'dropped': priority_class.dropped,
+                           'expired': priority_class.expired,
+                           'delay_mean': priority_class.delay_sum / priority_class.served if priority_class.served
+                           else 0.0,
+                           'delay_max': priority_class.delay_max,
+                           'delay_last': priority_class.delay_last}
+                    for name, priority_class in self.classes.items()}
+
+    def _run(self):
+        while not self.stopped.is_set():
+            if not self.step():
+                with self.condition:
+                    if not any(priority_class.queue for priority_class in self.classes.values()):
+                        self.condition.wait(1.0)
+
+    def start(self):
+        """ Starts the thread which serves the requests. """
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        with self.condition:
+            self.condition.notify()
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+class ScheduledConnection(object):
+    """ A connection whose requests go through a BusScheduler. Offers the same methods as net.Connection. """
+
+    def __init__(self, scheduler, class_name):
+        self.scheduler = scheduler
+        self.class_name = class_name
+        self.serial_port_name = scheduler.real_connection.serial_port_name
+
+    @property
+    def last_activity(self):
+        return self.scheduler.real_connection.last_activity
+
+    @property
+    def stats(self):
+        return getattr(self.scheduler.real_connection, 'stats', None)
+
+    def send(self, command: bytes=None, payload: bytes=None):
+        """ Shortcut for send_frame. Builds the Frame object and sends it. """
+        return self.send_frame(Frame(command, payload))
+
+    def send_frame(self, frame, read_answer_frames=1):
+        return self.scheduler.submit(self.class_name, _FrameJob(frame, read_answer_frames)).wait()
+
+    def send_frames(self, frames, window=8, read_answer_frames=1, allow_missing=False, allow_broken=False):
+        job = _FramesJob(frames, {'window': window, 'read_answer_frames': read_answer_frames,
+                                  'allow_missing': allow_missing, 'allow_broken': allow_broken})
+        return self.scheduler.submit(self.class_name, job).wait()
+
+    def get_list(self, command_start_address: bytes, command_next_address: bytes, max_loops=500, stop=None):
+        """ Get all items of a list. Requests of higher classes are served between the items. """
+        job = _ListJob(command_start_address, command_next_address, max_loops, stop)
+        return self.scheduler.submit(self.class_name, job).wait()
+
+    def close(self):
+        pass
@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+import threading
+from collections import deque
+from s3200 import const
+import logging
+
+logger = logging.getLogger('s3200')
+
+# commands whose payload starts with the address of a value, setting, input or output
+ADDRESSED_COMMANDS = frozenset(const.COMMAND_DEFINITIONS[name]['address'] for name in (
+    'get_value', 'set_setting', 'get_setting', 'get_digital_input', 'get_digital_output', 'get_analog_output',
+    'manipulate_digital_input', 'manipulate_digital_output', 'manipulate_analog_output'))
+
+
+def get_address(frame):
+    """ Get the address a frame asks for, None for commands without address. """
+
+    command = bytes(frame.command)
+    if command not in ADDRESSED_COMMANDS:
+        return None
+    return bytes(frame.payload[:2])
+
+
+class _Counter(object):
+    """ Successes, failures and latencies of the requests of a command or an address. """
+
+    __slots__ = ('successes', 'failures', 'latency_sum', 'latency_count', 'latency_max', 'recent')
+
+    def __init__(self, window):
+        self.successes = 0
+        self.failures = 0
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self.latency_max = 0.0
+        self.recent = deque(maxlen=window)  # True for failed requests
+
+    def record(self, ok, latency):
+        if ok:
+            self.successes += 1
+        else:
+            self.failures += 1
+        self.recent.append(not ok)
+
+        if latency is not None:
+            self.latency_sum += latency
+            self.latency_count += 1
+            self.latency_max = max(self.latency_max, latency)
+
+    def to_dict(self):
+        return {'successes': self.successes,
+                'failures': self.failures,
+                'recent_requests': len(self.recent),
+                'failure_rate': sum(self.recent) / len(self.recent) if self.recent else 0.0,
+                'latency_mean': self.latency_sum / self.latency_count if self.latency_count else 0.0,
+                'latency_max': self.latency_max}
+
+
+class RequestStats(object):
+    """ Success, failure and latency statistics of the requests of a connection, per command and per address.
+
+    A failure is a request without (complete) answer or with a broken answer frame. The failure rate is the one
+    of the last window requests, the counts and latencies cover all requests. List walks are not counted.
+
+    Example:
+        stats = s.connection.stats
+        print(stats.get_address_stats(b'\\x30', b'\\x00\\x59'))
+    """
+
+    def __init__(self, window=20):
+        """ :param window: number of recent requests the failure rate is computed of """
+        self.window = window
+        self.commands = {}  # command -> _Counter
+        self.addresses = {}  # (command, address) -> _Counter
+        self.lock = threading.Lock()
+
+    def record(self, frame, ok, latency=None):
+        """ Records a request.
+
+        :param frame: the sent frame
+        :param ok: True if the answer arrived
+        :param latency: seconds from sending to the answer, None if unknown
+        """
+
+        command = bytes(frame.command)
+        address = get_address(frame)
+
+        with self.lock:
+            counter = self.commands.get(command)
+            if counter is None:
+                counter = self.commands[command] = _Counter(self.window)
+            counter.record(ok, latency)
+
+            if address is not None:
+                counter = self.addresses.get((command, address))
+                if counter is None:
+                    counter = self.addresses[(command, address)] = _Counter(self.window)
+                counter.record(ok, latency)
+
+    def get_command_stats(self, command: bytes):
+        """ Get dict(successes, failures, recent_requests, failure_rate, latency_mean, latency_max) of a command,
+        None if it was never sent. failure_rate is the one of the recent_requests, the latencies are in seconds.
+        """
+        with self.lock:
+            counter = self.commands.get(command)
+            return None if counter is None else counter.to_dict()
+
+    def get_address_stats(self, command: bytes, address: bytes):
+        """ Like get_command_stats for the requests of a command for one address. """
+        with self.lock:
+            counter = self.addresses.get((command, address))
+            return None if counter is None else counter.to_dict()
+
+    def forget_recent(self, command: bytes, address: bytes):
+        """ Clears the failure rate of an address, eg. after it answers again. The counts stay. """
+        with self.lock:
+            counter = self.addresses.get((command, address))
+            if counter is not None:
+                counter.recent.clear()
+
+    def snapshot(self):
+        """ Get the statistics of all commands and addresses.
+
+        :return: dict with 'commands': {command: stats dict} and 'addresses': {(command, address): stats dict}
+        """
+        with self.lock:
+            return {'commands': {command: counter.to_dict() for command, counter in self.commands.items()},
+                    'addresses': {key: counter.to_dict() for key, counter in self.addresses.items()}}
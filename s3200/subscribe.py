@@ -0,0 +1,230 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+import queue
+import threading
+import time
+import logging
+
+logger = logging.getLogger('s3200')
+
+
+def is_significant(value, last_value, deadband=0):
+    """ True if value differs more than deadband from last_value (deadband only for numbers). """
+
+    if last_value is None:
+        return True
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return abs(value - last_value) > deadband
+
+    return value != last_value
+
+
+class Subscription(object):
+    """ A callback which wants to know when a value changes. """
+
+    __slots__ = ('name', 'callback', 'deadband', 'min_interval', 'last_value')
+
+    def __init__(self, name, callback, deadband=0, min_interval=None):
+        self.name = name
+        self.callback = callback
+        self.deadband = deadband
+        self.min_interval = min_interval
+        self.last_value = None
+
+    def is_significant(self, value):
+        """ True if the value differs more than deadband from the last reported value. """
+        return is_significant(value, self.last_value, self.deadband)
+
+
+class _PollItem(object):
+    """ The poll state of one value name. """
+
+    __slots__ = ('name', 'interval', 'next_due', 'last_value', 'subscriptions')  # last_value: the last significant one
+
+    def __init__(self, name, interval, next_due):
+        self.name = name
+        self.interval = interval
+        self.next_due = next_due
+        self.last_value = None
+        self.subscriptions = []
+
+
+class Poller(object):
+    """ Polls the subscribed values and calls the callbacks of the subscriptions on significant changes.
+
+    Values which change get polled faster (down to min_interval), quiet ones slower (up to max_interval).
+    The callbacks get one dict {name: value} per poll cycle and run in a separate dispatch thread,
+    so a slow callback does not delay the polling.
+    """
+
+    def __init__(self, s3200, min_interval=1.0, max_interval=60.0, clock=time.monotonic, plan=None):
+        """
+        :param s3200: the S3200 object to poll. Values are read with its get method.
+        :param min_interval: fastest poll interval in seconds
+        :param max_interval: slowest poll interval in seconds
+        :param clock: function returning the current time in seconds
+        :param plan: optional pollplan.PollPlan, values of components which are not installed and quarantined
+                     addresses are not polled, the due probes of the plan are sent first
+        """
+        self.s3200 = s3200
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.clock = clock
+        self.plan = plan
+
+        self.items = {}
+        self.lock = threading.Lock()
+        self.dispatch_queue = queue.Queue()
+        self.stopped = threading.Event()
+        self.wakeup = threading.Event()
+        self.threads = []
+
+    def subscribe(self, name, callback, deadband=0, min_interval=None):
+        """ Subscribe to the changes of a value.
+
+        :param name: a name the get method of the S3200 object knows
+        :param callback: called with a dict {name: value} of the changed values
+        :param deadband: changes less or equal to deadband are ignored (only for numbers)
+        :param min_interval: the value is never polled faster than this (seconds)
+        :return: the Subscription, needed to unsubscribe
+        """
+        subscription = Subscription(name, callback, deadband, min_interval)
+
+        with self.lock:
+            item = self.items.get(name)
+            if item is None:
+                item = self.items[name] = _PollItem(name, self.min_interval, self.clock())
+
+            item.subscriptions.append(subscription)
+            item.interval = max(item.interval, self._get_min_interval(item))
+
+        self.wakeup.set()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            item = self.items[subscription.name]
+            item.subscriptions.remove(subscription)
+
+            if not item.subscriptions:
+                del self.items[subscription.name]
+
+    def _get_min_interval(self, item):
+        intervals = [s.min_interval for s in item.subscriptions if s.min_interval is not None]
+        return max([self.min_interval] + intervals)
+
+    def get_next_due(self):
+        """ The time the next value has to be polled. None if there are no subscriptions. """
+        with self.lock:
+            if not self.items:
+                return None
+            return min(item.next_due for item in self.items.values())
+
+    def poll_once(self):
+        """ Polls all values which are due and queues their changes for dispatching.
+
+        :return: the number of polled values
+        """
+        if self.plan is not None:
+            self.plan.run_probes()
+
+        now = self.clock()
+        with self.lock:
+            due_items = [item for item in self.items.values() if item.next_due <= now]
+
+        batches = {}
+        polled = 0
+        for item in due_items:
+            if self.plan is not None and not self.plan.should_poll(item.name):
+                item.next_due = self.clock() + self.max_interval
+                continue
+
+            polled += 1
+            try:
+                value = self.s3200.get(item.name)
+            except Exception as e:
+                logger.warning("Polling '{0}' failed: {1!r}".format(item.name, e))
+                item.next_due = self.clock() + item.interval
+                continue
+
+            with self.lock:
+                self._adapt_interval(item, value)
+                item.next_due = self.clock() + item.interval
+
+                for subscription in item.subscriptions:
+                    if subscription.is_significant(value):
+                        subscription.last_value = value
+                        batches.setdefault(subscription.callback, {})[item.name] = value
+
+        for callback, changes in batches.items():
+            self.dispatch_queue.put((callback, changes))
+
+        return polled
+
+    def _adapt_interval(self, item, value):
+        """ Polls changing values faster and quiet ones slower. Changes within the deadband of every subscription
+        are noise and count as quiet.
+        """
+
+        deadband = min([s.deadband for s in item.subscriptions] or [0])
+        if item.last_value is None:
+            item.interval = min(self.max_interval, item.interval * 2)
+            item.last_value = value
+        elif is_significant(value, item.last_value, deadband):
+            item.interval = max(self._get_min_interval(item), item.interval / 2)
+            item.last_value = value
+        else:
+            # compared with the last significant value, a slow drift adds up until it counts
+            item.interval = min(self.max_interval, item.interval * 2)
+
+    def dispatch_pending(self):
+        """ Runs the queued callbacks in the calling thread. """
+        while True:
+            try:
+                callback, changes = self.dispatch_queue.get_nowait()
+            except queue.Empty:
+                return
+            self._dispatch(callback, changes)
+
+    @staticmethod
+    def _dispatch(callback, changes):
+        try:
+            callback(changes)
+        except Exception:
+            logger.exception("Subscription callback failed")
+
+    def _poll_loop(self):
+        while not self.stopped.is_set():
+            self.poll_once()
+
+            next_due = self.get_next_due()
+            timeout = self.max_interval if next_due is None else max(0, next_due - self.clock())
+
+            self.wakeup.wait(timeout)
+            self.wakeup.clear()
+
+    def _dispatch_loop(self):
+        while True:
+            task = self.dispatch_queue.get()
+            if task is None:
+                return
+            self._dispatch(*task)
+
+    def start(self):
+        """ Starts the poll and the dispatch thread. """
+        self.stopped.clear()
+        self.threads = [threading.Thread(target=self._poll_loop, daemon=True),
+                        threading.Thread(target=self._dispatch_loop, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
+        self.dispatch_queue.put(None)
+
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+import socket
+from urllib.parse import urlsplit
+from s3200 import core
+import logging
+
+logger = logging.getLogger('s3200')
+
+TCP_PREFIX = 'tcp://'
+
+
+class SocketSerial(object):
+    """ A serial port like object which talks to a serial-to-ethernet converter (eg. ser2net) over tcp.
+
+    The socket is kept open between frames. All received bytes are read in bulk into an internal
+    buffer the frame parser reads from. If the connection breaks it gets reopened on the next write.
+    """
+
+    RECEIVE_SIZE = 4096
+
+    def __init__(self, host=None, port=None, timeout=3, connect_timeout=3, sock=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.in_buffer = bytearray()
+        self.sock = sock
+
+        if self.sock is not None:
+            self._configure(self.sock)
+
+    @staticmethod
+    def from_url(url: str, timeout=3):
+        """ Get a SocketSerial from an url of the form tcp://host:port """
+
+        parts = urlsplit(url)
+        if parts.scheme != 'tcp' or not parts.hostname or not parts.port:
+            raise ValueError("Url must be of the form tcp://host:port but is: {0}".format(url))
+
+        return SocketSerial(parts.hostname, parts.port, timeout=timeout)
+
+    @staticmethod
+    def _configure(sock):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def is_open(self):
+        return self.sock is not None
+
+    def connect(self):
+        """ Opens the tcp connection if it is not open yet. """
+
+        if self.sock is None:
+            logger.debug('connecting to: {0}:{1}'.format(self.host, self.port))
+            self.sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+            self._configure(self.sock)
+            self.in_buffer = bytearray()
+
+    def write(self, write_bytes: bytes):
+        """ Writes the bytes. Reconnects if the connection was broken. """
+
+        # drop stale bytes, this also notices connections closed by the other side
+        self.flushInput()
+        self.connect()
+        try:
+            self.sock.sendall(write_bytes)
+        except OSError as e:
+            logger.info('tcp connection broken ({0}) reconnecting'.format(e))
+            self.close()
+            self.connect()
+            self.sock.sendall(write_bytes)
+
+    def _fill(self, timeout):
+        """ Reads all bytes available within timeout into the buffer. Returns False on timeout. """
+
+        if self.sock is None:
+            return False
+
+        self.sock.settimeout(timeout)
+        try:
+            received = self.sock.recv(SocketSerial.RECEIVE_SIZE)
+        except (socket.timeout, BlockingIOError):
+            return False
+        except OSError as e:
+            logger.info('tcp connection broken: {0}'.format(e))
+            self.close()
+            return False
+
+        if not received:  # the other side closed the connection
+            self.close()
+            return False
+
+        self.in_buffer += received
+        return True
+
+    def read(self, length=1):
+        """ Reads length bytes.
+
+        :raise NothingToReadError: if the bytes did not arrive within timeout
+        """
+
+        while len(self.in_buffer) < length:
+            if not self._fill(self.timeout):
+                raise core.NothingToReadError("Got only {0} of {1} bytes.".format(len(self.in_buffer), length))
+
+        ret = bytes(self.in_buffer[:length])
+        del self.in_buffer[:length]
+        return ret
+
+    def inWaiting(self):
+        if not self.in_buffer:
+            self._fill(0)
+        return len(self.in_buffer)
+
+    def flushInput(self):
+        while self._fill(0):
+            pass
+        self.in_buffer = bytearray()
+
+    def close(self):
+        sock, self.sock = self.sock, None
+
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass  # not connected anymore
+            sock.close()
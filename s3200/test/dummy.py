@@ -3,7 +3,10 @@
 from collections import OrderedDict
 
 import re
-from s3200 import core
+import socketserver
+import threading
+from s3200 import const, core
+from s3200.tcp import SocketSerial, TCP_PREFIX
 import logging
 
 
@@ -68,6 +71,21 @@ class DummySerial(object):
         #available value next empty
         '02 FD .. .. 32 .*': b'\x02\xfd\x00\x02\x001\x00\x54',
         '02 FD .. 02 00 32 .*': b'\x02\xfd\x00\x02\x001\x00\x54',
+        # time slot boiler_1_monday 06:00-08:00 17:00-22:00
+        '02 FD .. .. 42 .*': core.Frame(b'\x42', b'\x01\x00\x00\x3C\x50\xAA\xDC\xFF\xFF\xFF\xFF').to_bytes(),
+        # time slot next empty
+        '02 FD .. .. 43 .*': core.Frame(b'\x43', b'\x00').to_bytes(),
+        '02 FD .. 02 00 43 .*': core.Frame(b'\x43', b'\x00').to_bytes(),
+        # set time slot
+        '02 FD .. .. 50 .*': 'return',
+        # force mode set and get
+        '02 FD .. .. 7E .*': 'return',
+        '02 FD .. 02 00 7E .*': 'return',
+        '02 FD .. .. 5E .*': core.Frame(b'\x5E', b'\x80').to_bytes(),
+        # manipulate digital output, analog output and digital input
+        '02 FD .. .. 58 .*': 'return',
+        '02 FD .. .. 59 .*': 'return',
+        '02 FD .. .. 5A .*': 'return',
         # digital input
         '02 FD .. .. 46 .*': b'\x02\xfd\x00\x03FA\x01\x0e',
         # digital output
@@ -82,7 +100,7 @@ class DummySerial(object):
         self.out_buffer = bytearray()
 
     def flushInput(self):
-        self.do_processing()
+        self.in_buffer = bytearray()
 
     def close(self):
         self.in_buffer = bytearray() #  .clear()
@@ -106,25 +124,155 @@ class DummySerial(object):
         return ret
 
     def do_processing(self):
+        """ Answers all complete frames in the out buffer. """
+        while self.out_buffer:
+            frame_length = core.get_frame_length(self.out_buffer)
+            if frame_length is None:
+                return
+
+            frame_bytes = bytes(self.out_buffer[:frame_length])
+            self.out_buffer = self.out_buffer[frame_length:]
+            self.process_frame(frame_bytes)
+
+    def process_frame(self, frame_bytes):
+        hex_string = core.convert_bytes_to_hex(frame_bytes).upper()
+
         for key, value in DummySerial.COMM_LIST.items():
             r = re.compile(key)
-            hex_string = core.convert_bytes_to_hex(bytes(self.out_buffer)).upper()
             if r.match(hex_string):
 
                 if value == 'return':
-                    value = bytes(self.out_buffer)
+                    value = frame_bytes
                 if value == 'return*2':
-                    value = bytes(self.out_buffer) + bytes(self.out_buffer)
-
-                self.out_buffer = bytearray() #  .clear()
+                    value = frame_bytes + frame_bytes
 
                 for i in value:
                     self.in_buffer.append(i)
                 logger.info("Dummy in: {0} out: {1}".format(str(hex_string), str(value)))
                 return
-        raise NotImplementedError("out_buff: " + core.convert_bytes_to_hex(self.out_buffer) +
-                                  " in_buff: " + str(self.in_buffer))
+        raise NotImplementedError("out_buff: " + hex_string + " in_buff: " + str(self.in_buffer))
 
     def inWaiting(self):
         return len(self.in_buffer)
 
+
+class DummyTcpServer(socketserver.ThreadingTCPServer):
+    """ A local tcp server which behaves like a serial-to-ethernet converter with a DummySerial behind it.
+
+    Example:
+        server = DummyTcpServer()
+        server.start()
+        connection = Connection(server.url)
+        ...
+        server.stop()
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), DummyTcpHandler)
+        self.thread = None
+        self.connections = []
+        self.frame_count = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return '{0}{1}:{2}'.format(TCP_PREFIX, host, port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.drop_connections()
+        self.server_close()
+
+    def drop_connections(self):
+        """ Closes all client connections. Simulates a network failure. """
+        for connection in list(self.connections):
+            connection.close()
+
+
+def read_one_frame(serial_port):
+    """ Reads the escaped bytes of one frame from a port. """
+
+    frame_start_bytes = serial_port.read(2)
+
+    if serial_port.inWaiting() == 0:
+        raise core.NothingToReadError("No Bytes to Read")
+
+    #get length
+    length_bytes = read_escaped(serial_port, 2)
+    unescaped_length_bytes = core.unescape(length_bytes)
+    if len(unescaped_length_bytes) != 2:
+        raise core.CommunicationError("Didn't get 2 length bytes. Maybe timeout, or other reading error.")
+
+    length = core.convert_short_to_integer(unescaped_length_bytes)
+
+    read_bytes = read_escaped(serial_port, length + 1)  # +1 for read the checksum too
+    return frame_start_bytes + length_bytes + read_bytes
+
+
+def read_escaped(serial_port, length):
+    """ Reads length unescaped bytes from a port, returns them escaped. """
+
+    my_byte = bytearray()
+
+    for i in range(length):
+        byte = serial_port.read(1)[0]
+        my_byte.append(byte)
+
+        if byte in const.ESCAPED_IDENTIFIER:
+            second_byte = serial_port.read(1)[0]
+            my_byte.append(second_byte)
+
+    return bytes(my_byte)
+
+
+class DummyTcpHandler(socketserver.BaseRequestHandler):
+    """ Reads frames from the client, passes them to a DummySerial and sends back its answer. """
+
+    def handle(self):
+        port = SocketSerial(sock=self.request, timeout=None)
+        dummy = DummySerial()
+        self.server.connections.append(port)
+
+        try:
+            while port.is_open():
+                frame_bytes = read_one_frame(port)
+                self.server.frame_count += 1
+
+                dummy.write(frame_bytes)
+                answer_bytes = bytes(dummy.in_buffer)
+                dummy.in_buffer = bytearray()
+
+                self.request.sendall(answer_bytes)
+        except (core.NothingToReadError, OSError):
+            pass
+        finally:
+            self.server.connections.remove(port)
+            port.close()
+
+
+class FakeClock(object):
+    """ A clock for the clock arguments: returns now, which the test moves on. step is added before every read.
+
+    Example:
+        clock = FakeClock()
+        poller = Poller(s, clock=clock)
+        clock.now += 60
+    """
+
+    def __init__(self, now=0.0, step=0.0):
+        self.now = now
+        self.step = step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
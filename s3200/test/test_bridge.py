@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import json
+from unittest import TestCase
+from s3200.bridge import Bridge, LocalBroker
+from s3200.obj import S3200
+
+NAMES = ['residual_oxygen', 'operating_hours', 'door_contact', 'state']
+
+
+class TestBridge(TestCase):
+
+    def setUp(self):
+        self.broker = LocalBroker()
+        self.messages = []
+        self.broker.subscribe('heater', lambda topic, payload: self.messages.append(json.loads(payload.decode())))
+        self.s = S3200('dummy')
+
+    def test_delta_only(self):
+        bridge = Bridge(self.s, self.broker, NAMES, topic='heater')
+
+        for i in range(10):
+            bridge.poll_once()
+            bridge.publish_pending()
+
+        # the dummy never changes: one message with all values, then nothing
+        self.assertEqual(1, len(self.messages))
+        self.assertEqual({'residual_oxygen': 432.2, 'operating_hours': 55.0, 'door_contact': True,
+                          'state': 'STÖRUNG'}, self.messages[0]['values'])
+
+        bridge.published['operating_hours'] = 54.0
+        bridge.poll_once()
+        bridge.publish_pending()
+        self.assertEqual({'operating_hours': 55.0}, self.messages[1]['values'])
+
+    def test_backpressure(self):
+        bridge = Bridge(self.s, self.broker, NAMES, topic='heater', queue_size=1)
+
+        # the broker does not take messages, polling goes on and merges the changes
+        bridge.poll_once()
+        for value in (1.0, 2.0, 3.0):
+            bridge.published['operating_hours'] = value
+            bridge.published['residual_oxygen'] = value
+            bridge.poll_once()
+
+        self.assertEqual(3, bridge.merged_count)
+        bridge.publish_pending()
+        bridge.poll_once()
+        bridge.publish_pending()
+
+        self.assertEqual(2, len(self.messages))
+        self.assertEqual({'operating_hours': 55.0, 'residual_oxygen': 432.2}, self.messages[1]['values'])
+
+    def test_full_interval(self):
+        bridge = Bridge(self.s, self.broker, NAMES, topic='heater', full_interval=0)
+        bridge.poll_once()
+        bridge.poll_once()
+        bridge.publish_pending()
+        self.assertEqual([4, 4], [len(message['values']) for message in self.messages])
+
+    def test_threaded(self):
+        bridge = Bridge(self.s, self.broker, NAMES, topic='heater', interval=0.01)
+        bridge.start()
+        bridge.stop()
+
+        self.assertEqual(1, len(self.messages))
+        self.assertEqual(1, self.broker.message_count)
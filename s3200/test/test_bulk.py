@@ -0,0 +1,43 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+from array import array
+from unittest import TestCase, skipIf
+from s3200 import bulk, core
+from s3200.bulk import ValueDecoder
+from s3200.obj import S3200
+
+NAMES = ['boiler_1_temperature', 'operating_hours', 'residual_oxygen']
+PAYLOADS = [b'\x00\x54', b'\x00\x37', b'\x10\xe2',
+            b'\xff\xfe', b'\x37', b'\x00\x0a']
+EXPECTED = [42.0, 55.0, 432.2, -1.0, 55.0, 1.0]
+
+
+class TestValueDecoder(TestCase):
+
+    def test_decode(self):
+        decoder = ValueDecoder(NAMES, use_numpy=False)
+
+        values = decoder.decode(PAYLOADS)
+        self.assertIsInstance(values, array)
+        self.assertEqual(EXPECTED, list(values))
+        self.assertEqual(55.0, values[decoder.width + decoder.index['operating_hours']])
+
+        # same as the single value conversion
+        for payload, name, value in zip(PAYLOADS, NAMES * 2, values):
+            factor = decoder.factors[decoder.index[name]]
+            self.assertEqual(core.convert_short_to_integer(payload) / factor, value)
+
+    @skipIf(bulk.numpy is None, 'numpy not installed')
+    def test_decode_numpy(self):
+        decoder = ValueDecoder(NAMES, use_numpy=True)
+        self.assertEqual(EXPECTED, decoder.decode(PAYLOADS).tolist())
+
+    def test_errors(self):
+        decoder = ValueDecoder(NAMES, use_numpy=False)
+        self.assertRaises(ValueError, decoder.decode, PAYLOADS[:4])
+        self.assertRaises(core.ShortUnpackError, decoder.decode, [b'\x00\x00\x00', b'', b''])
+        self.assertRaises(core.ValueNotDefinedError, ValueDecoder, ['unknown'])
+
+    def test_get_value_array(self):
+        s = S3200('dummy')
+        self.assertEqual([55.0, 432.2], list(s.get_value_array('operating_hours', 'residual_oxygen')))
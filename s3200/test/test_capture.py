@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import csv
+import io
+import os
+import tempfile
+from unittest import TestCase
+from s3200 import capture
+from s3200.capture import CaptureWriter
+from s3200.net import Connection, Frame
+from s3200.obj import S3200
+from s3200.test.dummy import FakeClock
+
+
+class TestCapture(TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'capture.bin')
+
+    def record(self, repeat=1):
+        with open(self.path, 'wb') as file:
+            connection = Connection('dummy', capture=CaptureWriter(file, clock=FakeClock(1000.0, step=0.5)))
+            s = S3200(connection=connection)
+
+            for i in range(repeat):
+                s.get_value('operating_hours')
+                s.get_state()
+                s.snapshot(value_names=['residual_oxygen', 'operating_hours'], digital_input_names=[],
+                           digital_output_names=[], analog_output_names=[])
+                self.assertRaises(Exception, connection.send_frame, Frame(b'\x30', b'\x00\x59'))
+
+    def decode(self, workers=1, raw=False):
+        output = io.StringIO()
+        count = capture.decode_capture(self.path, output, workers=workers, raw=raw)
+        output.seek(0)
+        rows = list(csv.DictReader(output))
+        self.assertEqual(count, len(rows))
+        return rows
+
+    def test_decode(self):
+        self.record()
+        rows = self.decode()
+
+        self.assertEqual(['get_value', 'get_heater_state_and_mode', 'get_heater_state_and_mode',
+                          'get_version_and_datetime', 'get_value', 'get_value', 'get_value'],
+                         [row['command'] for row in rows])
+
+        self.assertEqual('00 62', rows[0]['address'])
+        self.assertEqual('operating_hours', rows[0]['name'])
+        self.assertEqual('55.0', rows[0]['value'])
+        self.assertEqual('1000.5', rows[0]['timestamp'])
+        self.assertEqual('0.5', rows[0]['latency'])
+
+        self.assertEqual('STÖRUNG;Übergangsbetr', rows[1]['value'])
+        self.assertEqual('50.04.04.14 2010-11-21T18:31:00', rows[3]['value'])
+
+        # pipelined requests get their own answers
+        self.assertEqual('residual_oxygen', rows[4]['name'])
+        self.assertEqual('432.2', rows[4]['value'])
+        self.assertEqual('55.0', rows[5]['value'])
+
+        self.assertTrue(rows[6]['value'].startswith('error: Checksum'))
+
+    def test_parallel(self):
+        self.record(repeat=50)
+
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        chunks = capture.split_capture(data, 8)
+        self.assertEqual(8, len(chunks))
+        self.assertEqual(0, chunks[0][0])
+        self.assertEqual(len(data), chunks[-1][1])
+
+        self.assertEqual(self.decode(workers=1), self.decode(workers=3))
+
+    def test_raw(self):
+        # a raw dump has no record headers, just the bytes on the bus
+        records = io.BytesIO()
+        connection = Connection('dummy', capture=CaptureWriter(records))
+        s = S3200(connection=connection)
+        s.get_value('operating_hours')
+        s.get_state()
+        s.get_version()
+        self.assertRaises(Exception, connection.send_frame, Frame(b'\x30', b'\x00\x59'))
+        s.get_value('residual_oxygen')
+
+        with open(self.path, 'wb') as file:
+            file.write(b'\xff\x02')  # the sniffer started within a frame
+            for position, timestamp, direction, frame_bytes in capture.iter_records(records.getvalue()):
+                file.write(frame_bytes)
+
+        rows = self.decode(raw=True, workers=2)
+        self.assertEqual(['get_value', 'get_heater_state_and_mode', 'get_version_and_datetime', 'get_value',
+                          'get_value'], [row['command'] for row in rows])
+        self.assertEqual('55.0', rows[0]['value'])
+        self.assertEqual('2', rows[0]['timestamp'])
+        self.assertEqual('', rows[0]['latency'])
+        self.assertTrue(rows[3]['value'].startswith('error: Checksum'))
+        self.assertEqual('residual_oxygen', rows[4]['name'])
+        self.assertEqual('432.2', rows[4]['value'])
+
+        self.assertEqual(rows, self.decode(raw=True, workers=1))
+
+    def test_empty(self):
+        open(self.path, 'wb').close()
+        self.assertEqual([], self.decode())
+        self.assertEqual([], self.decode(raw=True))
@@ -0,0 +1,49 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import json
+import os
+import tempfile
+from unittest import TestCase
+from s3200 import core
+from s3200.obj import S3200
+
+
+class TestSettingCatalog(TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'settings.json')
+
+    def test_load_and_validate(self):
+        s = S3200('dummy', readonly=False)
+        s.load_setting_catalog(self.path)
+
+        with open(self.path, 'r', encoding='utf-8') as file:
+            versions = json.load(file)
+        self.assertEqual({'unit': '°', 'comma': 0, 'factor': 2, 'min_value': 70, 'max_value': 90, 'standard': 80},
+                         versions['50.04.04.14']['heating_boiler_should_temperature'])
+
+        sent = []
+        send_frames = s.connection.send_frames
+        s.connection.send_frames = lambda frames, *args, **kwargs: sent.append(frames) or send_frames(frames, *args,
+                                                                                                        **kwargs)
+
+        self.assertRaises(core.InvalidValueError, s.set_setting, 'heating_boiler_should_temperature', 120)
+        self.assertRaises(core.InvalidValueError, s.apply_settings, {'heating_boiler_should_temperature': 80,
+                                                                     'start_firing': 300})
+        self.assertEqual([], sent)
+
+        s.set_setting('heating_boiler_should_temperature', 81)
+        self.assertEqual(1, len(sent))
+
+    def test_reads_use_catalog(self):
+        s = S3200('dummy')
+        info = s.get_setting_info('heating_boiler_should_temperature')
+
+        s.load_setting_catalog(self.path)
+        self.assertEqual(info, s.get_setting_info('heating_boiler_should_temperature'))
+        self.assertEqual(84, s.get_setting('heating_boiler_should_temperature'))
+
+        # the second load does not read the settings again
+        s.connection.send_frames = None
+        s.load_setting_catalog(self.path)
+        self.assertEqual(70, s.setting_catalog.get('heating_boiler_should_temperature')['min_value'])
@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import io
+import json
+from unittest import TestCase
+from s3200 import const, core
+from s3200.cli import RowWriter, watch
+from s3200.obj import S3200
+from s3200.test.dummy import FakeClock
+
+NAMES = ['residual_oxygen', 'door_contact', 'primary_air', 'state']
+
+
+class TestWatch(TestCase):
+
+    def watch(self, output_format, count=3, names=NAMES, fail_at=(), **kwargs):
+        self.output = io.StringIO()
+        self.reports = []
+        self.clock = FakeClock()
+        self.sent = []
+
+        s = S3200('dummy', **kwargs)
+        send_frames = s.connection.send_frames
+
+        def counting_send_frames(frames, *args, **kwargs):
+            self.sent.append(len(frames))
+            if len(self.sent) in fail_at:
+                raise core.WrongNumberOfAnswerFramesError('no answer', len(frames), 0, core.NothingToReadError(''))
+            return send_frames(frames, *args, **kwargs)
+        s.connection.send_frames = counting_send_frames
+
+        samples = watch(s, names, 2.0, self.output, output_format, count=count, report=self.reports.append,
+                        clock=self.clock, sleep=self.clock.sleep)
+        self.assertEqual(count, samples)
+        return self.output.getvalue().splitlines()
+
+    def test_csv(self):
+        lines = self.watch('csv')
+
+        self.assertEqual('timestamp,residual_oxygen,door_contact,primary_air,state', lines[0])
+        self.assertEqual(['432.2', 'True', '99', 'STÖRUNG'], lines[1].split(',')[1:])
+        self.assertEqual(4, len(lines))
+        self.assertEqual([4, 4, 4], self.sent)  # one batch per sample
+
+        # 3 samples at 2/s take 1 second
+        self.assertEqual('requested 2.00/s achieved 2.00/s (3 samples)', self.reports[-1])
+        self.assertEqual(1.0, self.clock.now)
+
+    def test_jsonl(self):
+        lines = self.watch('jsonl', count=2)
+
+        sample = json.loads(lines[0])
+        self.assertEqual(['timestamp'] + NAMES, list(sample))
+        self.assertEqual(432.2, sample['residual_oxygen'])
+        self.assertEqual(True, sample['door_contact'])
+        self.assertEqual('STÖRUNG', sample['state'])
+        self.assertEqual(2, len(lines))
+
+    def test_failed_samples(self):
+        # the dummy answers 00 59 with a broken checksum, the second sample gets no answer at all
+        value_definitions = dict(const.VALUE_DEFINITIONS)
+        value_definitions['heater_circuit_18_is'] = {'address': b'\x00\x59', 'factor': 2, 'local_name': 'HK18 Ist'}
+        lines = self.watch('csv', names=['residual_oxygen', 'heater_circuit_18_is'], fail_at=[2],
+                           value_definitions=value_definitions)
+
+        self.assertEqual(['432.2', ''], lines[1].split(',')[1:])
+        self.assertEqual(['', ''], lines[2].split(',')[1:])
+        self.assertEqual(['432.2', ''], lines[3].split(',')[1:])
+        self.assertEqual('requested 2.00/s achieved 2.00/s (3 samples, 1 failed)', self.reports[-1])
+
+    def test_csv_quoting(self):
+        output = io.StringIO()
+        writer = RowWriter(output, ['a,b', 'c'])
+        writer.write_header()
+        writer.write([1.5, 'x,"y"', None])
+        self.assertEqual('timestamp,"a,b",c\n1.5,"x,""y""",\n', output.getvalue())
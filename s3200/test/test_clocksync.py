@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+from datetime import datetime, timedelta
+from unittest import TestCase
+from s3200.clocksync import ClockSync
+from s3200.obj import S3200
+from s3200.test.dummy import FakeClock
+
+
+class FakeHeater(object):
+    """ A heater clock starting at start which gains drift seconds per second. Every request takes 0.2 s. """
+
+    def __init__(self, clock, start, drift):
+        self.clock = clock
+        self.start = start
+        self.drift = drift
+        self.get_count = 0
+        self.set_to = None
+
+    def now(self):
+        return self.start + timedelta(seconds=self.clock.now * (1 + self.drift))
+
+    def get_datetime(self):
+        self.get_count += 1
+        self.clock.now += 0.1
+        now = self.now().replace(microsecond=0)  # the heater has whole seconds
+        self.clock.now += 0.1
+        return now
+
+    def get(self, name):
+        self.clock.now += 0.2
+        return 42
+
+    def set_datetime(self, datetime_to_set):
+        self.set_to = datetime_to_set
+        self.start = datetime_to_set - timedelta(seconds=self.clock.now * (1 + self.drift))
+
+
+class TestClockSync(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_offset_and_drift(self):
+        heater = FakeHeater(self.clock, datetime(2020, 1, 1, 12, 0, 0, 300000), 0.001)
+        sync = ClockSync(heater, interval=600, clock=self.clock)
+
+        for i in range(12):
+            if i:
+                self.clock.now += 600
+            sync.read('boiler_1_temperature')
+
+        self.assertEqual(12, heater.get_count)
+        self.assertAlmostEqual(0.001, sync.drift, places=4)
+
+        # no round trip for stamping, the estimation is within the resolution of the heater clock
+        self.clock.now += 100
+        monotonic, heater_time = sync.stamp()
+        self.assertEqual(12, heater.get_count)
+        self.assertLess(abs((heater_time - heater.now()).total_seconds()), 0.5)
+
+        reading = sync.read('boiler_1_temperature')
+        self.assertEqual(42, reading.value)
+        self.assertEqual(self.clock.now - 0.1, reading.monotonic)
+
+    def test_correct(self):
+        heater = FakeHeater(self.clock, datetime(2020, 1, 1, 12, 0, 0), 0.0)
+        wall = (datetime(2020, 1, 1, 12, 5, 0) - datetime.fromtimestamp(0)).total_seconds()
+        sync = ClockSync(heater, correct_threshold=60, clock=self.clock, wall_clock=lambda: wall)
+
+        # the first estimation samples, corrects and samples the corrected clock again
+        heater_time = sync.get_heater_time()
+        self.assertEqual(datetime(2020, 1, 1, 12, 5, 0), heater.set_to)
+        self.assertEqual(2, heater.get_count)
+        self.assertEqual(1, len(sync.samples))
+        self.assertLess(abs((heater_time - heater.now()).total_seconds()), 0.5)
+
+        # the corrected clock is within the threshold
+        sync.sample()
+        self.assertEqual(3, heater.get_count)
+        self.assertEqual(2, len(sync.samples))
+
+    def test_dummy(self):
+        sync = ClockSync(S3200('dummy'))
+        self.assertEqual(datetime(2010, 11, 21, 18, 31), sync.stamp()[1].replace(microsecond=0))
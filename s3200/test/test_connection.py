@@ -1,10 +1,43 @@
 #!/usr/bin/python3
 # -*- coding: UTF-8 -*-
+import threading
+import time
 from unittest import TestCase
-from s3200.core import CommunicationError
+from s3200 import net
+from s3200.core import CommunicationError, DeadlineExceededError
 from s3200.net import Frame, Connection
 
 
+class SlowSerial(object):
+    """ A port which answers with the given bytes and then waits out its timeout. """
+
+    def __init__(self, answer_bytes=b''):
+        self.answer_bytes = answer_bytes
+        self.timeout = 3
+        self.read_timeouts = []
+
+    def write(self, data):
+        pass
+
+    def inWaiting(self):
+        return len(self.answer_bytes)
+
+    def read(self, length=1):
+        if self.answer_bytes:
+            data, self.answer_bytes = self.answer_bytes[:length], self.answer_bytes[length:]
+            return data
+
+        self.read_timeouts.append(self.timeout)
+        time.sleep(self.timeout)
+        return b''
+
+    def flushInput(self):
+        pass
+
+    def close(self):
+        pass
+
+
 class TestConnection(TestCase):
 
     def setUp(self):
@@ -27,3 +60,49 @@ class TestConnection(TestCase):
         # print('Is:'+return_value)
 
         self.assertRaises(CommunicationError, self.c.send_frame, f)
+
+    def test_send_frames(self):
+        frames = [Frame(b'\x30', b'\x00\x62'), Frame(b'\x30', b'\x00\x03'), Frame(b'\x51')] * 5
+        answer_frames = self.c.send_frames(frames, window=4)
+
+        self.assertEqual(15, len(answer_frames))
+        self.assertEqual(b'\x00\x37', answer_frames[0].payload)
+        self.assertEqual(b'\x10\xe2', answer_frames[1].payload)
+        self.assertEqual(b'\x51', answer_frames[14].command)
+
+    def test_deadline(self):
+        port = SlowSerial()
+        self.c.open_serial = lambda: port
+
+        # the read waits only until the deadline instead of the timeout of the port
+        with net.deadline_scope(time.monotonic() + 0.05):
+            with self.assertRaises(DeadlineExceededError) as context:
+                self.c.send_frame(Frame(b'\x30', b'\x00\x62'))
+        self.assertEqual(DeadlineExceededError.NO_ANSWER, context.exception.stage)
+        self.assertLessEqual(port.read_timeouts[0], 0.05)
+        self.assertEqual(3, port.timeout)
+
+        port.answer_bytes = Frame(b'\x30', b'\x00\x37').to_bytes()
+        with net.deadline_scope(time.monotonic() + 0.05):
+            with self.assertRaises(DeadlineExceededError) as context:
+                self.c.send_frames([Frame(b'\x30', b'\x00\x62'), Frame(b'\x30', b'\x00\x03')])
+        self.assertEqual(DeadlineExceededError.PARTIAL, context.exception.stage)
+        self.assertEqual((2, 1), (context.exception.expected, context.exception.got))
+
+    def test_deadline_waiting_for_lock(self):
+        self.c.lock.acquire()
+        errors = []
+
+        def send():
+            with net.deadline_scope(time.monotonic() + 0.05):
+                try:
+                    self.c.send_frame(Frame(b'\x30', b'\x00\x62'))
+                except DeadlineExceededError as e:
+                    errors.append(e)
+
+        thread = threading.Thread(target=send)
+        thread.start()
+        thread.join()
+        self.c.lock.release()
+
+        self.assertEqual(DeadlineExceededError.NOT_SENT, errors[0].stage)
@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import random
+from unittest import TestCase
+from s3200 import core
+from s3200.core import CommunicationError, Frame
+
+
+class TestFrame(TestCase):
+
+    def test_checksum(self):
+        def slow_checksum(data_bytes):
+            crc = 0x00
+            for byte in data_bytes:
+                crc = crc ^ byte ^ ((byte * 2) & 0xFF)
+            return bytes([crc])
+
+        for i in range(100):
+            data = bytes(random.randrange(256) for j in range(random.randrange(1, 80)))
+            self.assertEqual(slow_checksum(data), core.calculate_checksum(data))
+            self.assertEqual(slow_checksum(data), core.calculate_checksum(data[:5], data[5:]))
+
+    def test_from_bytes(self):
+        frame_bytes = b'\x02\xfd\x00\x030\x007\r'
+        frame = Frame.from_bytes(frame_bytes)
+
+        self.assertEqual(b'\x30', frame.command)
+        self.assertIsInstance(frame.payload, memoryview)
+        self.assertIs(frame_bytes, frame.payload.obj)
+        self.assertEqual(b'\x00\x37', frame.payload)
+        self.assertEqual(frame_bytes, frame.to_bytes())
+
+        self.assertRaises(AttributeError, setattr, frame, 'other', 1)
+
+    def test_from_bytes_escaped(self):
+        frame = Frame(b'\x30', b'\x02\x11\xfe\x2b\x13')
+        frame_bytes = frame.to_bytes()
+        self.assertEqual(b'\x02\xfd\x00\x06\x30\x02\x00\xfe\x12\xfe\x00\x2b\x00\xfe\x14\x24', frame_bytes)
+
+        read_frame = Frame.from_bytes(frame_bytes)
+        self.assertEqual(b'\x02\x11\xfe\x2b\x13', read_frame.payload)
+        self.assertEqual(frame_bytes, read_frame.to_bytes())
+
+    def test_from_bytes_errors(self):
+        self.assertRaises(CommunicationError, Frame.from_bytes, b'\x02\xfd\x00\x030\x007\x0e')
+        self.assertRaises(CommunicationError, Frame.from_bytes, b'\x02\xfc\x00\x030\x007\r')
+
+    def test_copy(self):
+        frame = Frame.from_bytes(bytearray(b'\x02\xfd\x00\x030\x007\r')).copy()
+
+        self.assertIsInstance(frame.payload, bytes)
+        self.assertEqual(b'\x00\x37', frame.payload)
+
+    def test_get_frame_length(self):
+        frame_bytes = Frame(b'\x30', b'\x02\x11').to_bytes()
+
+        self.assertEqual(len(frame_bytes), core.get_frame_length(frame_bytes + b'\x02\xfd'))
+        self.assertIsNone(core.get_frame_length(frame_bytes[:-1]))
+        self.assertIsNone(core.get_frame_length(frame_bytes[:3]))
@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import os
+import tempfile
+from unittest import TestCase
+from s3200.core import Frame
+from s3200.errorsync import ErrorSync
+from s3200.gateway import Gateway, GatewayClient
+from s3200.net import Connection
+from s3200.obj import S3200
+
+
+def error_frame(number, minute, status):
+    """ An error frame like the one of the dummy: 11.04.2013 10:<minute>:37 """
+    return Frame(b'\x47', bytes([1, 0, number, 0xa2, status, 37, minute, 10, 11, 4, 13]) + b'Fehler')
+
+
+class ListConnection(object):
+    """ Answers get_list with the given frames and counts the read items. """
+
+    serial_port_name = 'list'
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.read_count = 0
+
+    def get_list(self, command_start_address, command_next_address, max_loops=500, stop=None):
+        output = []
+        for frame in self.frames:
+            self.read_count += 1
+            output.append(frame)
+            if stop is not None and stop(frame):
+                break
+        return output
+
+
+class TestErrorSync(TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'errors.json')
+
+    def sync(self, frames):
+        connection = ListConnection(frames)
+        result = ErrorSync(S3200(connection=connection), self.path).sync()
+        return [(error['number'], error['status_name']) for error in result], connection.read_count
+
+    def test_incremental(self):
+        old_errors = [error_frame(n, 10, 4) for n in range(20, 10, -1)]
+
+        self.assertEqual(10, len(self.sync(old_errors)[0]))
+
+        # nothing new, the walk stops at the first known error
+        self.assertEqual(([], 1), self.sync(old_errors))
+
+        # two new errors
+        frames = [error_frame(31, 30, 1), error_frame(30, 20, 4)] + old_errors
+        self.assertEqual(([(31, 'New'), (30, 'Gone')], 3), self.sync(frames))
+
+        # the new error is gone now, the walk has to read it again
+        frames[0] = error_frame(31, 30, 4)
+        self.assertEqual(([(31, 'Gone')], 1), self.sync(frames))
+        self.assertEqual(([], 1), self.sync(frames))
+
+    def test_open_error_older_than_watermark(self):
+        frames = [error_frame(2, 20, 4), error_frame(1, 10, 1), error_frame(0, 5, 4)]
+        self.sync(frames)
+
+        # the walk continues to the open error
+        frames[1] = error_frame(1, 10, 2)
+        self.assertEqual(([(1, 'Quittiert')], 2), self.sync(frames))
+
+    def test_same_datetime(self):
+        self.sync([error_frame(1, 10, 4)])
+        self.assertEqual(([(2, 'Gone')], 2), self.sync([error_frame(2, 10, 4), error_frame(1, 10, 4)]))
+
+    def test_dummy(self):
+        s = S3200('dummy')
+        sync = ErrorSync(s, self.path)
+
+        self.assertEqual(s.get_errors(), sync.sync())
+        self.assertEqual([], sync.sync())
+        self.assertEqual([], ErrorSync(s, self.path).sync())
+
+    def test_gateway(self):
+        # a gateway connection has no serial port name
+        socket_path = os.path.join(tempfile.mkdtemp(), 's3200.sock')
+        gateway = Gateway(Connection('dummy'), socket_path)
+        gateway.start()
+        s = GatewayClient(socket_path)
+
+        try:
+            self.assertRaises(ValueError, ErrorSync, s, self.path)
+            self.assertEqual(s.get_errors(), ErrorSync(s, self.path, heater_id='boiler').sync())
+        finally:
+            s.connection.close()
+            gateway.stop()
@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import errno
+import os
+import socket
+import tempfile
+import threading
+import time
+from unittest import TestCase
+from s3200 import core, net
+from s3200.net import Connection, Frame
+from s3200.gateway import Gateway, GatewayClient, GatewayConnection, OP_FRAME
+from s3200.gateway import StructLength, StructResponseHeader, decode_error, encode_error
+
+
+class SlowConnection(Connection):
+    """ A dummy connection which takes some time for every frame. """
+
+    def send_frame(self, frame, read_answer_frames=1):
+        time.sleep(0.1)
+        return super().send_frame(frame, read_answer_frames)
+
+
+class TestGateway(TestCase):
+
+    def setUp(self):
+        self.socket_path = os.path.join(tempfile.mkdtemp(), 's3200.sock')
+        self.gateway = Gateway(Connection('dummy'), self.socket_path)
+        self.gateway.start()
+        self.s = GatewayClient(self.socket_path)
+
+    def tearDown(self):
+        self.s.connection.close()
+        self.gateway.stop()
+
+    def test_getters(self):
+        self.assertEqual(432.2, self.s.get_value('residual_oxygen'))
+        self.assertEqual('STÖRUNG', self.s.get_state())
+        self.assertTrue(self.s.test_connection())
+        self.assertEqual(109, self.s.get_errors()[0]['number'])
+        self.assertEqual(84, self.s.get_setting('heating_boiler_should_temperature'))
+
+    def test_set_setting(self):
+        s = GatewayClient(self.socket_path, readonly=False)
+        s.set_setting('heating_boiler_should_temperature', 81)
+        s.connection.close()
+
+    def test_send_frames(self):
+        frames = [Frame(b'\x30', b'\x00\x62'), Frame(b'\x30', b'\x00\x59'), Frame(b'\x30', b'\x00\x03')]
+        self.assertRaises(core.CommunicationError, self.s.connection.send_frames, frames)
+
+        # one transaction of the gateway for the whole batch
+        count = self.gateway.transaction_count
+        answer_frames = self.s.connection.send_frames(frames, allow_broken=True)
+        self.assertEqual([b'\x00\x37', None, b'\x10\xe2'],
+                         [None if frame is None else bytes(frame.payload) for frame in answer_frames])
+        self.assertEqual(count + 1, self.gateway.transaction_count)
+
+    def test_apply_settings(self):
+        # the rejected write has a single echo, like on a direct connection
+        s = GatewayClient(self.socket_path, readonly=False)
+        results = s.apply_settings({'heating_boiler_should_temperature': 120, 'start_firing': 60})
+        self.assertEqual({'heating_boiler_should_temperature': 'rejected', 'start_firing': 'set'}, dict(results))
+        self.assertRaisesRegex(core.ValueSetError, 'out of range', s.set_setting, 'heating_boiler_should_temperature',
+                               120)
+        s.connection.close()
+
+    def test_errors(self):
+        c = GatewayConnection(self.socket_path)
+        self.assertRaises(core.CommunicationError, c.send_frame, Frame(b'\x30', b'\x00\x59'))
+
+        # a single answer where two are expected
+        with self.assertRaises(core.WrongNumberOfAnswerFramesError) as context:
+            c.send_frame(Frame(b'\x30', b'\x00\x62'), read_answer_frames=2)
+        self.assertEqual(2, context.exception.expected)
+        self.assertEqual(1, context.exception.got)
+
+        self.assertEqual(b'\x00\x37', c.send_frame(Frame(b'\x30', b'\x00\x62')).payload)
+        c.close()
+
+    def test_coalescing(self):
+        self.gateway.connection = SlowConnection('dummy')
+        results = []
+
+        def get_value():
+            client = GatewayClient(self.socket_path)
+            results.append(client.get_value('operating_hours'))
+            client.connection.close()
+
+        threads = [threading.Thread(target=get_value) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([55.0] * 5, results)
+        self.assertEqual(5, self.gateway.request_count)
+        self.assertLess(self.gateway.transaction_count, 5)
+
+    def test_large_batch_error(self):
+        # a batch of more than 255 frames
+        error = core.WrongNumberOfAnswerFramesError('x', 300, 0, core.NothingToReadError('x'))
+        body = encode_error(error)[StructResponseHeader.size + StructLength.size:]
+        decoded = decode_error(body)
+        self.assertEqual((300, 0), (decoded.expected, decoded.got))
+
+    def test_deadline_error(self):
+        error = core.DeadlineExceededError('x', core.DeadlineExceededError.PARTIAL, 3, 1)
+        decoded = decode_error(encode_error(error)[StructResponseHeader.size + StructLength.size:])
+        self.assertIsInstance(decoded, core.DeadlineExceededError)
+        self.assertEqual((core.DeadlineExceededError.PARTIAL, 3, 1), (decoded.stage, decoded.expected, decoded.got))
+
+    def test_deadline_in_queue(self):
+        # another client holds the bus, like a long list walk
+        locked = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with self.gateway.connection.lock:
+                locked.set()
+                release.wait(5.0)
+        thread = threading.Thread(target=hold)
+        thread.start()
+        locked.wait(5.0)
+
+        try:
+            with self.assertRaises(core.DeadlineExceededError) as context:
+                self.gateway.execute(OP_FRAME, 1, b'\x30\x00\x62', time.monotonic() + 0.05)
+            self.assertEqual(core.DeadlineExceededError.NOT_SENT, context.exception.stage)
+
+            with net.deadline_scope(time.monotonic() + 0.05):
+                self.assertRaises(core.DeadlineExceededError, self.s.get_value, 'operating_hours')
+        finally:
+            release.set()
+            thread.join()
+
+        # the expired requests never reached the bus
+        time.sleep(0.05)
+        self.assertIsNone(self.gateway.connection.stats.get_command_stats(b'\x30'))
+
+    def test_deadline_behind_leader(self):
+        self.gateway.connection = SlowConnection('dummy')
+        leader = threading.Thread(target=self.gateway.execute, args=(OP_FRAME, 1, b'\x30\x00\x62'))
+        leader.start()
+        time.sleep(0.02)
+
+        # the same request joins the one in flight, but does not wait longer than its own deadline
+        with self.assertRaises(core.DeadlineExceededError) as context:
+            self.gateway.execute(OP_FRAME, 1, b'\x30\x00\x62', time.monotonic() + 0.02)
+        self.assertEqual(core.DeadlineExceededError.NO_ANSWER, context.exception.stage)
+        leader.join()
+
+    def test_second_gateway(self):
+        # the running gateway keeps its socket
+        with self.assertRaises(OSError) as context:
+            Gateway(Connection('dummy'), self.socket_path)
+        self.assertEqual(errno.EADDRINUSE, context.exception.errno)
+        self.assertEqual(55.0, self.s.get_value('operating_hours'))
+
+    def test_stale_socket(self):
+        socket_path = os.path.join(tempfile.mkdtemp(), 's3200.sock')
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(socket_path)
+        stale.close()
+
+        gateway = Gateway(Connection('dummy'), socket_path)
+        gateway.start()
+        try:
+            client = GatewayClient(socket_path)
+            self.assertEqual(55.0, client.get_value('operating_hours'))
+            client.connection.close()
+        finally:
+            gateway.stop()
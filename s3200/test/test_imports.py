@@ -0,0 +1,45 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import json
+import subprocess
+import sys
+from unittest import TestCase
+
+# generous upper limit for importing s3200.obj in a fresh interpreter, the import usually takes a few ms
+IMPORT_TIME_LIMIT = 0.5
+
+LAZY_MODULES = ['s3200.test.dummy', 's3200.tcp', 'serial', 'numpy', 'socket', 'random']
+
+IMPORT_SCRIPT = '''
+import json, logging, sys, time
+start = time.perf_counter()
+import s3200.obj
+duration = time.perf_counter() - start
+print(json.dumps({
+    'duration': duration,
+    'modules': sorted(sys.modules),
+    'handlers': len(logging.getLogger('s3200').handlers),
+    'level': logging.getLogger('s3200').level,
+}))
+'''
+
+
+class TestImports(TestCase):
+
+    def run_import(self):
+        output = subprocess.check_output([sys.executable, '-c', IMPORT_SCRIPT])
+        return json.loads(output.decode())
+
+    def test_import_time(self):
+        # best of three to ignore a slow start of the interpreter
+        duration = min(self.run_import()['duration'] for i in range(3))
+        self.assertLess(duration, IMPORT_TIME_LIMIT)
+
+    def test_no_side_effects(self):
+        result = self.run_import()
+
+        for module in LAZY_MODULES:
+            self.assertNotIn(module, result['modules'])
+
+        self.assertEqual(0, result['handlers'])
+        self.assertEqual(0, result['level'])  # NOTSET
@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+from unittest import TestCase
+from s3200 import core
+from s3200.core import Frame
+from s3200.keepalive import Keepalive
+from s3200.net import Connection
+from s3200.obj import S3200
+from s3200.test.dummy import DummySerial, FakeClock
+
+# far ahead of time.monotonic, the connection stamps its activity with it
+FAR_AHEAD = 1e9
+
+
+class MenuSerial(DummySerial):
+    """ A dummy whose menu has 3 more items after the first one. """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.remaining_items = 3
+
+    def process_frame(self, frame_bytes):
+        if Frame.from_bytes(frame_bytes).command == b'\x38' and self.remaining_items:
+            self.remaining_items -= 1
+            self.in_buffer += Frame(b'\x38', b'\x02\x01').to_bytes()
+            return
+
+        super().process_frame(frame_bytes)
+
+
+class TestForceMode(TestCase):
+
+    def test_overrides(self):
+        s = S3200('dummy')
+        self.assertRaises(core.ReadonlyError, s.set_force_mode, True)
+        self.assertRaises(core.ReadonlyError, s.set_digital_output, 'heating_circuit_pump_1', True)
+
+        s = S3200('dummy', readonly=False)
+        s.set_force_mode(True)
+        self.assertTrue(s.is_force_active())
+
+        s.set_digital_output('heating_circuit_pump_1', False)
+        s.set_digital_input('door_contact', None)
+        s.set_analog_output('primary_air', 50)
+        self.assertRaises(core.InvalidValueError, s.set_analog_output, 'primary_air', 101)
+        self.assertRaises(core.InvalidValueError, s.set_digital_output, 'heating_circuit_pump_1', 1)
+
+
+class TestKeepalive(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock(FAR_AHEAD)
+        self.s = S3200('dummy', readonly=False)
+        self.keepalive = Keepalive(self.s, clock=self.clock)
+
+    def test_list_walk_counts(self):
+        connection = Connection('dummy')
+        connection.open_serial = MenuSerial
+        connection.send_frame(Frame(b'\x30', b'\x00\x62'))
+        before = connection.last_activity
+        activities = []
+
+        def stop(frame):
+            activities.append(connection.last_activity)
+            return False
+
+        # the items of a walk count while it is running, not only when it is complete
+        self.assertEqual(4, len(connection.get_list(b'\x37', b'\x38', stop=stop)))
+        self.assertEqual(before, activities[0])
+        self.assertGreater(activities[1], before)
+        self.assertLess(activities[1], activities[-1])
+        self.assertEqual(sorted(activities), activities)
+
+    def test_poll_traffic_counts(self):
+        # no known activity: send one right away
+        self.assertTrue(self.keepalive.check())
+        self.assertEqual(1, self.keepalive.keepalive_count)
+
+        # polling keeps the heater alive, no keepalive needed
+        for i in range(10):
+            self.clock.now += 20
+            self.s.connection.last_activity = self.clock.now
+            self.assertFalse(self.keepalive.check())
+        self.assertEqual(1, self.keepalive.keepalive_count)
+
+        # idle bus: the keepalive is sent 5 seconds before the deadline
+        self.clock.now += 24
+        self.assertFalse(self.keepalive.check())
+        self.clock.now += 1
+        self.assertTrue(self.keepalive.check())
+        self.assertEqual(self.clock.now + 25, self.keepalive.get_next_due())
+
+    def test_force_lost(self):
+        lost = []
+        keepalive = Keepalive(self.s, on_force_lost=lambda: lost.append(True), clock=self.clock)
+        self.s.is_force_active = lambda: False
+
+        keepalive.check()
+        self.assertEqual([True], lost)
@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import os
+import tempfile
+from unittest import TestCase
+from s3200 import core
+from s3200.core import Frame
+from s3200.listwalk import ListWalk
+from s3200.obj import S3200
+
+
+class FlakyListConnection(object):
+    """ A list of items (command 37/38) with a cursor. Fails the requests whose number is in fail_at.
+
+    The heater moves its cursor for every request it gets, a failed request only lost its answer. With error
+    the requests fail before they reach the heater.
+    """
+
+    def __init__(self, item_count, fail_at=(), error=None):
+        self.item_count = item_count
+        self.fail_at = set(fail_at)
+        self.error = error
+        self.cursor = 0
+        self.request_count = 0
+
+    def send_frame(self, frame, read_answer_frames=1):
+        return self.send(bytes(frame.command), bytes(frame.payload))
+
+    def send(self, command, payload=None):
+        self.request_count += 1
+        failed = self.request_count in self.fail_at
+
+        if failed and self.error is not None:
+            raise self.error
+
+        if command == b'\x37':
+            self.cursor = 0
+        else:
+            self.cursor += 1
+
+        if failed:
+            raise core.WrongNumberOfAnswerFramesError('no answer', 1, 0, core.NothingToReadError('no answer'))
+
+        if self.cursor >= self.item_count:
+            return Frame(command, b'\x00')
+        return Frame(command, b'\x02' + self.cursor.to_bytes(2, 'big'))
+
+
+class TestListWalk(TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'walks.json')
+
+    def items(self, frames):
+        return [int.from_bytes(bytes(frame.payload[1:]), 'big') for frame in frames]
+
+    def test_lost_answer(self):
+        # the heater moved its cursor past item 40, a next-item frame would skip it
+        connection = FlakyListConnection(100, fail_at=[41])
+        walk = ListWalk(connection, b'\x37', b'\x38', self.path)
+
+        self.assertEqual(list(range(100)), self.items(walk.run()))
+        self.assertEqual(0, walk.resume_count)
+        self.assertEqual(1, walk.restart_count)
+        self.assertEqual(142, connection.request_count)
+        self.assertEqual({}, walk._read_file())  # the complete walk removed its checkpoint
+
+    def test_lost_answer_from_file(self):
+        connection = FlakyListConnection(100, fail_at=[41])
+        walk = ListWalk(connection, b'\x37', b'\x38', self.path, retries=0)
+        self.assertRaises(core.WrongNumberOfAnswerFramesError, walk.run)
+        self.assertIsNone(walk._read_file()[walk.walk_id]['cursor'])
+
+        walk = ListWalk(connection, b'\x37', b'\x38', self.path)
+        self.assertEqual(list(range(100)), self.items(walk.run()))
+        self.assertEqual(1, walk.restart_count)
+
+    def test_resume_not_sent(self):
+        # the circuit was open, the request never reached the heater
+        connection = FlakyListConnection(100, fail_at=range(41, 50), error=core.CircuitOpenError('open'))
+        walk = ListWalk(connection, b'\x37', b'\x38', self.path, retries=0)
+        self.assertRaises(core.CircuitOpenError, walk.run)
+        self.assertEqual(39, walk._read_file()[walk.walk_id]['cursor'])
+
+        # a new process continues where the cursor of the heater is
+        connection.fail_at = set()
+        walk = ListWalk(connection, b'\x37', b'\x38', self.path)
+        self.assertEqual(list(range(100)), self.items(walk.run()))
+        self.assertEqual(1, walk.resume_count)
+        self.assertEqual(0, walk.restart_count)
+        self.assertEqual(102, connection.request_count)  # 101 frames and the failed one
+
+    def test_resume_after_max_loops(self):
+        connection = FlakyListConnection(100)
+        walk = ListWalk(connection, b'\x37', b'\x38', self.path, max_loops=50)
+        self.assertRaises(ValueError, walk.run)
+
+        walk = ListWalk(connection, b'\x37', b'\x38', self.path)
+        self.assertEqual(list(range(100)), self.items(walk.run()))
+        self.assertEqual(1, walk.resume_count)
+        self.assertEqual(101, connection.request_count)
+
+    def test_restart_if_cursor_was_reset(self):
+        error = core.DeadlineExceededError('late', core.DeadlineExceededError.NOT_SENT)
+        connection = FlakyListConnection(20, fail_at=[11], error=error)
+        walk = ListWalk(connection, b'\x37', b'\x38', self.path, retries=0)
+        self.assertRaises(core.DeadlineExceededError, walk.run)
+
+        connection.fail_at = set()
+        connection.send(b'\x37')  # somebody else started the walk again
+
+        walk = ListWalk(connection, b'\x37', b'\x38', self.path)
+        self.assertEqual(list(range(20)), self.items(walk.run()))
+        self.assertEqual(1, walk.restart_count)
+
+    def test_dummy(self):
+        s = S3200('dummy')
+        self.assertEqual(s.get_menu(), s.get_menu(checkpoint=self.path))
+        self.assertEqual(s.get_available_values(), s.get_available_values(checkpoint=self.path))
@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+from unittest import TestCase
+from s3200.menu import MenuTree
+from s3200.obj import S3200
+
+
+def menu_payload(address, parent_address, text):
+    """ A get_menu_item payload: 25 bytes of flags, address, parent address and text. """
+    return b'\x01\x07' + b'\x00' * 23 + address + parent_address + text.encode('cp1252') + b'\x00'
+
+
+PAYLOADS = [
+    menu_payload(b'\x00\x01', b'\x00\x00', 'Kessel'),
+    menu_payload(b'\x00\x02', b'\x00\x01', 'Kessel-Solltemperatur'),
+    menu_payload(b'\x00\x03', b'\x00\x01', 'Kessel Temperatur minimal'),
+    menu_payload(b'\x00\x04', b'\x00\x00', 'Boiler 1'),
+    menu_payload(b'\x00\x05', b'\x00\x04', 'Boilertemperatur'),
+    menu_payload(b'\x00\x06', b'\x00\x04', 'Pumpe'),
+    menu_payload(b'\x00\x07', b'\x00\x01', 'Pumpe'),
+]
+
+
+class TestMenuTree(TestCase):
+
+    def setUp(self):
+        self.tree = MenuTree.from_payloads(PAYLOADS)
+
+    def test_hierarchy(self):
+        self.assertEqual(7, len(self.tree))
+        self.assertEqual(['Kessel', 'Boiler 1'], [node.text for node in self.tree.roots])
+        self.assertEqual(['Kessel-Solltemperatur', 'Kessel Temperatur minimal', 'Pumpe'],
+                         [node.text for node in self.tree.get(b'\x00\x01').children])
+        self.assertEqual(('Boiler 1', 'Boilertemperatur'), self.tree.get(b'\x00\x05').get_path())
+        self.assertIsNone(self.tree.get(b'\x00\x05').children)
+        self.assertIsNone(self.tree.get(b'\x01\x00'))
+
+    def test_find(self):
+        self.assertEqual([b'\x00\x01', b'\x00\x02', b'\x00\x03'], [node.address for node in self.tree.find('kessel')])
+        self.assertEqual([b'\x00\x03'], [node.address for node in self.tree.find('TEMP')])
+        self.assertEqual([b'\x00\x04', b'\x00\x05'], [node.address for node in self.tree.find('boiler')])
+        self.assertEqual([], self.tree.find('solar'))
+
+    def test_interned(self):
+        self.assertIs(self.tree.get(b'\x00\x06').text, self.tree.get(b'\x00\x07').text)
+        self.assertFalse(hasattr(self.tree.get(b'\x00\x06'), '__dict__'))
+
+    def test_dummy(self):
+        tree = S3200('dummy').get_menu_tree()
+        node = tree.get(b'\x00\x53')
+        self.assertEqual('Proportionalfaktor des Mischerreglers', node.text)
+        self.assertEqual([node], tree.find('misch'))
@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+from unittest import TestCase
+from s3200 import const
+from s3200.core import Frame
+from s3200.obj import S3200
+from s3200.pollplan import PollPlan, _Quarantine, get_component
+from s3200.subscribe import Poller
+from s3200.test.dummy import FakeClock
+
+
+class TestPollPlan(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.s = S3200('dummy')
+        self.configuration_reads = 0
+
+        get_configuration = self.s.get_configuration
+
+        def counting_get_configuration():
+            self.configuration_reads += 1
+            return get_configuration()
+        self.s.get_configuration = counting_get_configuration
+
+        self.plan = PollPlan(self.s, recheck_interval=3600, clock=self.clock)
+
+    def test_components(self):
+        self.assertEqual('boiler_1', get_component(self.s, 'boiler_1_pump'))
+        self.assertEqual('heater_circuit_2', get_component(self.s, 'heating_circuit_pump_2'))
+        self.assertEqual(None, get_component(self.s, 'outside_temperature'))
+
+    def test_prune(self):
+        # the dummy has boiler_1 and both heater circuits, no solar
+        self.s.value_definitions = dict(self.s.value_definitions)
+        self.s.value_definitions['solar_1_temperature'] = {'address': b'\x00\xA0', 'factor': 2,
+                                                           'component': 'solar_1'}
+
+        names = ['boiler_1_temperature', 'solar_1_temperature', 'outside_temperature']
+        self.assertEqual(['boiler_1_temperature', 'outside_temperature'], self.plan.get_names(names))
+        self.assertNotIn('solar_1_temperature', self.plan.snapshot().values)
+        self.assertEqual(1, self.configuration_reads)
+
+        self.clock.now += 3600
+        self.plan.get_names(names)
+        self.assertEqual(2, self.configuration_reads)
+
+    def test_poller(self):
+        self.plan.configuration = {'boiler_1': False}
+        self.plan.checked = 0.0
+
+        changes = []
+        poller = Poller(self.s, clock=self.clock, plan=self.plan)
+        poller.subscribe('boiler_1_temperature', changes.append)
+        poller.subscribe('outside_temperature', changes.append)
+
+        self.assertEqual(1, poller.poll_once())
+        poller.dispatch_pending()
+        self.assertEqual([{'outside_temperature': 2161.0}], changes)
+
+    def test_quarantine(self):
+        # the dummy answers 00 59 with a broken frame
+        self.s.value_definitions = dict(const.VALUE_DEFINITIONS)
+        self.s.value_definitions['heater_circuit_18_is'] = {'address': b'\x00\x59', 'factor': 1}
+        self.plan.backoff_initial = 60.0
+        names = ['operating_hours', 'heater_circuit_18_is']
+        key = (b'\x30', b'\x00\x59')
+
+        sent = []
+        send_frame = self.s.connection.send_frame
+
+        def recording_send_frame(frame, read_answer_frames=1):
+            sent.append(frame)
+            return send_frame(frame, read_answer_frames)
+        self.s.connection.send_frame = recording_send_frame
+
+        for i in range(4):
+            self.assertEqual(('heater_circuit_18_is',), self.plan.snapshot().failed)
+        self.assertEqual(['operating_hours'], self.plan.get_names(names))
+        self.assertEqual({key: 60.0}, self.plan.get_quarantined())
+
+        # the other answers of the windows were recorded as successes
+        stats = self.s.connection.stats
+        self.assertEqual(4, stats.get_address_stats(b'\x30', b'\x00\x62')['successes'])
+        self.assertEqual(4, stats.get_address_stats(*key)['failures'])
+
+        del sent[:]  # the configuration
+        self.clock.now += 59.0
+        self.assertEqual((), self.plan.snapshot().failed)
+        self.assertEqual([], sent)
+
+        # the probe is a single request on its own, it fails and the backoff doubles
+        self.clock.now += 1.0
+        snapshot = self.plan.snapshot()
+        self.assertEqual((), snapshot.failed)
+        self.assertNotIn('heater_circuit_18_is', snapshot.values)
+        self.assertEqual([Frame(b'\x30', b'\x00\x59').to_bytes()], [frame.to_bytes() for frame in sent])
+        self.assertEqual({key: 180.0}, self.plan.get_quarantined())
+
+        # the probe succeeds
+        self.clock.now += 120.0
+        self.s.connection.send_frame = lambda frame, read_answer_frames=1: frame
+        self.assertEqual(1, self.plan.run_probes())
+        self.assertEqual({}, self.plan.get_quarantined())
+        self.assertEqual(names, self.plan.get_names(names))
+        self.assertEqual(0, stats.get_address_stats(*key)['recent_requests'])
+
+    def test_poller_probe(self):
+        self.plan.quarantines[(b'\x30', b'\x00\x62')] = _Quarantine(60.0, 60.0)
+
+        poller = Poller(self.s, clock=self.clock, plan=self.plan)
+        poller.subscribe('operating_hours', lambda changes: None)
+        self.assertEqual(0, poller.poll_once())
+
+        self.clock.now += 60.0
+        for item in poller.items.values():
+            item.next_due = self.clock.now
+        self.assertEqual(1, poller.poll_once())
+        self.assertEqual({}, self.plan.get_quarantined())
@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+from unittest import TestCase
+from s3200.core import CommunicationError, Frame
+from s3200.protocol import Answered, Broken, ListCompleted, ListWalkState, Protocol, Unanswered
+
+
+class TestProtocol(TestCase):
+
+    def setUp(self):
+        self.protocol = Protocol()
+
+    def test_send_frame(self):
+        frame = Frame(b'\x30', b'\x00\x62')
+        self.assertEqual(frame.to_bytes(), self.protocol.send_frame(frame))
+        self.assertEqual(1, len(self.protocol.pending))
+
+        # the answer arrives byte by byte behind some garbage
+        answer_bytes = Frame(b'\x30', b'\x00\x37').to_bytes()
+        for byte in b'\xff' + answer_bytes[:-1]:
+            self.assertEqual((b'', []), self.protocol.receive_data(bytes([byte])))
+
+        send_bytes, events = self.protocol.receive_data(answer_bytes[-1:])
+        self.assertEqual(b'', send_bytes)
+        self.assertEqual(1, len(events))
+        self.assertIsInstance(events[0], Answered)
+        self.assertEqual(b'\x00\x37', events[0].frames[0].payload)
+        self.assertFalse(self.protocol.pending)
+
+    def test_pipelined_double_echo(self):
+        set_frame = Frame(b'\x39', b'\x00\x07\x00\x50')
+        get_frame = Frame(b'\x30', b'\x00\x62')
+        self.protocol.send_frame(set_frame, read_answer_frames=2)
+        self.protocol.send_frame(get_frame)
+
+        data = set_frame.to_bytes() * 2 + Frame(b'\x30', b'\x00\x37').to_bytes()
+        send_bytes, events = self.protocol.receive_data(data)
+
+        self.assertEqual([2, 1], [len(event.frames) for event in events])
+        self.assertIs(set_frame, events[0].request.frame)
+        self.assertIs(get_frame, events[1].request.frame)
+
+    def test_list(self):
+        data = self.protocol.start_list(b'\x22', b'\x23', stop=lambda frame: frame.payload == b'\x00\x03')
+        self.assertEqual(Frame(b'\x22').to_bytes(), data)
+
+        payloads = [b'\x00\x02', b'\x01', b'\x00\x03', b'\x00\x04']
+        for position, payload in enumerate(payloads[:-1]):
+            send_bytes, events = self.protocol.receive_data(Frame(b'\x23', payload).to_bytes())
+
+            if position < 2:
+                self.assertEqual(Frame(b'\x23', b'\x01').to_bytes(), send_bytes)
+                self.assertEqual([], events)
+
+        # the stop function ended the walk, the skip payload is not an item
+        self.assertEqual(b'', send_bytes)
+        self.assertIsInstance(events[0], ListCompleted)
+        self.assertEqual([b'\x00\x02', b'\x00\x03'], [frame.payload for frame in events[0].items])
+
+        self.protocol.start_list(b'\x22', b'\x23')
+        send_bytes, events = self.protocol.receive_data(Frame(b'\x22', b'\x00').to_bytes())
+        self.assertEqual([], events[0].items)
+
+    def test_list_walk_state(self):
+        # frame by frame, like the bus scheduler walks
+        walk = ListWalkState(b'\x22', b'\x23')
+        self.assertEqual(Frame(b'\x22').to_bytes(), walk.get_start_frame().to_bytes())
+
+        frames = [walk.answer(Frame(b'\x22', b'\x00\x02')), walk.answer(Frame(b'\x23', b'\x01'))]
+        self.assertEqual([Frame(b'\x23', b'\x01').to_bytes()] * 2, [frame.to_bytes() for frame in frames])
+        self.assertIsNone(walk.answer(Frame(b'\x23', b'\x00')))
+        self.assertEqual([b'\x00\x02'], [frame.payload for frame in walk.items])
+
+    def test_max_loops(self):
+        self.protocol.start_list(b'\x22', b'\x23', max_loops=1)
+        self.protocol.receive_data(Frame(b'\x22', b'\x00\x02').to_bytes())
+
+        self.assertRaises(ValueError, self.protocol.receive_data, Frame(b'\x23', b'\x00\x03').to_bytes())
+        self.assertFalse(self.protocol.pending)
+
+    def test_abandon(self):
+        frame = Frame(b'\x39', b'\x00\x07\x00\x50')
+        self.protocol.send_frame(frame, read_answer_frames=2)
+        self.protocol.receive_data(frame.to_bytes() + b'\x02\xfd')
+
+        events = self.protocol.abandon()
+        self.assertIsInstance(events[0], Unanswered)
+        self.assertEqual(1, len(events[0].frames))
+        self.assertFalse(self.protocol.pending)
+        self.assertEqual(b'', self.protocol.buffer)
+
+    def test_broken_frame(self):
+        broken_frame = Frame(b'\x30', b'\x00\x59')
+        self.protocol.send_frames([broken_frame, Frame(b'\x30', b'\x00\x62')])
+
+        # the broken frame only fails its own request
+        send_bytes, events = self.protocol.receive_data(b'\x02\xfd\x00\x02\x000\x10h' +
+                                                        Frame(b'\x30', b'\x00\x37').to_bytes())
+        self.assertIsInstance(events[0], Broken)
+        self.assertIsInstance(events[0].error, CommunicationError)
+        self.assertIs(broken_frame, events[0].request.frame)
+        self.assertIsInstance(events[1], Answered)
+        self.assertEqual(b'\x00\x37', events[1].frames[0].payload)
+        self.assertFalse(self.protocol.pending)
+
+    def test_broken_list_frame(self):
+        # the position in the list is unknown after a broken item
+        self.protocol.start_list(b'\x22', b'\x23')
+        self.assertRaises(CommunicationError, self.protocol.receive_data, b'\x02\xfd\x00\x02\x000\x10h')
+        self.assertIsNotNone(self.protocol.broken.walk)
+        self.assertFalse(self.protocol.pending)
@@ -0,0 +1,46 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+from collections import OrderedDict
+from unittest import TestCase
+from s3200.rollup import Rollups, Rollup
+
+
+class TestRollups(TestCase):
+
+    def setUp(self):
+        self.emitted = []
+        self.rollups = Rollups(self.emitted.append, allowed_lateness=10)
+
+    def test_minute_windows(self):
+        for second, value in [(0, 5), (20, 7), (59, 3), (60, 10)]:
+            self.rollups.add('boiler_1_temperature', value, 1000 * 86400 + second)
+
+        self.assertEqual([], self.emitted)  # still open for late samples
+
+        self.rollups.add('boiler_1_temperature', 11, 1000 * 86400 + 70)
+        self.assertEqual([Rollup('boiler_1_temperature', 'minute', 1000 * 86400, 1000 * 86400 + 60, 3, 3, 7, 5.0)],
+                         self.emitted)
+
+    def test_late_and_missing(self):
+        start = 1000 * 86400
+        self.rollups.add('x', 1, start + 30)
+        self.rollups.add('x', 2, start + 65)
+        self.rollups.add('x', 3, start + 59)  # late but within the allowed lateness
+        self.rollups.add('x', 4, start + 300)  # four minutes missing
+        self.rollups.add('x', 5, start + 10)  # too late
+
+        self.assertEqual([(start, 2, 1, 3, 2.0), (start + 60, 1, 2, 2, 2.0)],
+                         [(r.start, r.count, r.minimum, r.maximum, r.mean) for r in self.emitted])
+        self.assertEqual(1, self.rollups.late_count)
+
+        self.rollups.add('x', None, start + 310)  # a missing reading
+        self.rollups.flush()
+        self.assertEqual(['minute', 'minute', 'minute', 'hour', 'day'], [r.tier for r in self.emitted])
+        self.assertEqual((5, 1, 5), self.emitted[3][4:7])  # the hour was still open for the late sample
+
+    def test_state_is_bounded(self):
+        rollups = Rollups(lambda rollup: None, OrderedDict([('minute', 60)]), allowed_lateness=10)
+        for second in range(0, 86400, 5):
+            rollups.add_values({'a': second, 'b': -second}, second)
+
+        self.assertTrue(all(len(windows) <= 2 for windows in rollups.windows.values()))
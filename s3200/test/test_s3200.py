@@ -5,6 +5,7 @@ from s3200 import const
 from s3200.obj import S3200
 from s3200 import core
 import datetime
+import time
 
 
 class TestS3200(TestCase):
@@ -28,6 +29,18 @@ class TestS3200(TestCase):
     def test_get_version(self):  #ok '50.04.05.09'
         self.assertEquals('50.04.04.14', self.s.get_version())
 
+    def test_deadline(self):
+        self.assertEqual('50.04.04.14', self.s.get_version(timeout=1.0))
+        self.assertEqual(432.2, self.s.get('residual_oxygen', deadline=time.monotonic() + 1.0))
+
+        with self.assertRaises(core.DeadlineExceededError) as context:
+            self.s.get_value('residual_oxygen', deadline=time.monotonic() - 1.0)
+        self.assertEqual(core.DeadlineExceededError.NOT_SENT, context.exception.stage)
+
+        # the earlier one of timeout and deadline counts
+        self.assertRaises(core.DeadlineExceededError, self.s.get_errors,
+                          timeout=1.0, deadline=time.monotonic() - 1.0)
+
     def test_get_errors(self):  #ok
         #print(str(self.s.get_errors()[0]))
         self.assertDictEqual({'is_at_ash_outlet': True,
@@ -105,6 +118,38 @@ class TestS3200(TestCase):
                               'address': b'\x00\x00',
                               'unit': '°'}, self.s.get_available_values()[0])
 
+    def test_snapshot(self):
+        snapshot = self.s.snapshot()
+
+        self.assertEqual('STÖRUNG', snapshot.state)
+        self.assertEqual('Übergangsbetr', snapshot.mode)
+        self.assertEqual('50.04.04.14', snapshot.version)
+        self.assertEqual(datetime.datetime(2010, 11, 21, 18, 31), snapshot.datetime)
+        self.assertEqual(432.2, snapshot.values['residual_oxygen'])
+        self.assertEqual(55, snapshot.values['operating_hours'])
+        self.assertEqual(True, snapshot.digital_inputs['emergency_off'])
+        self.assertEqual(True, snapshot.digital_outputs['heating_circuit_pump_1'])
+        self.assertEqual(99, snapshot.analog_outputs['primary_air'])
+        self.assertEqual(set(snapshot._fields) - {'timestamps', 'failed'}, set(snapshot.timestamps))
+
+        self.assertEqual((), snapshot.failed)
+        self.assertRaises(AttributeError, setattr, snapshot, 'state', 'x')
+        with self.assertRaises(TypeError):
+            snapshot.values['operating_hours'] = 1
+
+    def test_snapshot_broken_frame(self):
+        # the dummy answers 00 59 with a broken checksum
+        value_definitions = dict(const.VALUE_DEFINITIONS)
+        value_definitions['heater_circuit_18_is'] = {'address': b'\x00\x59', 'factor': 2, 'local_name': 'HK18 Ist'}
+        s = S3200('dummy', value_definitions=value_definitions)
+
+        snapshot = s.snapshot()
+        self.assertEqual(('heater_circuit_18_is',), snapshot.failed)
+        self.assertNotIn('heater_circuit_18_is', snapshot.values)
+        self.assertEqual(432.2, snapshot.values['residual_oxygen'])
+        self.assertEqual(len(const.VALUE_DEFINITIONS), len(snapshot.values))
+        self.assertEqual('STÖRUNG', snapshot.state)
+
     def test_set_setting(self):
         self.assertRaises(core.ReadonlyError, self.s.set_setting, 'heating_boiler_should_temperature', 42)
         self.s = S3200('dummy', readonly=False)
@@ -112,13 +157,84 @@ class TestS3200(TestCase):
         self.s.set_setting('heating_boiler_should_temperature', 84)  # 84 is already set
         self.s.set_setting('heating_boiler_should_temperature', 81)
 
-        # TODO repair dummy to enable this test
-        #self.assertRaises(core.ValueSetError, self.s.set_setting, 'heating_boiler_should_temperature', 120),
+        self.assertRaises(core.ValueSetError, self.s.set_setting, 'heating_boiler_should_temperature', 120)
 
         self.s = S3200('dummy', readonly=True)
 
+    def test_apply_settings(self):
+        setting_definitions = dict(const.SETTING_DEFINITIONS)
+        setting_definitions['boiler_1_should_temperature'] = {'address': b'\x00\x1D', 'factor': 2}
+        self.s = S3200('dummy', readonly=False, setting_definitions=setting_definitions)
+        sent = []
+        send_frames = self.s.connection.send_frames
+
+        def counting_send_frames(frames, *args, **kwargs):
+            sent.extend(frames)
+            return send_frames(frames, *args, **kwargs)
+        self.s.connection.send_frames = counting_send_frames
+
+        self.s.get_setting('heating_boiler_should_temperature')  # 84 is known now
+
+        results = self.s.apply_settings([('heating_boiler_should_temperature', 80),
+                                         ('boiler_1_should_temperature', 60),
+                                         ('heating_boiler_should_temperature', 84),
+                                         ('start_firing', 120)], use_cache=True)
+
+        self.assertEqual([('heating_boiler_should_temperature', 'unchanged'),
+                          ('boiler_1_should_temperature', 'set'),
+                          ('start_firing', 'set')], list(results.items()))
+        self.assertEqual(2, len(sent))
+
+        # known state is skipped, the rejected write does not disturb the following one
+        results = self.s.apply_settings({'boiler_1_should_temperature': 60,
+                                         'heating_boiler_should_temperature': 120,
+                                         'start_firing': 60}, use_cache=True)
+        self.assertEqual({'boiler_1_should_temperature': 'unchanged',
+                          'heating_boiler_should_temperature': 'rejected',
+                          'start_firing': 'set'}, dict(results))
+        self.assertEqual(4, len(sent))
 
+        # without the cache known values are written too, they may have changed at the panel
+        results = self.s.apply_settings({'boiler_1_should_temperature': 60})
+        self.assertEqual({'boiler_1_should_temperature': 'set'}, dict(results))
+        self.assertEqual(5, len(sent))
 
+        self.assertRaises(core.ValueNotDefinedError, self.s.apply_settings, {'no_setting': 1})
 
 
 
+
+
+
+
+    def test_set_time_slot(self):
+        self.assertRaises(core.ReadonlyError, self.s.set_time_slot, 'boiler_1', 0, *[None] * 8)
+        self.s = S3200('dummy', readonly=False)
+
+        times = (datetime.time(6, 0), datetime.time(9, 30)) + (None,) * 6
+        self.s.set_time_slot('boiler_1', 0, *times)
+        self.assertRaises(core.InvalidValueError, self.s.set_time_slot, 'boiler_1', 0, datetime.time(6, 5), *[None] * 7)
+        self.assertRaises(core.ValueNotDefinedError, self.s.set_time_slot, 'boiler_9', 0, *[None] * 8)
+
+    def test_apply_time_slots(self):
+        self.s = S3200('dummy', readonly=False)
+        sent = []
+        send_frames = self.s.connection.send_frames
+
+        def counting_send_frames(frames, *args, **kwargs):
+            sent.extend(frames)
+            return send_frames(frames, *args, **kwargs)
+        self.s.connection.send_frames = counting_send_frames
+
+        schedule = self.s.get_time_slot_schedule()
+        self.assertEqual((datetime.time(6, 0), datetime.time(8, 0), datetime.time(17, 0), datetime.time(22, 0),
+                          None, None, None, None), schedule['boiler_1_monday'])
+
+        self.assertEqual([], self.s.apply_time_slots(schedule))
+        self.assertEqual([], sent)
+
+        schedule['boiler_1_monday'] = (datetime.time(5, 30),) + schedule['boiler_1_monday'][1:]
+        self.assertEqual(['boiler_1_monday'], self.s.apply_time_slots(schedule))
+        self.assertEqual(1, len(sent))
+        self.assertEqual(b'\x00\x35\x50\xAA\xDC\xFF\xFF\xFF\xFF', bytes(sent[0].payload))
+        self.assertEqual(schedule, self.s.get_time_slot_schedule())
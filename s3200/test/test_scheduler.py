@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+from collections import OrderedDict
+from unittest import TestCase
+import time
+from s3200 import core, net
+from s3200.core import Frame
+from s3200.obj import S3200
+from s3200.scheduler import BusScheduler, DEFAULT_CLASSES, SHED_DEFER, SHED_DROP, _FrameJob, _FramesJob, _ListJob
+from s3200.test.dummy import FakeClock
+
+
+class ListConnection(object):
+    """ Answers a list of items (command 37/38) and get_value (30). Logs the sent commands. """
+
+    serial_port_name = 'fake'
+    last_activity = None
+
+    def __init__(self, item_count):
+        self.item_count = item_count
+        self.position = 0
+        self.log = []
+
+    def send(self, command, payload=None):
+        return self.send_frame(Frame(command, payload))
+
+    def send_frame(self, frame, read_answer_frames=1):
+        command = bytes(frame.command)
+        self.log.append(command)
+
+        if command == b'\x37':
+            self.position = 0
+        elif command == b'\x38':
+            self.position += 1
+        else:
+            return Frame(command, b'\x00\x08')
+
+        if self.position >= self.item_count:
+            return Frame(command, b'\x00')
+        return Frame(command, bytes([2, self.position]))
+
+    def send_frames(self, frames, window=8, read_answer_frames=1, allow_missing=False, allow_broken=False):
+        return [self.send_frame(frame, read_answer_frames) for frame in frames]
+
+
+CLASSES = OrderedDict([
+    ('control', {'rate': None, 'burst': 1, 'target_delay': 1.0, 'shed': None}),
+    ('poll', {'rate': 1.0, 'burst': 2, 'target_delay': None, 'shed': SHED_DEFER}),
+    ('bulk', {'rate': 1.0, 'burst': 2, 'target_delay': None, 'shed': SHED_DROP}),
+])
+
+
+class TestBusScheduler(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.connection = ListConnection(5)
+        self.scheduler = BusScheduler(self.connection, CLASSES, clock=self.clock)
+
+    def run_all(self):
+        while self.scheduler.step():
+            self.clock.now += 0.1
+
+    def test_interleave(self):
+        walk = self.scheduler.submit('bulk', _ListJob(b'\x37', b'\x38', 500, None))
+        self.scheduler.step()
+        self.scheduler.step()
+
+        # the urgent read gets the bus between two next-item frames
+        read = self.scheduler.submit('control', _FrameJob(Frame(b'\x30', b'\x00\x00')))
+        self.run_all()
+
+        self.assertEqual([b'\x37', b'\x38', b'\x30', b'\x38', b'\x38', b'\x38', b'\x38'], self.connection.log)
+        self.assertEqual(5, len(walk.wait()))
+        self.assertEqual(b'\x00\x08', bytes(read.wait().payload))
+
+    def test_token_bucket(self):
+        polls = [self.scheduler.submit('poll', _FrameJob(Frame(b'\x30', b'\x00\x01'))) for i in range(3)]
+        walk = self.scheduler.submit('bulk', _ListJob(b'\x37', b'\x38', 500, None))
+
+        # poll spent its burst of 2, the walk gets the bus until poll has a token again
+        for i in range(4):
+            self.scheduler.step()
+        self.assertEqual([b'\x30', b'\x30', b'\x37', b'\x38'], self.connection.log)
+
+        self.clock.now += 1.0
+        self.scheduler.step()
+        self.assertEqual(b'\x30', self.connection.log[-1])
+        self.assertTrue(all(poll.done.is_set() for poll in polls))
+
+    def test_token_bucket_without_contention(self):
+        # the walk alone gets the bus beyond its burst of 2, without waiting for tokens
+        walk = self.scheduler.submit('bulk', _ListJob(b'\x37', b'\x38', 500, None))
+        for i in range(6):
+            self.assertTrue(self.scheduler.step())
+        self.assertEqual(5, len(walk.wait()))
+        self.assertEqual(0, self.scheduler.classes['bulk'].tokens)
+
+        # the empty bucket refills from zero, there is no debt of the frames served without tokens
+        self.clock.now += 1.0
+        polls = [self.scheduler.submit('poll', _FrameJob(Frame(b'\x30', b'\x00\x01'))) for i in range(3)]
+        walk = self.scheduler.submit('bulk', _ListJob(b'\x37', b'\x38', 500, None))
+        for i in range(4):
+            self.scheduler.step()
+        self.assertEqual([b'\x30', b'\x30', b'\x37', b'\x30'], self.connection.log[-4:])
+
+    def test_token_bucket_batch(self):
+        # the batch of 4 frames leaves poll 2 tokens in debt, the walk gets the bus until poll has a token again
+        batch = self.scheduler.submit('poll', _FramesJob([Frame(b'\x30', b'\x00\x01')] * 4, {}))
+        poll = self.scheduler.submit('poll', _FrameJob(Frame(b'\x30', b'\x00\x01')))
+        walk = self.scheduler.submit('bulk', _ListJob(b'\x37', b'\x38', 500, None))
+
+        self.scheduler.step()
+        self.assertEqual(4, len(batch.wait()))
+        self.assertEqual(-2, self.scheduler.classes['poll'].tokens)
+
+        self.scheduler.step()
+        self.scheduler.step()
+        self.assertEqual([b'\x37', b'\x38'], self.connection.log[-2:])
+
+        self.clock.now += 3.0
+        self.scheduler.step()
+        self.assertEqual(b'\x30', self.connection.log[-1])
+        self.assertTrue(poll.done.is_set())
+
+    def test_shedding(self):
+        bulk = [self.scheduler.submit('bulk', _FrameJob(Frame(b'\x30', b'\x00\x02'))) for i in range(2)]
+        poll = self.scheduler.submit('poll', _FrameJob(Frame(b'\x30', b'\x00\x01')))
+        control = self.scheduler.submit('control', _FrameJob(Frame(b'\x30', b'\x00\x00')))
+
+        self.clock.now = 2.0  # control waits longer than its target
+        self.scheduler.step()
+        self.assertTrue(control.done.is_set())
+
+        for job in bulk:
+            self.assertRaises(core.RequestDroppedError, job.wait)
+        self.assertFalse(poll.done.is_set())  # deferred, not dropped
+
+        self.run_all()
+        poll.wait()
+
+        metrics = self.scheduler.get_metrics()
+        self.assertEqual(2, metrics['bulk']['dropped'])
+        self.assertEqual(2.0, metrics['control']['delay_max'])
+        self.assertEqual(0, metrics['poll']['queued'])
+
+    def test_overload_keeps_priority(self):
+        self.scheduler = BusScheduler(self.connection, DEFAULT_CLASSES, clock=self.clock)
+        poll = self.scheduler.submit('poll', _FrameJob(Frame(b'\x30', b'\x00\x01')))
+        self.clock.now = 5.9
+        control = self.scheduler.submit('control', _FrameJob(Frame(b'\x30', b'\x00\x00')))
+
+        # poll is over its target of 5 s, the control read above it is still served first
+        self.clock.now = 6.0
+        self.scheduler.step()
+        self.assertTrue(control.done.is_set())
+        self.assertFalse(poll.done.is_set())
+
+        self.scheduler.step()
+        poll.wait()
+
+    def test_threaded(self):
+        self.scheduler = BusScheduler(self.connection, CLASSES)
+        self.scheduler.start()
+        try:
+            s = S3200(connection=self.scheduler.connection('control'))
+            self.assertEqual(8 / 2, s.get_value('heating_boiler_temperature'))
+            self.assertEqual(5, len(self.scheduler.connection('bulk').get_list(b'\x37', b'\x38')))
+        finally:
+            self.scheduler.stop()
+
+        metrics = self.scheduler.get_metrics()
+        self.assertEqual(1, metrics['control']['served'])
+        self.assertEqual(1, metrics['bulk']['served'])
+
+    def test_deadline(self):
+        with net.deadline_scope(time.monotonic() + 0.05):
+            expired = self.scheduler.submit('poll', _FrameJob(Frame(b'\x30', b'\x00\x01')))
+        read = self.scheduler.submit('poll', _FrameJob(Frame(b'\x30', b'\x00\x02')))
+
+        # the caller gives up, the queued request is dropped before it is sent
+        with self.assertRaises(core.DeadlineExceededError) as context:
+            expired.wait()
+        self.assertEqual(core.DeadlineExceededError.NOT_SENT, context.exception.stage)
+
+        self.run_all()
+        read.wait()
+        self.assertEqual([b'\x30'], self.connection.log)
+        self.assertEqual(1, self.scheduler.get_metrics()['poll']['expired'])
@@ -0,0 +1,44 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+from unittest import TestCase
+from s3200.core import CommunicationError, Frame
+from s3200.obj import S3200
+from s3200.stats import RequestStats
+
+
+class TestRequestStats(TestCase):
+
+    def test_record(self):
+        stats = RequestStats(window=2)
+        stats.record(Frame(b'\x30', b'\x00\x62'), True, 0.02)
+        stats.record(Frame(b'\x30', b'\x00\x59'), False)
+        stats.record(Frame(b'\x30', b'\x00\x59'), False)
+        stats.record(Frame(b'\x30', b'\x00\x59'), True, 0.04)
+        stats.record(Frame(b'\x22', b'random'), True, 0.01)
+
+        command_stats = stats.get_command_stats(b'\x30')
+        self.assertEqual((2, 2), (command_stats['successes'], command_stats['failures']))
+        self.assertAlmostEqual(0.03, command_stats['latency_mean'])
+        self.assertEqual(0.04, command_stats['latency_max'])
+
+        # the failure rate covers the last 2 requests only
+        address_stats = stats.get_address_stats(b'\x30', b'\x00\x59')
+        self.assertEqual(0.5, address_stats['failure_rate'])
+        self.assertEqual(2, address_stats['failures'])
+
+        # test_connection has no address
+        self.assertEqual({(b'\x30', b'\x00\x62'), (b'\x30', b'\x00\x59')}, set(stats.snapshot()['addresses']))
+        self.assertIsNone(stats.get_command_stats(b'\x41'))
+
+        stats.forget_recent(b'\x30', b'\x00\x59')
+        self.assertEqual(0.0, stats.get_address_stats(b'\x30', b'\x00\x59')['failure_rate'])
+
+    def test_connection(self):
+        s = S3200('dummy')
+        s.get_value('operating_hours', 'residual_oxygen')
+        self.assertRaises(CommunicationError, s.connection.send_frame, Frame(b'\x30', b'\x00\x59'))
+
+        stats = s.get_request_stats()
+        self.assertEqual(2, stats['commands'][b'\x30']['successes'])
+        self.assertEqual(1, stats['addresses'][(b'\x30', b'\x00\x59')]['failures'])
+        self.assertGreaterEqual(stats['addresses'][(b'\x30', b'\x00\x62')]['latency_max'], 0.0)
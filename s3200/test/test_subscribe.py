@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import threading
+from unittest import TestCase
+from s3200 import core
+from s3200.obj import S3200
+from s3200.subscribe import Poller
+from s3200.test.dummy import FakeClock
+
+
+class ScriptedS3200(object):
+    """ Returns the next value of a list for every get. """
+
+    def __init__(self, **values):
+        self.values = values
+
+    def get(self, name):
+        return self.values[name].pop(0)
+
+
+class TestPoller(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.calls = []
+
+    def test_deadband_and_batching(self):
+        s = ScriptedS3200(boiler_1_temperature=[40.0, 40.5, 42.0], door_contact=[True, True, False])
+        poller = Poller(s, min_interval=1, clock=self.clock)
+        poller.subscribe('boiler_1_temperature', self.calls.append, deadband=1)
+        poller.subscribe('door_contact', self.calls.append)
+
+        for i in range(3):
+            self.clock.now += 100
+            self.assertEqual(2, poller.poll_once())
+            poller.dispatch_pending()
+
+        self.assertEqual([{'boiler_1_temperature': 40.0, 'door_contact': True},
+                          {'boiler_1_temperature': 42.0, 'door_contact': False}], self.calls)
+
+    def test_adaptive_interval(self):
+        s = ScriptedS3200(operating_hours=[1, 1, 1, 2, 3])
+        poller = Poller(s, min_interval=1, max_interval=8, clock=self.clock)
+        poller.subscribe('operating_hours', self.calls.append)
+        item = poller.items['operating_hours']
+
+        intervals = []
+        for i in range(5):
+            self.clock.now += 100
+            poller.poll_once()
+            intervals.append(item.interval)
+
+        self.assertEqual([2, 4, 8, 4, 2], intervals)
+
+        # nothing is due before the interval passed
+        self.clock.now += 1
+        self.assertEqual(0, poller.poll_once())
+
+    def test_adaptive_interval_deadband(self):
+        s = ScriptedS3200(boiler_1_temperature=[40.0, 40.5, 40.0, 40.5, 43.0])
+        poller = Poller(s, min_interval=1, max_interval=8, clock=self.clock)
+        poller.subscribe('boiler_1_temperature', self.calls.append, deadband=1.0)
+        item = poller.items['boiler_1_temperature']
+
+        intervals = []
+        for i in range(5):
+            self.clock.now += 100
+            poller.poll_once()
+            intervals.append(item.interval)
+
+        # the noise within the deadband slows the polling down like a constant value
+        self.assertEqual([2, 4, 8, 8, 4], intervals)
+
+    def test_min_interval(self):
+        s = ScriptedS3200(operating_hours=[1, 2, 3])
+        poller = Poller(s, min_interval=1, clock=self.clock)
+        poller.subscribe('operating_hours', self.calls.append, min_interval=5)
+
+        for i in range(3):
+            self.clock.now += 100
+            poller.poll_once()
+            self.assertGreaterEqual(poller.items['operating_hours'].interval, 5)
+
+    def test_unsubscribe(self):
+        poller = Poller(ScriptedS3200(), clock=self.clock)
+        subscription = poller.subscribe('operating_hours', self.calls.append)
+        poller.unsubscribe(subscription)
+
+        self.assertIsNone(poller.get_next_due())
+
+    def test_s3200_subscribe(self):
+        s = S3200('dummy')
+        called = threading.Event()
+
+        def callback(changes):
+            self.calls.append(changes)
+            called.set()
+
+        s.subscribe('operating_hours', callback)
+        self.assertTrue(called.wait(5))
+        s.poller.stop()
+
+        self.assertEqual([{'operating_hours': 55.0}], self.calls)
+        self.assertEqual(True, s.get('door_contact'))
+        self.assertRaises(core.ValueNotDefinedError, s.get, 'unknown')
@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import socket
+from unittest import TestCase
+from s3200.core import CommunicationError
+from s3200.net import Frame, Connection
+from s3200.obj import S3200
+from s3200.tcp import SocketSerial
+from s3200.test.dummy import DummyTcpServer
+
+
+class TestTcpConnection(TestCase):
+
+    def setUp(self):
+        self.server = DummyTcpServer()
+        self.server.start()
+        self.c = Connection(self.server.url)
+
+    def tearDown(self):
+        self.c.close()
+        self.server.stop()
+
+    def test_from_url(self):
+        port = SocketSerial.from_url('tcp://192.168.0.7:2001')
+        self.assertEqual('192.168.0.7', port.host)
+        self.assertEqual(2001, port.port)
+        self.assertRaises(ValueError, SocketSerial.from_url, 'udp://192.168.0.7:2001')
+        self.assertRaises(ValueError, SocketSerial.from_url, 'tcp://192.168.0.7')
+
+    def test_send_request(self):
+        return_frame = self.c.send_frame(Frame(b'\x30', b'\x00\x62'))
+
+        self.assertEqual(return_frame.command, b'\x30')
+        self.assertEqual(return_frame.payload, b'\x00\x37')
+
+        self.assertRaises(CommunicationError, self.c.send_frame, Frame(b'\x30', b'\x00\x59'))
+
+        # the connection is reopened after the failure
+        return_frame = self.c.send_frame(Frame(b'\x30', b'\x00\x62'))
+        self.assertEqual(return_frame.payload, b'\x00\x37')
+
+    def test_persistent(self):
+        self.assertTrue(self.c.persistent)
+
+        self.c.send(b'\x30', b'\x00\x62')
+        port = self.c.serial_port
+        self.assertTrue(port.is_open())
+        self.assertEqual(1, port.sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+
+        self.c.send(b'\x30', b'\x00\x62')
+        self.assertIs(port, self.c.serial_port)
+        self.assertEqual(1, len(self.server.connections))
+
+    def test_reconnect(self):
+        self.c.send(b'\x30', b'\x00\x62')
+        self.server.drop_connections()
+
+        return_frame = self.c.send(b'\x30', b'\x00\x62')
+        self.assertEqual(return_frame.payload, b'\x00\x37')
+
+    def test_s3200(self):
+        s = S3200(self.server.url)
+        self.assertEqual(432.2, s.get_value('residual_oxygen'))
+        self.assertTrue(s.test_connection())
+        self.assertEqual('STÖRUNG', s.get_state())
+        self.assertEqual(1, len(s.get_errors()))
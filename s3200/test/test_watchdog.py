@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import threading
+from unittest import TestCase
+from s3200 import core
+from s3200.core import Frame
+from s3200.net import Connection
+from s3200.obj import S3200
+from s3200.watchdog import Watchdog, STATE_CLOSED, STATE_OPEN
+from s3200.test.dummy import FakeClock
+
+# far ahead of time.monotonic, the connection stamps its activity with it
+FAR_AHEAD = 1e9
+
+
+class UnpluggedConnection(object):
+    """ Echoes frames while plugged, raises like a port without answers otherwise. """
+
+    serial_port_name = 'fake'
+    last_activity = None
+
+    def __init__(self):
+        self.plugged = True
+        self.sent_count = 0
+        self.close_count = 0
+
+    def send_frame(self, frame, read_answer_frames=1):
+        self.sent_count += 1
+        if not self.plugged:
+            raise core.WrongNumberOfAnswerFramesError("Got wrong no of answer frames", 1, 0,
+                                                      core.NothingToReadError("No Bytes to Read"))
+        return frame
+
+    def close(self):
+        self.close_count += 1
+
+
+class TestWatchdog(TestCase):
+
+    def test_probe(self):
+        clock = FakeClock(FAR_AHEAD)
+        watchdog = Watchdog(Connection('dummy'), interval=10.0, clock=clock)
+
+        self.assertTrue(watchdog.check())
+        self.assertEqual(1, watchdog.probe_count)
+        self.assertFalse(watchdog.check())
+
+        clock.now += 10.0
+        self.assertTrue(watchdog.check())
+        self.assertEqual(2, watchdog.probe_count)
+        self.assertTrue(watchdog.is_up())
+
+    def test_traffic_is_proof_of_life(self):
+        watchdog = Watchdog(Connection('dummy'), interval=10.0)
+        s = S3200(connection=watchdog.connection)
+
+        self.assertEqual('50.04.04.14', s.get_version())
+        self.assertFalse(watchdog.check())
+        self.assertEqual(0, watchdog.probe_count)
+        self.assertEqual(1, watchdog.skipped_probe_count)
+
+    def test_circuit_breaker(self):
+        clock = FakeClock(FAR_AHEAD)
+        connection = UnpluggedConnection()
+        changes = []
+        watchdog = Watchdog(connection, failure_threshold=2, backoff_initial=1.0, backoff_max=3.0,
+                            on_change=changes.append, clock=clock)
+        s = S3200(connection=watchdog.connection)
+
+        connection.plugged = False
+        for i in range(2):
+            self.assertRaises(core.WrongNumberOfAnswerFramesError, s.get_version)
+        self.assertEqual([STATE_OPEN], changes)
+
+        # fails at once without touching the bus
+        self.assertRaises(core.CircuitOpenError, s.get_version)
+        self.assertFalse(s.test_connection())
+        self.assertEqual(2, connection.sent_count)
+        self.assertEqual(2, watchdog.rejected_count)
+
+        # reconnect attempts after 1, 2 and 3 (backoff_max) seconds
+        for backoff in (1.0, 2.0, 3.0):
+            clock.now += backoff - 0.5
+            self.assertFalse(watchdog.check())
+            clock.now += 0.5
+            self.assertTrue(watchdog.check())
+        self.assertEqual(3.0, watchdog.backoff)
+        self.assertEqual(3, connection.close_count)
+
+        connection.plugged = True
+        clock.now += 3.0
+        self.assertTrue(watchdog.check())
+        self.assertEqual([STATE_OPEN, STATE_CLOSED], changes)
+        self.assertEqual(1.0, watchdog.backoff)
+        self.assertEqual(b'\x01', bytes(s.connection.send_frame(Frame(b'\x30', b'\x01')).payload))
+
+    def test_busy_connection(self):
+        clock = FakeClock(FAR_AHEAD)
+        connection = Connection('dummy')
+        watchdog = Watchdog(connection, interval=0.2, probe_timeout=0.1, failure_threshold=1, clock=clock)
+        s = S3200(connection=watchdog.connection)
+
+        # another thread holds the connection, like a long list walk
+        locked = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with connection.lock:
+                locked.set()
+                release.wait(5.0)
+        thread = threading.Thread(target=hold)
+        thread.start()
+        locked.wait(5.0)
+
+        try:
+            self.assertFalse(watchdog.check())
+            self.assertIsNone(watchdog.probe())
+            self.assertEqual(2, watchdog.busy_probe_count)
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertTrue(watchdog.is_up())
+        self.assertEqual(0, watchdog.failures)
+        self.assertEqual('50.04.04.14', s.get_version())
+        self.assertTrue(watchdog.check())
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+""" Registry of the transports a Connection can use.
+
+The port name selects the transport:
+    'dummy'            -> the simulated heater from s3200.test.dummy
+    'tcp://host:port'  -> a serial-to-ethernet converter, see s3200.tcp
+    everything else    -> a local serial port opened with pyserial
+
+The modules of a transport are imported when the transport is opened the first time, so importing s3200 stays
+cheap and pyserial is only needed for real serial ports.
+"""
+
+import logging
+
+logger = logging.getLogger('s3200')
+
+DEFAULT_SCHEME = 'serial'
+
+TRANSPORTS = {}
+
+
+class Transport(object):
+    """ A registered transport. """
+
+    __slots__ = ('scheme', 'factory', 'persistent')
+
+    def __init__(self, scheme, factory, persistent=False):
+        """
+        :param scheme: name of the transport. Port names 'scheme://...' or equal to the scheme select it.
+        :param factory: function(port_name) returning an open serial port like object
+        :param persistent: keep the port open between the frames by default
+        """
+        self.scheme = scheme
+        self.factory = factory
+        self.persistent = persistent
+
+
+def register_transport(scheme: str, factory, persistent=False):
+    """ Register a transport. See Transport for the parameters. """
+    TRANSPORTS[scheme] = Transport(scheme, factory, persistent)
+
+
+def get_scheme(port_name: str):
+    """ Get the scheme of the transport for the port name. """
+
+    if '://' in port_name:
+        return port_name.split('://', 1)[0]
+    if port_name in TRANSPORTS:
+        return port_name
+    return DEFAULT_SCHEME
+
+
+def get_transport(port_name: str):
+    scheme = get_scheme(port_name)
+
+    try:
+        return TRANSPORTS[scheme]
+    except KeyError:
+        raise ValueError("No transport registered for: {0}".format(port_name)) from None
+
+
+def open_transport(port_name: str):
+    """ Opens the port with the matching transport and returns it. """
+    return get_transport(port_name).factory(port_name)
+
+
+def is_persistent(port_name: str):
+    return get_transport(port_name).persistent
+
+
+def _open_serial(port_name):
+    try:
+        from serial import Serial, EIGHTBITS, PARITY_NONE, STOPBITS_ONE
+    except ImportError as e:
+        raise ImportError("pyserial is needed to open serial port: {0}".format(port_name)) from e
+
+    return Serial(port_name, 57600, EIGHTBITS, PARITY_NONE, STOPBITS_ONE, timeout=3)
+
+
+def _open_dummy(port_name):
+    from s3200.test.dummy import DummySerial
+    return DummySerial()
+
+
+def _open_tcp(port_name):
+    from s3200.tcp import SocketSerial
+    return SocketSerial.from_url(port_name)
+
+
+register_transport(DEFAULT_SCHEME, _open_serial)
+register_transport('dummy', _open_dummy)
+register_transport('tcp', _open_tcp, persistent=True)
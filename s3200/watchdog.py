@@ -0,0 +1,265 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+""" A health watchdog with a circuit breaker for the connection to the heater.
+
+Every answered request counts as proof of life, the watchdog only probes when the bus was idle for interval
+seconds. The probe is the shortest frame the heater answers: a test_connection echo of two bytes.
+
+After failure_threshold failed requests or probes in a row the heater is considered down and the circuit opens:
+requests through the watchdog connection fail at once with a CircuitOpenError instead of waiting out the timeout
+of the port. The watchdog then reopens the port and probes with exponential backoff until the heater answers again.
+
+Usage:
+    watchdog = Watchdog(net.Connection('/dev/ttyAMA0', persistent=True))
+    watchdog.start()
+    s = S3200(connection=watchdog.connection)
+"""
+
+import threading
+import time
+from s3200 import const, core, net
+from s3200.core import Frame
+import logging
+
+logger = logging.getLogger('s3200')
+
+STATE_CLOSED = 'closed'  # the heater answers, requests go through
+STATE_OPEN = 'open'  # the heater is down, requests fail at once
+
+PROBE_COMMAND = const.COMMAND_DEFINITIONS['test_connection']['address']
+
+# errors which mean that the heater did not answer at all
+DOWN_ERRORS = (core.NothingToReadError, core.WrongNumberOfAnswerFramesError, OSError)
+
+
+class WatchdogConnection(object):
+    """ A connection whose requests go through the circuit breaker of a Watchdog. Offers the same methods as
+    net.Connection.
+    """
+
+    def __init__(self, watchdog):
+        self.watchdog = watchdog
+        self.serial_port_name = watchdog.real_connection.serial_port_name
+
+    @property
+    def last_activity(self):
+        return self.watchdog.real_connection.last_activity
+
+    @property
+    def stats(self):
+        return getattr(self.watchdog.real_connection, 'stats', None)
+
+    def send(self, command: bytes=None, payload: bytes=None):
+        """ Shortcut for send_frame. Builds the Frame object and sends it. """
+        return self.send_frame(Frame(command, payload))
+
+    def send_frame(self, frame, read_answer_frames=1):
+        return self.watchdog.call(self.watchdog.real_connection.send_frame, frame, read_answer_frames)
+
+    def send_frames(self, frames, window=8, read_answer_frames=1, allow_missing=False, allow_broken=False):
+        return self.watchdog.call(self.watchdog.real_connection.send_frames, frames, window=window,
+                                  read_answer_frames=read_answer_frames, allow_missing=allow_missing,
+                                  allow_broken=allow_broken)
+
+    def get_list(self, command_start_address: bytes, command_next_address: bytes, max_loops=500, stop=None):
+        return self.watchdog.call(self.watchdog.real_connection.get_list, command_start_address,
+                                  command_next_address, max_loops=max_loops, stop=stop)
+
+    def close(self):
+        self.watchdog.real_connection.close()
+
+
+class Watchdog(object):
+    """ Watches the health of a connection and fails requests fast while the heater is down. See the module doc. """
+
+    def __init__(self, connection, interval=10.0, failure_threshold=2, probe_timeout=0.5,
+                 backoff_initial=1.0, backoff_max=300.0, on_change=None, clock=time.monotonic):
+        """
+        :param connection: the net.Connection to watch
+        :param interval: seconds without an answered request after which a probe is sent
+        :param failure_threshold: failed requests or probes in a row which open the circuit
+        :param probe_timeout: seconds a probe waits for its answer
+        :param backoff_initial: seconds before the first reconnect attempt, doubled after each failed one
+        :param backoff_max: upper limit of the seconds between two reconnect attempts
+        :param on_change: called with the new state when the circuit opens or closes
+        :param clock: function returning the current time, must use the timebase of time.monotonic
+        """
+        self.real_connection = connection
+        self.connection = WatchdogConnection(self)
+        self.interval = interval
+        self.failure_threshold = failure_threshold
+        self.probe_timeout = probe_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.on_change = on_change
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        self.state = STATE_CLOSED
+        self.failures = 0  # failures in a row
+        self.backoff = backoff_initial
+        self.next_attempt = None  # when the circuit is open: time of the next reconnect attempt
+        self.last_probe = None
+
+        self.probe_count = 0
+        self.skipped_probe_count = 0
+        self.busy_probe_count = 0  # probes skipped because another thread held the connection
+        self.rejected_count = 0
+
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def is_up(self):
+        return self.state == STATE_CLOSED
+
+    def get_last_activity(self):
+        """ The time of the last answered request or probe, None if unknown. """
+
+        activities = [activity for activity in (self.real_connection.last_activity, self.last_probe)
+                      if activity is not None]
+        return max(activities) if activities else None
+
+    def call(self, function, *args, **kwargs):
+        """ Calls function (a method of the connection) if the circuit is closed.
+
+        :raise CircuitOpenError: if the heater is known to be down
+        """
+
+        if self.state == STATE_OPEN:
+            self.rejected_count += 1
+            raise core.CircuitOpenError("The heater does not answer, next reconnect attempt in {0:.1f} s".format(
+                max(0.0, self.next_attempt - self.clock())))
+
+        try:
+            result = function(*args, **kwargs)
+        except DOWN_ERRORS:
+            self._record_failure()
+            raise
+
+        self._record_success()
+        return result
+
+    def _record_success(self):
+        with self.lock:
+            self.failures = 0
+            if self.state == STATE_OPEN:
+                self._set_state(STATE_CLOSED)
+                self.backoff = self.backoff_initial
+                self.next_attempt = None
+
+    def _record_failure(self):
+        with self.lock:
+            self.failures += 1
+            now = self.clock()
+
+            if self.state == STATE_OPEN:
+                self.backoff = min(self.backoff * 2, self.backoff_max)
+                self.next_attempt = now + self.backoff
+            elif self.failures >= self.failure_threshold:
+                self._set_state(STATE_OPEN)
+                self.backoff = self.backoff_initial
+                self.next_attempt = now + self.backoff
+
+    def _set_state(self, state):
+        logger.warning('Connection to the heater {0}'.format('lost' if state == STATE_OPEN else 'restored'))
+        self.state = state
+
+        if self.on_change is not None:
+            self.on_change(state)
+
+    def probe(self):
+        """ Sends the probe and updates the state. A probe which can not be sent before probe_timeout because the
+        connection is busy (eg. with a list walk) proves nothing and leaves the state as it is.
+
+        :return: True if the heater answered, False if not, None if the connection was busy
+        """
+
+        self.probe_count += 1
+        # changes every probe, a stale echo does not count. One byte would not be shorter on the wire,
+        # the length 2 gets escaped.
+        payload = bytes([0x30, 0x30 + self.probe_count % 10])
+
+        try:
+            with net.deadline_scope(time.monotonic() + self.probe_timeout):
+                answer_frame = self.real_connection.send_frame(Frame(PROBE_COMMAND, payload))
+            alive = bytes(answer_frame.payload) == payload
+        except core.DeadlineExceededError as e:
+            if e.stage == core.DeadlineExceededError.NOT_SENT:
+                logger.debug('Probe not sent, the connection is busy')
+                self.busy_probe_count += 1
+                return None
+
+            logger.debug('Probe failed: {0!r}'.format(e))
+            alive = False
+        except (core.S3200Error, OSError) as e:
+            logger.debug('Probe failed: {0!r}'.format(e))
+            alive = False
+
+        if alive:
+            self.last_probe = self.clock()
+            self._record_success()
+        else:
+            self._record_failure()
+
+        return alive
+
+    def get_next_due(self):
+        """ The time of the next probe or reconnect attempt if there is no other traffic until then. """
+
+        if self.state == STATE_OPEN:
+            return self.next_attempt
+
+        last_activity = self.get_last_activity()
+        if last_activity is None:
+            return self.clock()
+
+        return last_activity + self.interval
+
+    def check(self):
+        """ Probes if the bus was idle for interval seconds, or attempts to reconnect if the circuit is open and
+        the backoff passed. Nothing is sent while another thread uses the connection.
+
+        :return: True if a probe was sent
+        """
+
+        if self.clock() < self.get_next_due():
+            self.skipped_probe_count += 1
+            return False
+
+        # a busy connection is neither alive nor down, the probe waits for the next check
+        lock = getattr(self.real_connection, 'lock', None)
+        if lock is not None and not lock.acquire(blocking=False):
+            self.busy_probe_count += 1
+            return False
+
+        try:
+            if self.state == STATE_OPEN:
+                # a fresh port, eg. after the adapter was unplugged and plugged in again
+                self.real_connection.close()
+
+            return self.probe() is not None
+        finally:
+            if lock is not None:
+                lock.release()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning('Watchdog check failed: {0!r}'.format(e))
+
+            self.stopped.wait(min(self.interval, max(0.0, self.get_next_due() - self.clock())))
+
+    def start(self):
+        """ Starts the watchdog thread. """
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -23,4 +23,12 @@ setuptools.setup(
     install_requires=[
           'pyserial',
     ],
+    extras_require={
+          'numpy': ['numpy'],
+    },
+    entry_points={
+        'console_scripts': [
+            's3200=s3200.cli:main',
+        ],
+    },
 )
\ No newline at end of file